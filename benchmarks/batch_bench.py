@@ -0,0 +1,60 @@
+#encoding: utf8
+
+"""Batch DFA matching benchmark.
+
+Matches a large batch of short byte strings, like identifiers and codes,
+with `DFA.accept_batch`, and compares it with calling `DFA.accept` and
+a JIT compiled matcher for every string. Requires NumPy.
+
+Run from the repository root:
+    python -m benchmarks.batch_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+from rejit.dfa import DFA
+from rejit.jitmatcher import JITMatcher
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+patterns = [
+        ('id', '[A-Z]{2}[0-9]{6}'),
+        ('code', '[a-z]+\\-[0-9]+(\\-[a-z0-9]+)*'),
+        ('hex', '0x[0-9a-f]+'),
+    ]
+batch_size = 200000
+max_length = 16
+
+def measure(fun):
+    start = time.perf_counter()
+    result = fun()
+    return result, time.perf_counter() - start
+
+def run():
+    if numpy is None:
+        print('batch_bench requires NumPy')
+        return
+    rand = random.Random(0)
+    alphabet = 'ABCXYZabcfx0123456789-'
+    strings = [''.join(rand.choice(alphabet) for _ in range(rand.randint(0, max_length)))
+            for _ in range(batch_size)]
+    batch = numpy.array([s.encode() for s in strings], dtype='S{}'.format(max_length))
+    print('{:>8} {:>10} {:>12} {:>10} {:>10}'.format('pattern', 'strings', 'accept [s]', 'JIT [s]', 'batch [s]'))
+    for name, pattern in patterns:
+        dfa = DFA(Regex(pattern)._matcher)
+        jit = JITMatcher(dfa)
+        expected, accept_time = measure(lambda: [dfa.accept(s) for s in strings])
+        result, jit_time = measure(lambda: [jit.accept(s) for s in strings])
+        assert result == expected
+        result, batch_time = measure(lambda: dfa.accept_batch(batch))
+        assert list(result) == expected
+        print('{:>8} {:>10} {:>12.4f} {:>10.4f} {:>10.4f}'.format(
+            name, batch_size, accept_time, jit_time, batch_time))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,61 @@
+#encoding: utf8
+
+"""Binary DFA format benchmark.
+
+Builds DFAs, saves them in the binary format and loads them back, read into
+memory and mapped to memory. Reports file sizes, build, save and load times,
+and matching times of the built and the memory-mapped DFA. Loading a mapped
+file takes the same time for every size, the table is paged in as it's used.
+
+Run from the repository root:
+    python -m benchmarks.binary_bench
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from rejit.regex import Regex
+from rejit.dfa import DFA
+
+patterns = [
+        ('keywords', '|'.join('keyword{}'.format(n) for n in range(2000))),
+        ('repetition', '(a|b)*a(a|b){12}'),
+        ('classes', '[a-z0-9]*([a-f][0-9]|[0-9][g-z]){6}'),
+    ]
+
+def measure(fun, repeat=1):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def fmt(value, width, spec=''):
+    return '{:>{}}'.format(format(value, spec), width)
+
+def run():
+    rand = random.Random(0)
+    inputs = [''.join(rand.choice('abkeyword0123456789') for _ in range(rand.randint(0, 30))) for _ in range(2000)]
+    print(' '.join([fmt('pattern', 12), fmt('states', 7), fmt('size [kB]', 10), fmt('build [s]', 10),
+        fmt('save [s]', 9), fmt('read [s]', 9), fmt('mmap [s]', 9), fmt('match [s]', 10), fmt('mapped [s]', 10)]))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, pattern in patterns:
+            nfa = Regex(pattern)._matcher
+            dfa, build_time = measure(lambda: DFA(nfa))
+            path = os.path.join(directory, name + '.dfa')
+            _, save_time = measure(lambda: dfa.save(path))
+            _, read_time = measure(lambda: DFA.load(path, mmap=False), repeat=5)
+            mapped, mmap_time = measure(lambda: DFA.load(path), repeat=5)
+            expected, match_time = measure(lambda: [dfa.accept(s) for s in inputs], repeat=3)
+            result, mapped_time = measure(lambda: [mapped.accept(s) for s in inputs], repeat=3)
+            assert result == expected
+            print(' '.join([fmt(name, 12), fmt(dfa.num_states, 7), fmt(os.path.getsize(path) / 1024, 10, '.1f'),
+                fmt(build_time, 10, '.4f'), fmt(save_time, 9, '.4f'), fmt(read_time, 9, '.6f'),
+                fmt(mmap_time, 9, '.6f'), fmt(match_time, 10, '.4f'), fmt(mapped_time, 10, '.4f')]))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,51 @@
+#encoding: utf8
+
+"""Bit-parallel matcher benchmark.
+
+Compiles patterns of the `(a|b)*a(a|b){n}` family, which DFAs have 2^(n+1)
+states, with the bit-parallel, NFA and DFA matchers. Reports compilation and
+matching times. DFAs are only built for small `n`.
+
+Run from the repository root:
+    python -m benchmarks.bitparallel_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+
+bounds = [5, 10, 20, 100]
+max_dfa_bound = 10
+
+def measure(fun):
+    start = time.perf_counter()
+    result = fun()
+    return result, time.perf_counter() - start
+
+def fmt(value, width, spec=''):
+    return '{:>{}}'.format('-' if value is None else format(value, spec), width)
+
+def run():
+    rand = random.Random(0)
+    s = ''.join(rand.choice('ab') for _ in range(2000))
+    print(' '.join([fmt('n', 5), fmt('matcher', 12), fmt('compile [s]', 12), fmt('match [s]', 10)]))
+    for n in bounds:
+        pattern = '(a|b)*a(a|b){{{}}}'.format(n)
+        expected = s[-n-1] == 'a'
+        compilers = [('BitParallel', Regex.compile_to_bitparallel), ('NFA', None)]
+        if n <= max_dfa_bound:
+            compilers.append(('DFA', Regex.compile_to_DFA))
+        for name, compiler in compilers:
+            def build():
+                re = Regex(pattern)
+                if compiler:
+                    compiler(re)
+                return re
+            re, compile_time = measure(build)
+            result, match_time = measure(lambda: re.accept(s))
+            assert result == expected
+            print(' '.join([fmt(n, 5), fmt(name, 12), fmt(compile_time, 12, '.4f'), fmt(match_time, 10, '.4f')]))
+
+if __name__ == '__main__':
+    run()
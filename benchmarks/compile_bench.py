@@ -0,0 +1,78 @@
+#encoding: utf8
+
+"""Compile-time benchmark for very large patterns.
+
+Times `Regex._parse` and the whole `Regex.__init__` (parsing, AST transforms
+and NFA construction) for generated patterns of growing size. If compilation
+is linear, time per pattern character stays roughly constant as the size
+doubles.
+
+Run from the repository root:
+    python -m benchmarks.compile_bench
+"""
+
+import sys
+import time
+
+from rejit.regex import Regex
+
+sizes = [12500, 25000, 50000, 100000, 200000]
+
+def literal_pattern(size):
+    return ('abc' * size)[:size]
+
+def alternation_pattern(size):
+    words = []
+    length = 0
+    i = 0
+    while length < size:
+        words.append('kw{}'.format(i))
+        length += len(words[-1]) + 1
+        i += 1
+    return '|'.join(words)
+
+def nested_pattern(size):
+    depth = size // 3
+    return '(' * depth + 'a' + ')*' * depth
+
+def charset_pattern(size):
+    return '[a-z0-9_]' * (size // 9)
+
+generators = [
+        ('literal', literal_pattern),
+        ('alternation', alternation_pattern),
+        ('nested groups', nested_pattern),
+        ('char sets', charset_pattern),
+    ]
+
+def best_time(fun, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(max_ratio=2.0):
+    linear = True
+    for name, generate in generators:
+        print('{}:'.format(name))
+        print('  {:>8} {:>12} {:>14} {:>12} {:>14}'.format(
+            'length', 'parse [s]', 'parse [us/ch]', 'init [s]', 'init [us/ch]'))
+        per_char = []
+        for size in sizes:
+            pattern = generate(size)
+            parse_time = best_time(lambda: Regex()._parse(pattern))
+            init_time = best_time(lambda: Regex(pattern), repeat=1)
+            per_char.append(init_time / len(pattern))
+            print('  {:>8} {:>12.4f} {:>14.3f} {:>12.4f} {:>14.3f}'.format(
+                len(pattern), parse_time, parse_time / len(pattern) * 1e6,
+                init_time, init_time / len(pattern) * 1e6))
+        ratio = per_char[-1] / per_char[0]
+        print('  time per char, largest vs smallest pattern: {:.2f}x'.format(ratio))
+        linear = linear and ratio < max_ratio
+    print('linear scaling: {}'.format('OK' if linear else 'FAILED'))
+    return linear
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,44 @@
+#encoding: utf8
+
+"""Glushkov construction benchmark.
+
+Builds NFAs with the Thompson and the Glushkov construction and compares
+their sizes, NFA construction times and times of DFA construction from them.
+The Glushkov NFA has no epsilon edges, so DFA construction doesn't compute
+epsilon closures.
+
+Run from the repository root:
+    python -m benchmarks.glushkov_bench
+"""
+
+import time
+
+from rejit.regex import Regex
+from rejit.dfa import DFA
+
+patterns = [
+        ('keywords', '|'.join('keyword{}'.format(n) for n in range(300))),
+        ('email', '([a-zA-Z0-9_]|[-.+])+@[a-zA-Z0-9]+(.[a-zA-Z0-9_]+)*'),
+        ('nested', '((((a+b)+c)*d)+e)?' * 20),
+        ('repetition', '(ab|cd){50}x{10,40}'),
+    ]
+
+def measure(fun):
+    start = time.perf_counter()
+    result = fun()
+    return result, time.perf_counter() - start
+
+def run():
+    print('{:>12} {:>12} {:>8} {:>8} {:>10} {:>10} {:>10}'.format(
+        'pattern', 'construction', 'states', 'edges', 'NFA [s]', 'DFA [s]', 'DFA states'))
+    for name, pattern in patterns:
+        for construction in Regex.constructions:
+            re, nfa_time = measure(lambda: Regex(pattern, construction=construction))
+            nfa = re._matcher
+            edges = len(nfa._targets) + len(nfa._eps_targets)
+            dfa, dfa_time = measure(lambda: DFA(nfa))
+            print('{:>12} {:>12} {:>8} {:>8} {:>10.4f} {:>10.4f} {:>10}'.format(
+                name, construction, nfa.num_states, edges, nfa_time, dfa_time, dfa.num_states))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,59 @@
+#encoding: utf8
+
+"""Lazy DFA benchmark.
+
+Compiles patterns of the `(a|b)*a(a|b){n}` family, which DFAs have 2^(n+1)
+states, to lazy DFAs with a few cache sizes, and to NFA and DFA matchers.
+Reports compilation and matching times of random inputs and counters of
+the lazy DFA's state cache. DFAs are only built for small `n`.
+
+Run from the repository root:
+    python -m benchmarks.lazydfa_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+
+bounds = [5, 10, 20]
+cache_sizes = [100, 10000]
+max_dfa_bound = 10
+
+def measure(fun):
+    start = time.perf_counter()
+    result = fun()
+    return result, time.perf_counter() - start
+
+def fmt(value, width, spec=''):
+    return '{:>{}}'.format('-' if value is None else format(value, spec), width)
+
+def run():
+    rand = random.Random(0)
+    inputs = [''.join(rand.choice('ab') for _ in range(200)) for _ in range(200)]
+    print(' '.join([fmt('n', 5), fmt('matcher', 14), fmt('compile [s]', 12), fmt('match [s]', 10),
+        fmt('hits', 8), fmt('misses', 8), fmt('flushes', 8), fmt('fallbacks', 9)]))
+    for n in bounds:
+        pattern = '(a|b)*a(a|b){{{}}}'.format(n)
+        expected = [s[-n-1] == 'a' for s in inputs]
+        compilers = [('LazyDFA({})'.format(size), lambda re, size=size: re.compile_to_lazy_DFA(size))
+                for size in cache_sizes]
+        compilers.append(('NFA', None))
+        if n <= max_dfa_bound:
+            compilers.append(('DFA', Regex.compile_to_DFA))
+        for name, compiler in compilers:
+            def build():
+                re = Regex(pattern)
+                if compiler:
+                    compiler(re)
+                return re
+            re, compile_time = measure(build)
+            result, match_time = measure(lambda: [re.accept(s) for s in inputs])
+            assert result == expected
+            info = re._matcher.info() if re._matcher_type == 'LazyDFA' else None
+            print(' '.join([fmt(n, 5), fmt(name, 14), fmt(compile_time, 12, '.4f'), fmt(match_time, 10, '.4f'),
+                fmt(info and info.hits, 8), fmt(info and info.misses, 8),
+                fmt(info and info.flushes, 8), fmt(info and info.fallbacks, 9)]))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,64 @@
+#encoding: utf8
+
+"""DFA minimization benchmark.
+
+Builds DFAs of a corpus of patterns and minimizes them. Reports DFA state
+counts before and after minimization, minimization time, JIT compilation
+time and code size, and matching times of DFAs and JIT compiled code built
+from the full and the minimal DFA.
+
+Run from the repository root:
+    python -m benchmarks.minimize_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+from rejit.dfa import DFA
+from rejit.jitmatcher import JITMatcher
+
+patterns = [
+        ('identifiers', '[a-zA-Z_][a-zA-Z0-9_]*|[0-9]+|[a-z]+'),
+        ('alternatives', '(ab|ac|ad)*(ab|ac|ad)*x'),
+        ('keywords', '|'.join(['if', 'in', 'int', 'import', 'is', 'id', 'ifdef', 'index']) + '|[a-z]+'),
+        ('any', '(.*a.*b)|(.*b.*a)|.*c'),
+        ('suffixes', '.*(abc|abd|acd|bcd)'),
+        ('repetition', '(a|b)*a(a|b){6}'),
+    ]
+
+def measure(fun, repeat=1):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def fmt(value, width, spec=''):
+    return '{:>{}}'.format(format(value, spec), width)
+
+def run():
+    rand = random.Random(0)
+    inputs = [''.join(rand.choice('abcdx_0') for _ in range(rand.randint(0, 40))) for _ in range(2000)]
+    print(' '.join([fmt('pattern', 12), fmt('states', 7), fmt('minimal', 7), fmt('min [s]', 8),
+        fmt('JIT [s]', 8), fmt('min JIT [s]', 11), fmt('code', 6), fmt('min code', 8),
+        fmt('DFA match', 10), fmt('min match', 10)]))
+    for name, pattern in patterns:
+        dfa = DFA(Regex(pattern)._matcher)
+        minimal, minimize_time = measure(dfa.minimize)
+        full_jit, full_jit_time = measure(lambda: JITMatcher(dfa, minimize=False))
+        min_jit, min_jit_time = measure(lambda: JITMatcher(dfa))
+        expected, full_match = measure(lambda: [dfa.accept(s) for s in inputs], repeat=3)
+        result, min_match = measure(lambda: [minimal.accept(s) for s in inputs], repeat=3)
+        assert result == expected
+        assert [min_jit.accept(s) for s in inputs] == expected
+        assert [full_jit.accept(s) for s in inputs] == expected
+        print(' '.join([fmt(name, 12), fmt(dfa.num_states, 7), fmt(minimal.num_states, 7),
+            fmt(minimize_time, 8, '.4f'), fmt(full_jit_time, 8, '.4f'), fmt(min_jit_time, 11, '.4f'),
+            fmt(len(full_jit._x86_binary), 6), fmt(len(min_jit._x86_binary), 8),
+            fmt(full_match, 10, '.4f'), fmt(min_match, 10, '.4f')]))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,80 @@
+#encoding: utf8
+
+"""Nested quantifier benchmark.
+
+Compiles patterns with deeply nested quantifiers, like `((a+b)+c)+...`, and
+reports NFA state counts and construction times for growing depths. Both
+should grow linearly with the depth. `kleene_plus` used to copy its operand,
+which doubled the NFA at every level of nesting; the previous construction is
+measured alongside for small depths, until its recursive deep copy
+overflows the stack.
+
+Run from the repository root:
+    python -m benchmarks.nested_bench
+"""
+
+import copy
+import time
+
+from rejit.nfa import NFA
+from rejit.regex import Regex
+
+depths = [2, 4, 6, 8, 100, 1000]
+max_copy_depth = 8
+
+letters = 'bcdefghijklmnopqrstuvwxyz'
+
+def nested_plus(depth):
+    pattern = 'a'
+    for level in range(depth):
+        pattern = '({}{})+'.format(pattern, letters[level % len(letters)])
+    return pattern
+
+def nested_mixed(depth):
+    pattern = 'a'
+    for level in range(depth):
+        pattern = '({}{}){}'.format(pattern, letters[level % len(letters)], '+*?'[level % 3])
+    return pattern
+
+def copying_kleene_plus(s):
+    # the construction `kleene_plus` used before, `s` followed by `s*`
+    s_copy = copy.deepcopy(s)
+    return NFA.concat(s, NFA.kleene(s_copy))
+
+def measure(pattern, kleene_plus):
+    re = Regex()
+    tree = re._transform(re._parse(pattern))
+    saved = NFA.kleene_plus
+    NFA.kleene_plus = staticmethod(kleene_plus)
+    try:
+        start = time.perf_counter()
+        nfa = re._compile(tree)
+        elapsed = time.perf_counter() - start
+    finally:
+        NFA.kleene_plus = saved
+    return len(NFA._get_all_reachable_states(nfa._start)), elapsed
+
+def fmt(value, width, spec=''):
+    if isinstance(value, str):
+        return '{:>{}}'.format(value, width)
+    return '{:>{}}'.format('-' if value is None else format(value, spec), width)
+
+def run():
+    print(' '.join([fmt('pattern', 8), fmt('depth', 6), fmt('NFA states', 10), fmt('time [s]', 10),
+        fmt('copy states', 12), fmt('copy [s]', 10)]))
+    for name, build in [('plus', nested_plus), ('mixed', nested_mixed)]:
+        for depth in depths:
+            pattern = build(depth)
+            states, elapsed = measure(pattern, NFA.kleene_plus)
+            copy_states, copy_time = None, None
+            if depth <= max_copy_depth:
+                try:
+                    copy_states, copy_time = measure(pattern, copying_kleene_plus)
+                except RecursionError:
+                    # the recursive deep copy overflows the stack
+                    copy_states = 'overflow'
+            print(' '.join([fmt(name, 8), fmt(depth, 6), fmt(states, 10), fmt(elapsed, 10, '.4f'),
+                fmt(copy_states, 12), fmt(copy_time, 10, '.4f')]))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,58 @@
+#encoding: utf8
+
+"""NFA simulation benchmark.
+
+Matches long strings with NFA matchers and compares the `PikeVM` used by
+`NFA.accept` with the previous simulation, which sliced the input and
+recomputed epsilon closures as sets on every character.
+
+Run from the repository root:
+    python -m benchmarks.nfa_bench
+"""
+
+import time
+
+from rejit.nfa import NFA
+from rejit.regex import Regex
+
+cases = [
+        ('(a|b)*abb', 'ab' * 500 + 'abb'),
+        ('[a-z]+@[a-z]+(.[a-z]+)*', 'x' * 500 + '@' + 'y.z' * 100),
+        ('(x+x+)+y', 'x' * 200),
+        ('.{0,100}z', 'a' * 100 + 'z'),
+    ]
+
+def set_simulation(nfa, s):
+    # the set-based simulation which `NFA.accept` used before `PikeVM`
+    states = {nfa._start}
+    while states:
+        states = NFA._moveEpsilon(states)
+        if not s:
+            break
+        states = NFA._moveChar(states, s[0])
+        s = s[1:]
+    return nfa._end in states and s == ''
+
+def measure(fun, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def run():
+    print('{:>24} {:>8} {:>10} {:>10} {:>8}'.format('pattern', 'length', 'sets [s]', 'VM [s]', 'speedup'))
+    for pattern, s in cases:
+        re = Regex(pattern)
+        # the set simulation needs the graph form of the NFA
+        nfa = re._compile(re._final_ast)
+        expected, sets_time = measure(lambda: set_simulation(nfa, s))
+        result, vm_time = measure(lambda: nfa.accept(s))
+        assert result == expected
+        print('{:>24} {:>8} {:>10.4f} {:>10.4f} {:>8.1f}'.format(
+            pattern, len(s), sets_time, vm_time, sets_time / vm_time))
+
+if __name__ == '__main__':
+    run()
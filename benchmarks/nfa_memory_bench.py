@@ -0,0 +1,59 @@
+#encoding: utf8
+
+"""NFA memory benchmark.
+
+Compiles patterns to NFAs and compares the graph of `State` objects built by
+`NFA` methods with the `CompactNFA` kept by `Regex`. Reports the memory held
+by each form, the number of objects tracked by the cyclic garbage collector,
+and the time of a full garbage collection while the NFA is alive.
+
+Run from the repository root:
+    python -m benchmarks.nfa_memory_bench
+"""
+
+import gc
+import time
+import tracemalloc
+
+from rejit.regex import Regex
+from rejit.compactnfa import CompactNFA
+
+patterns = [
+        ('keywords', '|'.join('keyword{}'.format(n) for n in range(2000))),
+        ('classes', '([a-zA-Z0-9_]|[-.+])*@[a-zA-Z0-9]+(.[a-zA-Z0-9_]+)*' * 100),
+        ('repetition', '(ab|cd){500}x{100,300}'),
+    ]
+
+def measure(fun):
+    # returns memory and gc-tracked objects still held after `fun` returns
+    gc.collect()
+    tracked = len(gc.get_objects())
+    tracemalloc.start()
+    result = fun()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, len(gc.get_objects()) - tracked
+
+def collection_time():
+    start = time.perf_counter()
+    gc.collect()
+    return time.perf_counter() - start
+
+def run():
+    print('{:>12} {:>8} {:>12} {:>12} {:>10} {:>10} {:>10} {:>10}'.format(
+        'pattern', 'states', 'graph [kB]', 'compact [kB]', 'graph obj', 'compact obj',
+        'graph gc', 'compact gc'))
+    for name, pattern in patterns:
+        re = Regex()
+        tree = re._transform(re._parse(pattern))
+        graph, graph_size, graph_objects = measure(lambda: re._compile(tree))
+        graph_gc = collection_time()
+        compact, compact_size, compact_objects = measure(lambda: CompactNFA(graph))
+        del graph
+        compact_gc = collection_time()
+        print('{:>12} {:>8} {:>12.1f} {:>12.1f} {:>10} {:>10} {:>9.4f}s {:>9.4f}s'.format(
+            name, compact.num_states, graph_size / 1024, compact_size / 1024,
+            graph_objects, compact_objects, graph_gc, compact_gc))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,62 @@
+#encoding: utf8
+
+"""AST optimizer benchmark.
+
+Compares automata built from patterns with and without the AST
+optimizations of `Regex._transform` (merging single characters into sets,
+factoring common prefixes and suffixes of alternatives, absorbing
+alternatives subsumed by `.` and dropping redundant `empty` nodes).
+Reports NFA and DFA state counts, and DFA construction time.
+
+Run from the repository root:
+    python -m benchmarks.optimizer_bench
+"""
+
+import random
+import time
+
+from rejit.nfa import NFA
+from rejit.dfa import DFA
+from rejit.regex import Regex
+
+def keywords(count, seed=0):
+    rand = random.Random(seed)
+    prefixes = ['get', 'set', 'is', 'has', 'on', 'un', 're', 'pre']
+    stems = ['Value', 'Name', 'Item', 'Count', 'State', 'Index', 'Size', 'Type', 'Mode', 'Key']
+    suffixes = ['', 's', 'ed', 'ing', 'Error', 'Changed']
+    words = set()
+    while len(words) < count:
+        words.add(rand.choice(prefixes) + rand.choice(stems) + rand.choice(suffixes))
+    return sorted(words)
+
+patterns = [
+        ('50 keywords', '|'.join(keywords(50))),
+        ('200 keywords', '|'.join(keywords(200))),
+        ('characters', '|'.join('abcdefghijklmnopqrstuvwxyz0123456789')),
+        ('dot absorbs', 'x(a|b|c|.|d|e)*y|x.*y'),
+    ]
+
+def nfa_states(nfa):
+    return len(NFA._get_all_reachable_states(nfa._start))
+
+def measure(nfa):
+    states = nfa_states(nfa)
+    start = time.perf_counter()
+    dfa = DFA(nfa)
+    elapsed = time.perf_counter() - start
+    return states, dfa.num_states, elapsed
+
+def run():
+    print('{:>14} {:>22} {:>22} {:>22}'.format('', 'NFA states', 'DFA states', 'DFA construction [s]'))
+    print('{:>14} {:>10} {:>11} {:>10} {:>11} {:>10} {:>11}'.format(
+        'pattern', 'before', 'after', 'before', 'after', 'before', 'after'))
+    for name, pattern in patterns:
+        re = Regex()
+        plain_ast = re._simplify_quant(re._flatten_nodes('union', re._flatten_nodes('concat', re._parse(pattern))))
+        before = measure(re._compile(plain_ast))
+        after = measure(re._compile(re._transform(re._parse(pattern))))
+        print('{:>14} {:>10} {:>11} {:>10} {:>11} {:>10.4f} {:>11.4f}'.format(
+            name, before[0], after[0], before[1], after[1], before[2], after[2]))
+
+if __name__ == '__main__':
+    run()
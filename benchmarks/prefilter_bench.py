@@ -0,0 +1,88 @@
+#encoding: utf8
+
+"""Literal prefilter benchmark.
+
+Matches log lines with `accept` and searches a whole log with `finditer`,
+using patterns with required literals. Reports times of DFA matchers with
+and without their prefilter, the prefilter's counters of rejected inputs
+and skipped characters, and times of JIT compiled regexes, which don't use
+the prefilter, for reference.
+
+Run from the repository root:
+    python -m benchmarks.prefilter_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+
+patterns = [
+        ('error', '.*ERROR [0-9]+.*', 'ERROR [0-9]+'),
+        ('timeout', '.*timeout after [0-9]+ms', 'timeout after [0-9]+ms'),
+        ('request', 'INFO [0-9]+ POST /login.*', 'POST /login'),
+    ]
+lines = 20000
+
+def measure(fun, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def log_line(rand):
+    level = rand.choice(['INFO'] * 30 + ['WARN'] * 5 + ['ERROR'])
+    message = rand.choice(['request done'] * 20 + ['timeout after {}ms'.format(rand.randint(1, 900))])
+    return '{} {} {} {} {}'.format(level, rand.randint(100, 999),
+            rand.choice(['GET', 'POST']), rand.choice(['/index', '/api/items', '/login']), message)
+
+def compiled(pattern, tier, prefilter=True):
+    regex = Regex(pattern)
+    if tier == 'JIT':
+        regex.compile_to_x86()
+    else:
+        regex.compile_to_DFA()
+    if not prefilter:
+        regex._prefilter = None
+    return regex
+
+def run():
+    rand = random.Random(0)
+    log = [log_line(rand) for _ in range(lines)]
+    text = '\n'.join(log)
+    print('{:>8} {:>8} {:>10} {:>12} {:>10} {:>10} {:>12} {:>12} {:>10} {:>12}'.format(
+        'pattern', 'accepted', 'accept [s]', 'filtered [s]', 'rejected', 'JIT [s]',
+        'finditer [s]', 'filtered [s]', 'skipped', 'JIT [s]'))
+    for name, line_pattern, search_pattern in patterns:
+        plain = compiled(line_pattern, 'DFA', False)
+        filtered = compiled(line_pattern, 'DFA')
+        jit = compiled(line_pattern, 'JIT')
+        expected, plain_time = measure(lambda: [plain.accept(s) for s in log])
+        # counters are read after a single run
+        assert [filtered.accept(s) for s in log] == expected
+        rejected = filtered.prefilter_info().rejected
+        _, filtered_time = measure(lambda: [filtered.accept(s) for s in log])
+        result, jit_time = measure(lambda: [jit.accept(s) for s in log])
+        assert result == expected
+
+        plain = compiled(search_pattern, 'DFA', False)
+        filtered = compiled(search_pattern, 'DFA')
+        jit = compiled(search_pattern, 'JIT')
+        # searchers are built by the first search
+        for regex in [plain, filtered, jit]:
+            regex.search('')
+        spans, plain_search = measure(lambda: [m[:2] for m in plain.finditer(text)])
+        assert [m[:2] for m in filtered.finditer(text)] == spans
+        skipped = filtered.prefilter_info().skipped
+        _, filtered_search = measure(lambda: [m[:2] for m in filtered.finditer(text)])
+        result, jit_search = measure(lambda: [m[:2] for m in jit.finditer(text)])
+        assert result == spans
+        print('{:>8} {:>8} {:>10.4f} {:>12.4f} {:>10} {:>10.4f} {:>12.4f} {:>12.4f} {:>10} {:>12.4f}'.format(
+            name, sum(expected), plain_time, filtered_time, rejected, jit_time,
+            plain_search, filtered_search, skipped, jit_search))
+
+if __name__ == '__main__':
+    run()
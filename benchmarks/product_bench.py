@@ -0,0 +1,63 @@
+#encoding: utf8
+
+"""Boolean combination benchmark.
+
+Matches inputs against rules like "A and not B" and "(A or B) and not C",
+once with a separate regex for every pattern, and once with a single regex
+built with boolean operators. Reports DFA sizes, construction times and
+matching times of DFA and JIT compiled matchers.
+
+Run from the repository root:
+    python -m benchmarks.product_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+
+rules = [
+        ('and not', ['[a-z0-9]+@[a-z]+(.[a-z]+)+', '.*@example.*'], lambda a, b: a and not b,
+            lambda a, b: a - b),
+        ('or and not', ['[0-9]+', '0x[0-9a-f]+', '0+.*'], lambda a, b, c: (a or b) and not c,
+            lambda a, b, c: (a | b) - c),
+    ]
+
+def measure(fun, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def run():
+    rand = random.Random(0)
+    inputs = [''.join(rand.choice('abex0123@.') for _ in range(rand.randint(0, 30))) for _ in range(5000)]
+    inputs += ['user{}@example.com'.format(n) for n in range(500)] + ['0x{:x}'.format(n) for n in range(500)]
+    print('{:>12} {:>8} {:>10} {:>12} {:>12} {:>12} {:>12}'.format('rule', 'matcher', 'states',
+        'build [s]', 'separate [s]', 'combined [s]', 'speedup'))
+    for name, patterns, check, combine in rules:
+        for matcher, compiler in [('DFA', Regex.compile_to_DFA), ('JIT', Regex.compile_to_x86)]:
+            def build_separate():
+                regexes = [Regex(pattern) for pattern in patterns]
+                for regex in regexes:
+                    compiler(regex)
+                return regexes
+            def build_combined():
+                regex = combine(*(Regex(pattern) for pattern in patterns))
+                compiler(regex)
+                return regex
+            separate, _ = measure(build_separate, repeat=1)
+            combined, build_time = measure(build_combined, repeat=1)
+            expected, separate_time = measure(
+                    lambda: [check(*(regex.accept(s) for regex in separate)) for s in inputs])
+            result, combined_time = measure(lambda: [combined.accept(s) for s in inputs])
+            assert result == expected
+            states = combined._matcher.num_states if matcher == 'DFA' else '-'
+            print('{:>12} {:>8} {:>10} {:>12.4f} {:>12.4f} {:>12.4f} {:>11.1f}x'.format(name, matcher, states,
+                build_time, separate_time, combined_time, separate_time / combined_time))
+
+if __name__ == '__main__':
+    run()
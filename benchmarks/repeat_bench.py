@@ -0,0 +1,57 @@
+#encoding: utf8
+
+"""Counted repetition benchmark.
+
+Compiles counted repetitions with growing bounds and reports NFA and DFA
+state counts and compilation times. Counted repetitions are expanded to
+nested optional copies `x(x(x)?)?`; for comparison the same repetitions are
+also written as a flat sequence of optional copies `xx?x?`. DFAs are built
+only for small bounds, where subset construction finishes quickly.
+
+Run from the repository root:
+    python -m benchmarks.repeat_bench
+"""
+
+import time
+
+from rejit.regex import Regex
+
+bounds = [10, 30, 100, 1000]
+max_dfa_bound = 100
+max_flat_bound = 30
+
+def patterns(n):
+    return [
+            ('.{{0,{}}}'.format(n), '.?' * n),
+            ('[0-9]{{1,{}}}'.format(n), '[0-9]' + '[0-9]?' * (n - 1)),
+            ('(ab|cd){{{}}}'.format(n), '(ab|cd)' * n),
+            ('x{{{},}}'.format(n), 'x' * n + 'x*'),
+        ]
+
+def measure(pattern, build_dfa):
+    start = time.perf_counter()
+    re = Regex(pattern)
+    nfa_time = time.perf_counter() - start
+    nfa_states = re._matcher.num_states
+    if not build_dfa:
+        return nfa_states, None, nfa_time, None
+    start = time.perf_counter()
+    re.compile_to_DFA()
+    dfa_time = time.perf_counter() - start
+    return nfa_states, re._matcher.num_states, nfa_time, dfa_time
+
+def fmt(value, width, spec=''):
+    return '{:>{}}'.format('-' if value is None else format(value, spec), width)
+
+def run():
+    print('{:>16} {:>10} {:>10} {:>10} {:>10} {:>14}'.format(
+        'pattern', 'NFA states', 'DFA states', 'NFA [s]', 'DFA [s]', 'flat DFA [s]'))
+    for n in bounds:
+        for pattern, flat_pattern in patterns(n):
+            nfa_states, dfa_states, nfa_time, dfa_time = measure(pattern, n <= max_dfa_bound)
+            flat_dfa_time = measure(flat_pattern, True)[3] if n <= max_flat_bound else None
+            print(' '.join([fmt(pattern, 16), fmt(nfa_states, 10), fmt(dfa_states, 10),
+                fmt(nfa_time, 10, '.4f'), fmt(dfa_time, 10, '.4f'), fmt(flat_dfa_time, 14, '.4f')]))
+
+if __name__ == '__main__':
+    run()
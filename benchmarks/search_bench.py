@@ -0,0 +1,86 @@
+#encoding: utf8
+
+"""Search benchmark.
+
+Finds all matches of log patterns in a generated log with `finditer` of
+regexes using DFAs and JIT compiled code, and compares them with Python's
+`re.finditer`. The quadratic emulation of a search, trying `accept` on
+every substring, is measured on a short prefix of the log, and its time
+is extrapolated to the whole log.
+
+Run from the repository root:
+    python -m benchmarks.search_bench
+"""
+
+import random
+import re
+import time
+
+from rejit.regex import Regex
+
+patterns = [
+        ('error', 'ERROR [0-9]+'),
+        ('address', '[0-9]+\\.[0-9]+\\.[0-9]+\\.[0-9]+'),
+        ('request', '(GET|POST) /[a-z/]*'),
+    ]
+lines = 20000
+emulated_lines = 5
+
+def measure(fun, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def log_line(rand):
+    level = rand.choice(['INFO', 'INFO', 'INFO', 'WARN', 'ERROR'])
+    address = '.'.join(str(rand.randint(0, 255)) for _ in range(4))
+    path = '/' + '/'.join(rand.choice(['api', 'user', 'items', 'login']) for _ in range(rand.randint(1, 3)))
+    return '{} {} {} {} {} took {}ms'.format(level, rand.randint(100, 999), address,
+            rand.choice(['GET', 'POST']), path, rand.randint(1, 500))
+
+def emulated(regex, s):
+    # the search emulated with `accept`, the leftmost-longest match of every
+    # start position is found by trying all substrings starting there
+    matches = []
+    pos = 0
+    while pos <= len(s):
+        for start in range(pos, len(s) + 1):
+            end = next((end for end in range(len(s), start - 1, -1) if regex.accept(s[start:end])), None)
+            if end is not None:
+                break
+        else:
+            break
+        matches.append((start, end))
+        pos = end if end > start else end + 1
+    return matches
+
+def run():
+    rand = random.Random(0)
+    log = [log_line(rand) for _ in range(lines)]
+    text = '\n'.join(log)
+    short = '\n'.join(log[:emulated_lines])
+    print('{:>10} {:>8} {:>14} {:>10} {:>10} {:>10}'.format(
+        'pattern', 'matches', 'accept [s]', 'DFA [s]', 'JIT [s]', 're [s]'))
+    for name, pattern in patterns:
+        dfa = Regex(pattern)
+        dfa.compile_to_DFA()
+        jit = Regex(pattern)
+        jit.compile_to_x86()
+        expected, emulated_time = measure(lambda: emulated(dfa, short), repeat=1)
+        assert expected == [(m.start, m.end) for m in dfa.finditer(short)]
+        spans, dfa_time = measure(lambda: [(m.start, m.end) for m in dfa.finditer(text)])
+        result, jit_time = measure(lambda: [(m.start, m.end) for m in jit.finditer(text)])
+        assert result == spans
+        # these patterns have no alternatives which are prefixes of others,
+        # so Python's leftmost-first matches are the same
+        result, re_time = measure(lambda: [m.span() for m in re.finditer(pattern, text)])
+        assert result == spans
+        print('{:>10} {:>8} {:>14.6f} {:>10.4f} {:>10.4f} {:>10.4f}'.format(name, len(spans),
+            emulated_time / emulated_lines * lines, dfa_time, jit_time, re_time))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,53 @@
+#encoding: utf8
+
+"""Sink state benchmark.
+
+Matches multi-kilobyte inputs with patterns which reach a state where the
+result is known early, like a trailing `.*` or an impossible prefix.
+Reports matching times of DFAs which stop in sink states, DFAs which read
+the whole input, and JIT compiled code, which also stops in sink states.
+
+Run from the repository root:
+    python -m benchmarks.sink_bench
+"""
+
+import random
+import time
+
+from rejit.regex import Regex
+from rejit.dfa import DFA
+from rejit.jitmatcher import JITMatcher
+
+patterns = [
+        ('prefix', 'GET /[a-z]+ .*'),
+        ('header', '[A-Z][a-z]*(\\-[a-z]+)*: .*'),
+        ('mismatch', 'POST /.*'),
+    ]
+length = 8192
+
+def measure(fun, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fun()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def run():
+    rand = random.Random(0)
+    tail = ''.join(rand.choice('abcdefgh /:') for _ in range(length))
+    inputs = ['GET /index ' + tail, 'Content-type: ' + tail, 'GET ' + tail]
+    print('{:>10} {:>12} {:>12} {:>10}'.format('pattern', 'sinks [s]', 'whole [s]', 'JIT [s]'))
+    for name, pattern in patterns:
+        dfa = DFA(Regex(pattern)._matcher)
+        jit = JITMatcher(dfa)
+        expected, sinks_time = measure(lambda: [dfa.accept(s) for s in inputs])
+        result, whole_time = measure(lambda: [bool(dfa._accepting[dfa._final_number(s)]) for s in inputs])
+        assert result == expected
+        result, jit_time = measure(lambda: [jit.accept(s) for s in inputs])
+        assert result == expected
+        print('{:>10} {:>12.6f} {:>12.6f} {:>10.6f}'.format(name, sinks_time, whole_time, jit_time))
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,173 @@
+#encoding: utf8
+
+"""Subset construction benchmark.
+
+Builds DFAs of patterns which NFAs have hundreds to thousands of states with
+`DFA` and with the subset construction of the baseline `rejit`, vendored
+below unchanged as `BaselineDFA`. It named sets of NFA states with sorted,
+comma-joined strings, merged transitions of NFA states for every set it met
+and computed epsilon closures with set operations. Both constructions get the
+same graph NFA, built without AST optimizations, so its edges are single
+characters and `any`, which the baseline supports. `DFA` converts it to
+a `CompactNFA` within the measured time.
+
+Run from the repository root:
+    python -m benchmarks.subset_bench
+"""
+
+import collections
+import functools
+import time
+
+from rejit.regex import Regex
+from rejit.nfa import NFA
+from rejit.nfa import NFAInvalidError
+from rejit.dfa import DFA
+
+patterns = [
+        ('keywords', '|'.join('keyword{}'.format(n) for n in range(300))),
+        ('repetition', '(ab|cd){300}x{10,40}'),
+        ('suffix', '(a|b)*a(a|b){8}' + 'c' * 1000),
+        ('optional', '(a|b)*a' + '(a|b)?' * 170),
+        ('any', '(.*ab)' * 60),
+    ]
+
+class BaselineDFA:
+    # `DFA.__init__` and its helpers from the baseline `rejit/dfa.py`
+
+    def __init__(self, nfa):
+        if not nfa.valid:
+            raise NFAInvalidError('Trying to use an invalid NFA object')
+
+        # all nfa's states reachable from the start state
+        nfa_states = frozenset(NFA._get_all_reachable_states(nfa._start))
+
+        # nfa described without use of epsilon edges.
+        # nfa_state_edges is constructed as {state_num: {char: {state_num}}}
+        # which maps state_num to dictionaries which map each char to 
+        # a set of state_nums which are reachable from the state using that char
+        nfa_state_edges = {
+                st._state_num: BaselineDFA._nfa_char2statenum_set(st)
+                for st in nfa_states
+            }
+
+        # newstates is an early representation of the constructed DFA
+        # newstates is constructed as {multiname: {char: {state_num}}} where
+        # multiname key is a string which describes a set of states from the nfa
+        # and it points to a dictionary which map each char to a set of 
+        # state_nums which are reachable from the set of states using that char.
+        # newstates is initialized with multistates which correspond to 
+        # the nfa's states.
+        newstates = {BaselineDFA._multistate_name({num}): c2s for num,c2s in nfa_state_edges.items()}
+
+        # m2ss dict maps multiname to a corresponding state_num set
+        m2ss = {BaselineDFA._multistate_name({num}): {num} for num in nfa_state_edges}
+
+        # toadd contains sets of state_nums which are multistates to be added to newstates
+        toadd = [s for st,d in nfa_state_edges.items() for char,s in d.items()]
+
+        while toadd:
+            states = toadd.pop()
+            name = BaselineDFA._multistate_name(states)
+            # check if they are already added, if not create a multistate by merging singlestates
+            if name not in newstates:
+                _, c2s = BaselineDFA._merge_states(states,nfa_state_edges)
+                newstates[name] = c2s
+                m2ss[name] = states
+                # merging multistate could create new multistates to add 
+                for char,s in c2s.items():
+                    toadd.append(s)
+
+        # convert newstates to {multiname:{char:multiname}} dict
+        for st,c2s in newstates.items():
+            for c,s in c2s.items():
+                c2s[c] = BaselineDFA._multistate_name(s)
+
+        # end states are multistates which contain nfa._end state ...
+        end_states = set(filter(lambda st: nfa._end._state_num in m2ss[st], newstates))
+        # ... and singlestates from nfa which can reach nfa._end with epsilon-moves
+        end_states |= set(map(
+            lambda st: BaselineDFA._multistate_name({st._state_num}), 
+            filter(lambda st: nfa._end in NFA._moveEpsilon({st}), nfa_states)))
+
+        # filter unreachable multistates from newstates
+        reachable_newstates = set()
+        to_check = {BaselineDFA._multistate_name({nfa._start._state_num})}
+        while to_check:
+            st = to_check.pop()
+            reachable_newstates.add(st)
+            to_check |= set(filter(lambda x: x not in reachable_newstates, newstates[st].values()))
+
+        newstates = dict(filter(lambda kv: kv[0] in reachable_newstates, newstates.items()))
+
+        # filter unreachable multistates from end_states
+        end_states = set(filter(lambda st: st in reachable_newstates, end_states))
+
+        # save relevant data
+        # start state
+        self._start = BaselineDFA._multistate_name({nfa._start._state_num})
+        # DFA state/edge dict
+        self._states_edges = newstates
+        # set of accepting states
+        self._end_states = frozenset(end_states)
+        # description
+        self._description = nfa.description
+
+    @staticmethod
+    def _nfa_reachable_noneps_edges(state):
+        return filter(lambda e: e[0], functools.reduce(lambda x,y: x+y,[s._edges for s in NFA._moveEpsilon({state})]))
+
+    @staticmethod
+    def _nfa_char2statenum_set(st):
+        char2statenum_set = collections.defaultdict(lambda: set())
+        # gather all non-epsilon edges reachable from `st`
+        # for each char in edges find all states reachable using that char
+        for e in BaselineDFA._nfa_reachable_noneps_edges(st):
+            char2statenum_set[e[0]] |= {e[1]._state_num} | set(map(lambda x: x._state_num, NFA._moveEpsilon({e[1]})))
+        # if `any` edge reachable, than all other chars can use it too
+        if 'any' in char2statenum_set:
+            for char in char2statenum_set:
+                char2statenum_set[char] |= char2statenum_set['any']
+        return char2statenum_set
+
+    @staticmethod
+    def _multistate_name(states):
+        return functools.reduce(lambda acc, x: acc + ',' + x, sorted(map(str,states)))
+
+    @staticmethod
+    def _merge_states(merged_states,nfa_states_edges):
+        name = BaselineDFA._multistate_name(merged_states)
+        char2statenum_set = collections.defaultdict(lambda: set())
+        for st in merged_states:
+            merged_c2s = nfa_states_edges[st]
+            for c in merged_c2s:
+                char2statenum_set[c] |= merged_c2s[c]
+            if 'any' in char2statenum_set:
+                for char in char2statenum_set:
+                    char2statenum_set[char] |= char2statenum_set['any']
+        return name, char2statenum_set
+
+def graph_nfa(pattern):
+    # a NFA with single character and `any` edges, counted repetitions are
+    # expanded, unions of characters aren't merged into sets
+    re = Regex()
+    return re._compile(re._expand_repeat(re._parse(pattern)))
+
+def measure(fun):
+    start = time.perf_counter()
+    result = fun()
+    return result, time.perf_counter() - start
+
+def run():
+    print('{:>12} {:>10} {:>10} {:>10} {:>12} {:>12} {:>8}'.format(
+        'pattern', 'NFA states', 'old states', 'DFA states', 'baseline [s]', 'DFA [s]', 'speedup'))
+    for name, pattern in patterns:
+        nfa = graph_nfa(pattern)
+        num_states = len(NFA._get_all_reachable_states(nfa._start))
+        dfa, new_time = measure(lambda: DFA(nfa))
+        old, old_time = measure(lambda: BaselineDFA(nfa))
+        print('{:>12} {:>10} {:>10} {:>10} {:>12.4f} {:>12.4f} {:>7.1f}x'.format(
+            name, num_states, len(old._states_edges), dfa.num_states, old_time, new_time, old_time / new_time))
+
+if __name__ == '__main__':
+    run()
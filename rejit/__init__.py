@@ -0,0 +1,3 @@
+#encoding: utf8
+
+from rejit.cache import compile, purge, cache_info
@@ -0,0 +1,143 @@
+#encoding: utf8
+
+import bisect
+
+import rejit.charset as charset
+from rejit.common import RejitError
+
+class BitParallelError(RejitError): pass
+
+class BitParallelMatcher:
+    """Bit-parallel simulation of an epsilon-free NFA.
+
+    The set of current NFA states is a Python integer with bit `st` set for
+    every current state `st`. An epsilon-free NFA built by `rejit.glushkov`
+    has all edges entering a state labeled the same way, so a step of the
+    simulation is:
+
+        states = follow(states) & masks[char]
+
+    where `masks[char]` has bits of states entered by `char` edges and
+    `follow(states)` has bits of all targets of edges leaving `states`.
+    `follow` is computed 8 bits at a time, from tables mapping each byte of
+    the state vector to an OR of targets of its states. Table entries are
+    computed on the first use. Masks of ASCII characters are precomputed,
+    masks of other characters are found with a binary search in the sorted
+    intervals of edge labels.
+
+    A step takes a few integer operations per 8 states, for any pattern, and
+    there's no DFA state explosion, which makes the matcher a good fit for
+    patterns like `(a|b)*a(a|b){20}`. A `BitParallelMatcher` can be used by
+    many threads at once.
+
+    Attributes:
+    max_states (int): the largest supported number of NFA states
+    _ends (int): bits of accepting states
+    _follow (list of int): maps each state to bits of its edges' targets
+    _follow_tables (list of list): maps each byte of the state vector to
+        a list of 256 follow masks, None for masks not computed yet
+    _ascii_masks (list of int): masks of characters with codes below 128
+    _bounds (list of int): first codes of intervals with equal masks
+    _masks (list of int): masks of the intervals
+    """
+
+    max_states = 1024
+    chunk_bits = 8
+
+    def __init__(self, nfa):
+        """Precompute follow sets and character masks of `nfa`.
+
+        Raises:
+        BitParallelError: if `nfa` has epsilon edges, edges with different
+            labels entering the same state, or more than `max_states` states
+
+        Args:
+        nfa (CompactNFA): an epsilon-free NFA, like one returned by
+            `rejit.glushkov.build`
+        """
+        if nfa._eps_targets:
+            raise BitParallelError('Bit-parallel simulation needs a NFA without epsilon edges')
+        if nfa.num_states > BitParallelMatcher.max_states:
+            raise BitParallelError('Too many NFA states for bit-parallel simulation: {} > {}'.format(
+                nfa.num_states, BitParallelMatcher.max_states))
+        self._description = nfa.description
+        self._follow = [0] * nfa.num_states
+        # labels[target] - set of labels of edges entering `target`, a label
+        # is a tuple of (first, last) ranges of edges from one state
+        labels = {}
+        for st in range(nfa.num_states):
+            entering = {}
+            for e in range(nfa._offsets[st], nfa._offsets[st+1]):
+                target = nfa._targets[e]
+                self._follow[st] |= 1 << target
+                entering.setdefault(target, []).append((max(nfa._firsts[e], 0), nfa._lasts[e]))
+            for target, ranges in entering.items():
+                labels.setdefault(target, set()).add(tuple(sorted(ranges)))
+        if any(len(entering_labels) > 1 for entering_labels in labels.values()):
+            raise BitParallelError('States must be entered by edges with the same label')
+        self._start = 1 << nfa._start
+        self._ends = sum(1 << st for st in nfa._ends)
+        # intervals of codes with the masks of states they enter
+        labeled = [
+                ((chr(first), chr(last)), {target})
+                for target, entering_labels in labels.items()
+                for first, last in next(iter(entering_labels))
+            ]
+        self._bounds = []
+        self._masks = []
+        for (first, last), targets in charset.partition(labeled):
+            if self._bounds and self._bounds[-1] == ord(first):
+                self._masks[-1] = sum(1 << target for target in targets)
+            else:
+                self._bounds.append(ord(first))
+                self._masks.append(sum(1 << target for target in targets))
+            # codes after the interval enter no states
+            self._bounds.append(ord(last) + 1)
+            self._masks.append(0)
+        self._ascii_masks = [self._char_mask(code) for code in range(128)]
+        chunks = (nfa.num_states + BitParallelMatcher.chunk_bits - 1) // BitParallelMatcher.chunk_bits
+        self._follow_tables = [[None] * (1 << BitParallelMatcher.chunk_bits) for _ in range(chunks)]
+
+    @property
+    def description(self):
+        return self._description
+
+    def accept(self, s):
+        """Check if the NFA accepts the whole string `s`."""
+        states = self._start
+        ascii_masks = self._ascii_masks
+        for char in s:
+            code = ord(char)
+            mask = ascii_masks[code] if code < 128 else self._char_mask(code)
+            states = self._follow_states(states) & mask
+            if not states:
+                return False
+        return bool(states & self._ends)
+
+    def _char_mask(self, code):
+        # bits of states entered by the character with `code`
+        index = bisect.bisect_right(self._bounds, code) - 1
+        return self._masks[index] if index >= 0 else 0
+
+    def _follow_states(self, states):
+        # bits of targets of all edges leaving `states`
+        result = 0
+        bits = BitParallelMatcher.chunk_bits
+        low_mask = (1 << bits) - 1
+        chunk = 0
+        while states:
+            byte = states & low_mask
+            if byte:
+                table = self._follow_tables[chunk]
+                follow = table[byte]
+                if follow is None:
+                    # threads computing the same entry store equal values
+                    follow = 0
+                    for bit in range(bits):
+                        if byte >> bit & 1:
+                            follow |= self._follow[chunk * bits + bit]
+                    table[byte] = follow
+                result |= follow
+            states >>= bits
+            chunk += 1
+        return result
@@ -0,0 +1,112 @@
+#encoding: utf8
+
+import collections
+import threading
+
+from rejit.regex import Regex
+from rejit.regex import RegexCompilationError
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+class RegexCache:
+    """Bounded LRU cache of compiled `Regex` objects.
+
+    Compiled regexes are kept under a `(pattern, engine)` key. When the cache
+    is full, the least recently used regex is evicted to make room for a new
+    one. The cache counts hits, misses and evictions, which can be read with
+    `info`.
+
+    The cache can be shared by many threads. Compilation is done outside of
+    the cache's lock, so two threads missing the same key at once can both
+    compile it, but only one of the results is kept.
+
+    Attributes:
+    maxsize (int): the maximal number of cached regexes
+    _regexes (OrderedDict): cached regexes, the most recently used at the end
+    _lock (Lock): lock guarding `_regexes` and the counters
+    """
+
+    engines = {'nfa': None, 'dfa': Regex.compile_to_DFA, 'jit': Regex.compile_to_x86,
+            'bitparallel': Regex.compile_to_bitparallel, 'lazydfa': Regex.compile_to_lazy_DFA,
+            'adaptive': Regex.enable_tiering}
+    """Maps engine names to `Regex` methods which compile regexes for them."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._regexes = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, pattern, engine='nfa'):
+        """Return a compiled regex for `pattern`, compiling it on a miss.
+
+        Raises:
+        RegexCompilationError: if `engine` is unknown
+        RegexParseError: if `pattern` is invalid. Nothing is cached then.
+
+        Args:
+        pattern (str): the regular expression
+        engine (str): the matcher type of the returned regex: 'nfa', 'dfa',
+            'jit', 'bitparallel', 'lazydfa' or 'adaptive' for a regex which promotes its
+            matcher as it gets used (see `Regex.enable_tiering`)
+
+        Returns:
+        A `Regex` object with a matcher of the requested type. The object is
+        shared with other callers, so it shouldn't be compiled further.
+        """
+        if engine not in RegexCache.engines:
+            raise RegexCompilationError('Unknown engine: {}'.format(engine))
+        key = (pattern, engine)
+        with self._lock:
+            regex = self._regexes.get(key)
+            if regex is not None:
+                self._regexes.move_to_end(key)
+                self._hits += 1
+                return regex
+            self._misses += 1
+        regex = Regex(pattern)
+        if RegexCache.engines[engine]:
+            RegexCache.engines[engine](regex)
+        with self._lock:
+            if key in self._regexes:
+                return self._regexes[key]
+            while self._regexes and len(self._regexes) >= self.maxsize:
+                self._regexes.popitem(last=False)
+                self._evictions += 1
+            if self.maxsize > 0:
+                self._regexes[key] = regex
+        return regex
+
+    def purge(self):
+        """Remove all regexes from the cache and reset the counters."""
+        with self._lock:
+            self._regexes.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def info(self):
+        """Return cache statistics as a `CacheInfo` named tuple."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, self.maxsize, len(self._regexes))
+
+_MAXCACHE = 512
+
+_cache = RegexCache(_MAXCACHE)
+
+def compile(pattern, engine='nfa'):
+    """Return a compiled regex for `pattern` from the process-wide cache.
+
+    See `RegexCache.get` for details.
+    """
+    return _cache.get(pattern, engine)
+
+def purge():
+    """Clear the process-wide regex cache."""
+    _cache.purge()
+
+def cache_info():
+    """Return statistics of the process-wide regex cache."""
+    return _cache.info()
@@ -0,0 +1,102 @@
+#encoding: utf8
+
+"""Character sets represented as sorted sets of intervals.
+
+A character set is a tuple of `(first, last)` pairs of characters. Each pair
+is an inclusive interval of characters. In a normalized set the intervals are
+sorted, don't overlap and aren't adjacent, so every set has exactly one
+normalized form. Large sets, like `[^a]` which contains almost all of Unicode,
+take only a few intervals.
+"""
+
+import bisect
+
+min_char = '\x00'
+max_char = '\U0010ffff'
+
+def normalize(items):
+    """Return a normalized set of intervals.
+
+    Args:
+    items (iterable): `(first, last)` pairs of characters and single
+        characters. Intervals can overlap, and empty intervals, where `first`
+        is after `last`, are skipped.
+
+    Returns:
+    A tuple of sorted, disjoint and non-adjacent `(first, last)` pairs.
+    """
+    intervals = sorted(
+            (ord(item[0]), ord(item[1])) if isinstance(item, tuple) else (ord(item), ord(item))
+            for item in items)
+    merged = []
+    for first, last in intervals:
+        if first > last:
+            continue
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1][1] = last
+        else:
+            merged.append([first, last])
+    return tuple((chr(first), chr(last)) for first, last in merged)
+
+def complement(intervals):
+    """Return a normalized set of all characters not in normalized `intervals`."""
+    result = []
+    first = 0
+    for low, high in intervals:
+        if ord(low) > first:
+            result.append((chr(first), chr(ord(low) - 1)))
+        first = ord(high) + 1
+    if first <= ord(max_char):
+        result.append((chr(first), max_char))
+    return tuple(result)
+
+def contains(intervals, char):
+    """Check if a character belongs to normalized `intervals`."""
+    index = bisect.bisect_right(intervals, (char, max_char))
+    return index > 0 and intervals[index - 1][1] >= char
+
+def size(intervals):
+    """Return the number of characters in normalized `intervals`."""
+    return sum(ord(high) - ord(low) + 1 for low, high in intervals)
+
+def partition(labeled):
+    """Split overlapping labeled intervals into disjoint ones.
+
+    Every character covered by the input ends up in exactly one output
+    interval, labeled with the union of labels of all input intervals which
+    contain the character. Neighbouring output intervals with the same labels
+    are merged.
+
+    Args:
+    labeled (iterable of tuple((str, str), set)): pairs of an interval and
+        a set of labels
+
+    Returns:
+    A sorted list of `((first, last), labels)` pairs, where `labels` is
+    a frozenset.
+    """
+    # sweep over interval boundaries, keeping intervals which cover the
+    # current point in `active`
+    events = []
+    for index, ((low, high), labels) in enumerate(labeled):
+        events.append((ord(low), 1, index, labels))
+        events.append((ord(high) + 1, -1, index, labels))
+    events.sort(key=lambda e: (e[0], e[1]))
+    active = {}
+    result = []
+    start = None
+    current = frozenset()
+    for point, kind, index, labels in events:
+        if start is not None and point > start and current:
+            if result and ord(result[-1][0][1]) + 1 == start and result[-1][1] == current:
+                result[-1] = ((result[-1][0][0], chr(point - 1)), current)
+            else:
+                result.append(((chr(start), chr(point - 1)), current))
+        if kind == 1:
+            active[index] = labels
+        else:
+            del active[index]
+        start = point
+        current = frozenset().union(*active.values())
+    return result
@@ -2,8 +2,24 @@
 
 import string
 
+# keep in sync with setup.py
+version = '0.2'
+
 class RejitError(Exception): pass
 
+class BudgetExceededError(RejitError):
+    """Compilation was stopped because it exceeded a budget.
+
+    Attributes:
+    budget (str): name of the budget, e.g. 'dfa_states'
+    limit (int): the exceeded limit
+    """
+
+    def __init__(self, budget, limit):
+        super().__init__('Compilation exceeded the {} budget of {}'.format(budget, limit))
+        self.budget = budget
+        self.limit = limit
+
 supported_chars = string.ascii_letters + string.digits + '`~!@#$%&=_{}:;"\'<>,/'
 
 special_chars = '\\^*()-+[]|?.'
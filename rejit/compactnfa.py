@@ -0,0 +1,190 @@
+#encoding: utf8
+
+import array
+
+import rejit.charset as charset
+
+ANY = -1
+"""The `first` code of an 'any' edge, which makes it a range of all chars."""
+
+class CompactNFA:
+    """NFA stored in flat integer arrays.
+
+    A `CompactNFA` is converted from a NFA built with `NFA` generation and
+    combination methods, which is left unchanged, or built directly by
+    `rejit.glushkov`. States reachable from the NFA's start are numbered from
+    0 in depth-first order and edges are kept in `array.array` tables indexed
+    by state numbers, in a compressed sparse row layout: edges of state `st`
+    are at indexes from `offsets[st]` to `offsets[st+1]` of the edge arrays.
+
+    Consuming edges are stored as inclusive ranges of character codes. A char
+    edge is a range of one character and an 'any' edge has `first` equal to
+    `ANY`, so a code matches an edge if `first <= code <= last` for all edge
+    types. Epsilon edges are kept in separate tables.
+
+    Unlike a graph of `State` objects, the arrays hold no references to other
+    objects, so the cyclic garbage collector sees a few objects per NFA
+    instead of a few per state, and an edge takes 12 bytes. `Regex` keeps its
+    NFA matcher in this form, and `DFA` and `PikeVM` are built from it.
+
+    Attributes:
+    description (str): read-only property containing regular expression
+        equivalent of the NFA
+    num_states (int): read-only property, the number of states
+    _start (int): number of the start state, always 0
+    _ends (frozenset of int): numbers of accepting states. A NFA converted
+        from a graph has one, the end state, or none if it's unreachable.
+    _offsets, _firsts, _lasts, _targets (array): consuming edges
+    _eps_offsets, _eps_targets (array): epsilon edges
+    _vm (PikeVM): simulator used by `accept`, created on the first use
+    """
+
+    def __init__(self, nfa, numbers=None):
+        """Convert a valid graph NFA to the compact form.
+
+        Args:
+        nfa (NFA): a valid NFA
+        numbers (dict): state numbers returned by `state_numbers(nfa)`,
+            computed if not given
+        """
+        if numbers is None:
+            numbers = CompactNFA.state_numbers(nfa)
+        edges = []
+        eps_edges = []
+        for st in numbers:
+            edges.append([])
+            eps_edges.append([])
+            for label, target in st._edges:
+                if label == '':
+                    eps_edges[-1].append(numbers[target])
+                    continue
+                if label == 'any':
+                    first, last = ANY, ord(charset.max_char)
+                elif isinstance(label, tuple):
+                    first, last = ord(label[0]), ord(label[1])
+                else:
+                    first = last = ord(label)
+                edges[-1].append((first, last, numbers[target]))
+        ends = {numbers[nfa._end]} if nfa._end in numbers else set()
+        self._set_tables(edges, eps_edges, ends, nfa.description)
+
+    @staticmethod
+    def _from_edges(edges, eps_edges, ends, description):
+        """Create a `CompactNFA` from lists of edges.
+
+        Args:
+        edges (list of list): maps each state number to a list of its
+            `(first, last, target)` consuming edges, where `first` and `last`
+            are character codes
+        eps_edges (list of list): maps each state number to a list of targets
+            of its epsilon edges
+        ends (iterable of int): accepting states
+        description (str): regular expression equivalent of the NFA
+        """
+        cnfa = CompactNFA.__new__(CompactNFA)
+        cnfa._set_tables(edges, eps_edges, ends, description)
+        return cnfa
+
+    def _set_tables(self, edges, eps_edges, ends, description):
+        self._offsets = array.array('i', [0])
+        self._firsts = array.array('i')
+        self._lasts = array.array('i')
+        self._targets = array.array('i')
+        self._eps_offsets = array.array('i', [0])
+        self._eps_targets = array.array('i')
+        for state_edges, state_eps in zip(edges, eps_edges):
+            for first, last, target in state_edges:
+                self._firsts.append(first)
+                self._lasts.append(last)
+                self._targets.append(target)
+            self._eps_targets.extend(state_eps)
+            self._offsets.append(len(self._targets))
+            self._eps_offsets.append(len(self._eps_targets))
+        self._start = 0
+        self._ends = frozenset(ends)
+        self._description = description
+        self._vm = None
+
+    @staticmethod
+    def state_numbers(nfa):
+        """Return a dict mapping states reachable in `nfa` to their numbers.
+
+        The numbering is the same as in `CompactNFA(nfa)`, so it can be used
+        to find states of a graph NFA in its compact form.
+        """
+        numbers = {nfa._start: 0}
+        stack = [nfa._start]
+        while stack:
+            for _, target in reversed(stack.pop()._edges):
+                if target not in numbers:
+                    numbers[target] = len(numbers)
+                    stack.append(target)
+        return numbers
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def valid(self):
+        return True
+
+    @property
+    def num_states(self):
+        return len(self._offsets) - 1
+
+    def accept(self, s):
+        """Check if a string belongs to the NFA's accepted language."""
+        # imported here, `rejit.pikevm` uses this module
+        from rejit.pikevm import PikeVM
+        if self._vm is None:
+            self._vm = PikeVM(self)
+        return self._vm.accept(s)
+
+    def nbytes(self):
+        """Return the number of bytes used by the edge tables."""
+        tables = [self._offsets, self._firsts, self._lasts, self._targets, self._eps_offsets, self._eps_targets]
+        return sum(len(t) * t.itemsize for t in tables)
+
+    def _edges(self, state):
+        # consuming edges of `state` as (label, target) with labels like
+        # in `State`: a char, a (first, last) range or 'any'
+        for e in range(self._offsets[state], self._offsets[state+1]):
+            first, last = self._firsts[e], self._lasts[e]
+            if first == ANY:
+                label = 'any'
+            elif first == last:
+                label = chr(first)
+            else:
+                label = (chr(first), chr(last))
+            yield label, self._targets[e]
+
+    def _epsilon_closure(self, state):
+        # set of states reachable from `state` with epsilon edges, including it
+        closure = {state}
+        stack = [state]
+        while stack:
+            st = stack.pop()
+            for e in range(self._eps_offsets[st], self._eps_offsets[st+1]):
+                target = self._eps_targets[e]
+                if target not in closure:
+                    closure.add(target)
+                    stack.append(target)
+        return closure
+
+def compact(nfa, accept_tags=None):
+    """Return `nfa` in the compact form, and `accept_tags` keyed by its states.
+
+    Args:
+    nfa (NFA or CompactNFA): a valid NFA
+    accept_tags (dict): maps states to tags. States of a graph NFA are `State`
+        objects, states of a `CompactNFA` are numbers.
+
+    Returns:
+    A tuple of a `CompactNFA` and a dict mapping its state numbers to tags.
+    """
+    if isinstance(nfa, CompactNFA):
+        return nfa, dict(accept_tags or {})
+    numbers = CompactNFA.state_numbers(nfa)
+    tags = {numbers[st]: tag for st, tag in (accept_tags or {}).items() if st in numbers}
+    return CompactNFA(nfa, numbers), tags
@@ -1,148 +1,729 @@
 #encoding: utf8
 
-import functools
+import array
+import bisect
 import collections
+import collections.abc
+import itertools
+import mmap as mmap_module
+import os
+import struct
+import sys
+import tempfile
 
+import rejit.charset as charset
+from rejit.common import RejitError
+from rejit.common import BudgetExceededError
 from rejit.nfa import NFA
 from rejit.nfa import NFAInvalidError
+from rejit.compactnfa import compact
 
 try:
     import graphviz
 except ImportError:
     pass
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class DFAError(RejitError): pass
+
 class DFA:
-    def __init__(self, nfa):
+    def __init__(self, nfa, accept_tags=None, max_states=None, max_transitions=None):
+        # `accept_tags` optionally maps NFA states to tags. Every DFA state
+        # is tagged with tags of all NFA states it represents, which lets
+        # a DFA built from a union of NFAs tell which of them accepted.
+        # A graph NFA is converted to a `CompactNFA` first, with tags
+        # keyed by its state numbers.
+        # Construction stops with `BudgetExceededError` as soon as the DFA
+        # has more than `max_states` states or `max_transitions` transitions
+        # to non-rejecting states, counted per character class.
         if not nfa.valid:
             raise NFAInvalidError('Trying to use an invalid NFA object')
+        nfa, accept_tags = compact(nfa, accept_tags)
+        accept_tags = accept_tags or {}
 
-        # all nfa's states reachable from the start state
-        nfa_states = frozenset(NFA._get_all_reachable_states(nfa._start))
+        closure, bounds, class_edges = DFA._subset_alphabet(nfa, accept_tags)
+        nclasses = len(bounds)
 
-        # nfa described without use of epsilon edges.
-        # nfa_state_edges is constructed as {state_num: {char: {state_num}}}
-        # which maps state_num to dictionaries which map each char to 
-        # a set of state_nums which are reachable from the state using that char
-        nfa_state_edges = {
-                st._state_num: DFA._nfa_char2statenum_set(st)
-                for st in nfa_states
-            }
+        # subset construction, every DFA state is numbered when it's found
+        # and its row is computed once, as (first class, end class, target)
+        # runs of non-rejecting transitions
+        start = closure(nfa._start)
+        numbers = {start: 0}
+        sets = [start]
+        runs = []
+        members = []
+        transitions = 0
+        while len(members) < len(sets):
+            members.append(DFA._bits(sets[len(members)]))
+            edges = [edge for num in members[-1] for edge in class_edges[num]]
+            if len(edges) == 1:
+                masks = edges
+            else:
+                # masks of intervals between classes where the set of
+                # matching edges changes, every edge is added to intervals
+                # it covers
+                cuts = sorted({cls for first, end, _ in edges for cls in (first, end)})
+                interval_masks = [0] * len(cuts)
+                for first, end, target in edges:
+                    for interval in range(bisect.bisect_left(cuts, first), bisect.bisect_left(cuts, end)):
+                        interval_masks[interval] |= target
+                masks = zip(cuts, cuts[1:], interval_masks)
+            row = []
+            for first, end, mask in masks:
+                if mask:
+                    number = numbers.get(mask)
+                    if number is None:
+                        number = numbers[mask] = len(sets)
+                        sets.append(mask)
+                    row.append((first, end, number))
+                    transitions += end - first
+            runs.append(row)
+            if max_states is not None and len(sets) > max_states:
+                raise BudgetExceededError('dfa_states', max_states)
+            if max_transitions is not None and transitions > max_transitions:
+                raise BudgetExceededError('dfa_transitions', max_transitions)
 
-        # newstates is an early representation of the constructed DFA
-        # newstates is constructed as {multiname: {char: {state_num}}} where
-        # multiname key is a string which describes a set of states from the nfa
-        # and it points to a dictionary which map each char to a set of 
-        # state_nums which are reachable from the set of states using that char.
-        # newstates is initialized with multistates which correspond to 
-        # the nfa's states.
-        newstates = {DFA._multistate_name({num}): c2s for num,c2s in nfa_state_edges.items()}
-
-        # m2ss dict maps multiname to a corresponding state_num set
-        m2ss = {DFA._multistate_name({num}): {num} for num in nfa_state_edges}
-
-        # toadd contains sets of state_nums which are multistates to be added to newstates
-        toadd = [s for st,d in nfa_state_edges.items() for char,s in d.items()]
-
-        while toadd:
-            states = toadd.pop()
-            name = DFA._multistate_name(states)
-            # check if they are already added, if not create a multistate by merging singlestates
-            if name not in newstates:
-                _, c2s = DFA._merge_states(states,nfa_state_edges)
-                newstates[name] = c2s
-                m2ss[name] = states
-                # merging multistate could create new multistates to add 
-                for char,s in c2s.items():
-                    toadd.append(s)
-
-        # convert newstates to {multiname:{char:multiname}} dict
-        for st,c2s in newstates.items():
-            for c,s in c2s.items():
-                c2s[c] = DFA._multistate_name(s)
-
-        # end states are multistates which contain nfa._end state ...
-        end_states = set(filter(lambda st: nfa._end._state_num in m2ss[st], newstates))
-        # ... and singlestates from nfa which can reach nfa._end with epsilon-moves
-        end_states |= set(map(
-            lambda st: DFA._multistate_name({st._state_num}), 
-            filter(lambda st: nfa._end in NFA._moveEpsilon({st}), nfa_states)))
-
-        # filter unreachable multistates from newstates
-        reachable_newstates = set()
-        to_check = {DFA._multistate_name({nfa._start._state_num})}
-        while to_check:
-            st = to_check.pop()
-            reachable_newstates.add(st)
-            to_check |= set(filter(lambda x: x not in reachable_newstates, newstates[st].values()))
-
-        newstates = dict(filter(lambda kv: kv[0] in reachable_newstates, newstates.items()))
-
-        # filter unreachable multistates from end_states
-        end_states = set(filter(lambda st: st in reachable_newstates, end_states))
+        dead = len(sets)
+        # names are sorted, comma-joined NFA state numbers, made on demand
+        names = _LazyNames(members, lambda nums: ','.join(map(str, nums)))
+        flat = [dead] * ((dead + 1) * nclasses)
+        for st, row in enumerate(runs):
+            for first, end, number in row:
+                flat[st * nclasses + first:st * nclasses + end] = [number] * (end - first)
+        ends = sum(1 << num for num in nfa._ends)
+        accepting = bytearray(bool(mask & ends) for mask in sets)
+        # tags of states, only states with tags are included
+        state_tags = {}
+        if accept_tags:
+            for num, nums in enumerate(members):
+                tags = frozenset(accept_tags[st] for st in nums if st in accept_tags)
+                if tags:
+                    state_tags[names[num]] = tags
 
         # save relevant data
-        # start state
-        self._start = DFA._multistate_name({nfa._start._state_num})
-        # DFA state/edge dict
-        self._states_edges = newstates
-        # set of accepting states
-        self._end_states = frozenset(end_states)
-        # description
         self._description = nfa.description
+        self._set_table(names, None, state_tags, bounds, list(range(nclasses)), nclasses, flat, accepting)
 
     @property
     def description(self):
         return self._description
 
+    @property
+    def num_states(self):
+        return len(self._names)
+
     def accept(self,s):
-        state = self._start
-        while s:
-            # check for char edge from current state
-            if s[0] in self._states_edges[state]:
-                state = self._states_edges[state][s[0]]
-                s = s[1:]
-            # check also for `any` edge, but only after char edges
-            elif 'any' in self._states_edges[state]:
-                state = self._states_edges[state]['any']
-                s = s[1:]
-            # rejecting state - no edge could match s[0]
+        # matching stops in sink states, the rest of `s` can't change the result
+        return bool(self._accepting[self._final_number(s, self._sinks)])
+
+    def accept_batch(self, strings, lengths=None):
+        """Check which of many byte strings are accepted, all at once.
+
+        States of all strings are advanced together, with one lookup in
+        the transition table for every column of `strings`, so the batch
+        is matched in NumPy's vectorized loops and needs no executable
+        memory. A byte is matched as the character with the same code.
+        Requires NumPy.
+
+        Args:
+        strings (numpy.ndarray): a 2D `uint8` array with a string in every
+            row, or a 1D array of `S<n>` byte strings
+        lengths (array-like): optional lengths of the strings, bytes past
+            them are ignored. By default rows of a `uint8` array are matched
+            whole, and `S<n>` strings up to their trailing NUL bytes.
+
+        Returns:
+        A 1D `bool` array, True for strings accepted by the DFA.
+
+        Raises:
+        DFAError: if NumPy isn't installed, or `strings` has a wrong shape
+            or type
+        """
+        if numpy is None:
+            raise DFAError('accept_batch requires NumPy')
+        strings = numpy.ascontiguousarray(strings)
+        if strings.dtype.kind == 'S' and strings.ndim == 1:
+            if lengths is None:
+                lengths = numpy.char.str_len(strings)
+            strings = strings.view(numpy.uint8).reshape(len(strings), strings.dtype.itemsize)
+        elif strings.dtype != numpy.uint8 or strings.ndim != 2:
+            raise DFAError('Expected a 2D uint8 array or a 1D S<n> array, got a {}D {} array'.format(
+                strings.ndim, strings.dtype))
+        rows, width = strings.shape
+        if lengths is None:
+            lengths = numpy.full(rows, width)
+        lengths = numpy.minimum(numpy.asarray(lengths), width)
+        if lengths.shape != (rows,):
+            raise DFAError('Expected {} lengths, got an array of shape {}'.format(rows, lengths.shape))
+
+        table = numpy.frombuffer(self._table, dtype=numpy.intc)
+        byte_classes = numpy.frombuffer(self._byte_classes, dtype=numpy.intc)
+        # strings sorted from the longest, so strings still being matched
+        # are a prefix of every column
+        order = numpy.argsort(-lengths, kind='stable')
+        ends = -lengths[order]
+        columns = numpy.ascontiguousarray(strings[order, :int(lengths.max(initial=0))].T)
+        states = numpy.zeros(rows, dtype=numpy.intc)
+        for num, column in enumerate(columns):
+            active = numpy.searchsorted(ends, -num)
+            states[:active] = table.take(states[:active] * self._nclasses + byte_classes.take(column[:active]))
+        accepted = numpy.empty(rows, dtype=bool)
+        accepted[order] = numpy.frombuffer(self._accepting, dtype=numpy.uint8).take(states)
+        return accepted
+
+    def accepted_tags(self, s):
+        """Return a frozenset of tags of the state reached after consuming `s`.
+
+        Tags are assigned to NFA states with the `accept_tags` argument of
+        the constructor. The set is empty if `s` wasn't accepted.
+        """
+        state = self._final_state(s)
+        if state not in self._end_states:
+            return frozenset()
+        return self._state_tags.get(state, frozenset())
+
+    def longest_prefix(self, text, start=0, end=None):
+        """Return the length of the longest accepted prefix of `text[start:end]`.
+
+        Returns -1 if no prefix, not even the empty one, is accepted.
+        Scanning stops in sink states, where the result is already known.
+        `text` isn't sliced, so scanning from an offset doesn't copy it.
+        """
+        table = self._table
+        nclasses = self._nclasses
+        byte_classes = self._byte_classes
+        accepting = self._accepting
+        sinks = self._sinks
+        positions = range(start, len(text) if end is None else end)
+        state = 0
+        longest = 0 if accepting[0] else -1
+        if sinks[0]:
+            return len(positions) if sinks[0] == DFA.ACCEPT_SINK else longest
+        for count, index in enumerate(positions, 1):
+            code = ord(text[index])
+            cls = byte_classes[code] if code < 256 else self._class_of(code)
+            state = table[state * nclasses + cls]
+            if accepting[state]:
+                longest = count
+            if sinks[state]:
+                return len(positions) if sinks[state] == DFA.ACCEPT_SINK else longest
+        return longest
+
+    def intersect(self, other):
+        """Return a DFA accepting strings accepted by both DFAs."""
+        return DFA._product([self, other], all, '({})&({})'.format(self.description, other.description))
+
+    def union(self, other):
+        """Return a DFA accepting strings accepted by any of the DFAs."""
+        return DFA._product([self, other], any, '({})|({})'.format(self.description, other.description))
+
+    def difference(self, other):
+        """Return a DFA accepting strings accepted by this DFA, but not `other`."""
+        return DFA._product([self, other], lambda accepting: accepting[0] and not accepting[1],
+                '({})-({})'.format(self.description, other.description))
+
+    def complement(self):
+        """Return a DFA accepting strings which this DFA doesn't accept."""
+        return DFA._product([self], lambda accepting: not accepting[0], '~({})'.format(self.description))
+
+    @staticmethod
+    def _product(dfas, accepts, description):
+        # Product construction: a DFA running all `dfas` at once, with
+        # a state for every reachable tuple of their states, including their
+        # rejecting ones. A state is accepting if `accepts` returns True for
+        # the tuple of acceptances of its states. Tags aren't kept. The
+        # result is minimized, which merges states that can't accept.
+        points = sorted(set().union(*(dfa._bounds for dfa in dfas)))
+        # classes are tuples of classes in every DFA, an interval between
+        # boundaries of any DFA has one class in each of them
+        classes = {}
+        interval_classes = []
+        for point in points:
+            key = tuple(dfa._class_of(point) for dfa in dfas)
+            interval_classes.append(classes.setdefault(key, len(classes)))
+
+        start = (0,) * len(dfas)
+        numbers = {start: 0}
+        tuples = [start]
+        table = []
+        num = 0
+        while num < len(tuples):
+            for key in classes:
+                target = tuple(dfa._table[st * dfa._nclasses + cls] for dfa, st, cls in zip(dfas, tuples[num], key))
+                if target not in numbers:
+                    numbers[target] = len(tuples)
+                    tuples.append(target)
+                table.append(numbers[target])
+            num += 1
+        table += [len(tuples)] * len(classes)
+
+        # a rejecting state is named with an empty string
+        names = [';'.join(dfa._names[st] if st != dfa._dead else '' for dfa, st in zip(dfas, states))
+                for states in tuples]
+        end_states = {name for name, states in zip(names, tuples)
+                if accepts([bool(dfa._accepting[st]) for dfa, st in zip(dfas, states)])}
+        dfa = DFA.__new__(DFA)
+        dfa._description = description
+        dfa._set_table(names, end_states, {}, points, interval_classes, len(classes), table)
+        return dfa.minimize()
+
+    def minimize(self, state_labels=None):
+        """Return an equivalent DFA with the smallest number of states.
+
+        Equivalent states are merged with Hopcroft's partition refinement of
+        rows of the transition table. Character classes are the alphabet, so
+        characters matched by an `any` edge need no special handling.
+        The implicit rejecting state is merged with states that can't reach
+        an accepting state.
+
+        Merged states keep the name of one of them, so names of the minimal
+        DFA are names of states of this DFA. The DFA isn't modified.
+
+        Args:
+        state_labels (dict): optionally maps state names to values which
+            must be equal for states to be merged. Accepting states with
+            different tags are never merged.
+
+        Returns:
+        A new, minimal DFA.
+        """
+        nclasses = self._nclasses
+        dead = self._dead
+        # inverse[cls][target] - states moving characters of `cls` to `target`
+        inverse = [collections.defaultdict(list) for _ in range(nclasses)]
+        for st in range(dead + 1):
+            row = st * nclasses
+            for cls in range(nclasses):
+                inverse[cls][self._table[row + cls]].append(st)
+
+        # initial partition by acceptance, tags and `state_labels`
+        def key(num):
+            if num == dead:
+                return (False, frozenset(), None)
+            name = self._names[num]
+            return (name in self._end_states, self._state_tags.get(name, frozenset()),
+                    (state_labels or {}).get(name))
+        groups = collections.defaultdict(set)
+        for num in range(dead + 1):
+            groups[key(num)].add(num)
+        blocks = list(groups.values())
+        block_of = [0] * (dead + 1)
+        for num, block in enumerate(blocks):
+            for st in block:
+                block_of[st] = num
+
+        # split blocks with states moving a class to a splitter block and
+        # states which don't, until no block can be split
+        work = set(range(len(blocks)))
+        while work:
+            splitter = set(blocks[work.pop()])
+            for cls in range(nclasses):
+                sources = collections.defaultdict(list)
+                for target in splitter:
+                    for st in inverse[cls].get(target, ()):
+                        sources[block_of[st]].append(st)
+                for num, inside in sources.items():
+                    if len(inside) == len(blocks[num]):
+                        continue
+                    new = set(inside)
+                    blocks[num] -= new
+                    blocks.append(new)
+                    for st in new:
+                        block_of[st] = len(blocks) - 1
+                    # it's enough to split by the smaller half
+                    if num in work or len(new) <= len(blocks[num]):
+                        work.add(len(blocks) - 1)
+                    else:
+                        work.add(num)
+
+        # a state for every block except the rejecting one, numbered in
+        # the order of old states, so the start stays first
+        dead_block = block_of[dead]
+        new_number = {}
+        rep = []
+        for st in range(dead):
+            num = block_of[st]
+            if num != dead_block and num not in new_number:
+                new_number[num] = len(rep)
+                rep.append(st)
+        new_dead = len(rep)
+        table = []
+        for st in rep + [dead]:
+            for cls in range(nclasses):
+                num = block_of[self._table[st * nclasses + cls]]
+                table.append(new_number.get(num, new_dead))
+        names = [self._names[st] for st in rep]
+        if not names:
+            # the language is empty, only the start state is left
+            names = [self._start]
+            table = [1] * nclasses * 2
+        dfa = DFA.__new__(DFA)
+        dfa._description = self._description
+        dfa._set_table(names, self._end_states, self._state_tags,
+                list(self._bounds), list(self._interval_classes), nclasses, table)
+        return dfa
+
+    def _set_table(self, names, end_states, state_tags, bounds, interval_classes, nclasses, table, accepting=None):
+        # Save the transition table `table` of `nclasses` columns, with the
+        # rejecting state as the last row. Classes with equal columns are
+        # merged and neighbouring intervals of the same class are joined.
+        # Accepting states are the `end_states` names, or states marked in
+        # `accepting`, which lets `_LazyNames` names be made only on demand.
+        dead = len(names)
+        columns = {}
+        class_map = []
+        for cls in range(nclasses):
+            column = tuple(table[cls::nclasses])
+            class_map.append(columns.setdefault(column, len(columns)))
+        self._bounds = array.array('i')
+        self._interval_classes = array.array('i')
+        for point, cls in zip(bounds, interval_classes):
+            if not self._interval_classes or self._interval_classes[-1] != class_map[cls]:
+                self._bounds.append(point)
+                self._interval_classes.append(class_map[cls])
+        self._nclasses = len(columns)
+        self._table = array.array('i', [0] * (dead + 1) * self._nclasses)
+        for column, cls in columns.items():
+            self._table[cls::self._nclasses] = array.array('i', column)
+        self._byte_classes = array.array('i', (self._class_of(code) for code in range(256)))
+        self._names = names if isinstance(names, _LazyNames) else list(names)
+        self._start = names[0]
+        self._dead = dead
+        if accepting is None:
+            end_states = frozenset(end_states)
+            accepting = (name in end_states for name in names)
+        self._accepting = bytearray(accepting) + bytearray(1)
+        self._end_states = _AcceptingStates(self._accepting, self._names)
+        self._state_tags = {name: state_tags[name] for name in names if name in state_tags} if state_tags else {}
+        self._sinks = self._find_sinks()
+
+    REJECT_SINK = 1
+    ACCEPT_SINK = 2
+
+    def _find_sinks(self, state_labels=None):
+        # Return a bytearray which marks every state, including the rejecting
+        # one, as REJECT_SINK if it can't reach an accepting state, as
+        # ACCEPT_SINK if it's accepting and every string leads from it to
+        # accepting states with the same label from `state_labels`, or 0.
+        # Matching can stop on entering a sink, its result is known.
+        nclasses = self._nclasses
+        count = self._dead + 1
+        targets = [set(self._table[st * nclasses:(st + 1) * nclasses]) for st in range(count)]
+        sources = [[] for _ in range(count)]
+        for st in range(count):
+            for target in targets[st]:
+                sources[target].append(st)
+        def label(st):
+            if not self._accepting[st]:
+                return None
+            return state_labels.get(self._names[st], True) if state_labels else True
+        labels = [label(st) for st in range(count)]
+
+        # states reaching an accepting state, searched backwards
+        reaching = [labels[st] is not None for st in range(count)]
+        stack = [st for st in range(count) if reaching[st]]
+        while stack:
+            for source in sources[stack.pop()]:
+                if not reaching[source]:
+                    reaching[source] = True
+                    stack.append(source)
+
+        # accepting states, without ones which can move to a state with
+        # a different label and, transitively, ones which can move to them
+        inside = [labels[st] is not None for st in range(count)]
+        stack = []
+        for st in range(count):
+            if inside[st] and any(labels[target] != labels[st] for target in targets[st]):
+                inside[st] = False
+                stack.append(st)
+        while stack:
+            for source in sources[stack.pop()]:
+                if inside[source]:
+                    inside[source] = False
+                    stack.append(source)
+
+        return bytearray(DFA.ACCEPT_SINK if inside[st] else 0 if reaching[st] else DFA.REJECT_SINK
+                for st in range(count))
+
+    def _class_of(self, code):
+        # class of the character with `code`
+        return self._interval_classes[bisect.bisect_right(self._bounds, code) - 1]
+
+    def _final_number(self, s, sinks=None):
+        # number of the state reached after consuming `s`, or the first sink
+        # state reached if `sinks` (see `_find_sinks`) are given
+        table = self._table
+        nclasses = self._nclasses
+        byte_classes = self._byte_classes
+        state = 0
+        if sinks is None:
+            for char in s:
+                code = ord(char)
+                cls = byte_classes[code] if code < 256 else self._class_of(code)
+                state = table[state * nclasses + cls]
+            return state
+        if sinks[state]:
+            return state
+        for char in s:
+            code = ord(char)
+            cls = byte_classes[code] if code < 256 else self._class_of(code)
+            state = table[state * nclasses + cls]
+            if sinks[state]:
+                break
+        return state
+
+    def _final_state(self, s):
+        # the state reached after consuming `s`, None if it's rejecting
+        state = self._final_number(s)
+        return None if state == self._dead else self._names[state]
+
+    def _runs(self, state):
+        # transitions of `state` as a list of (first, last, target) runs of
+        # codes, in order, where `target` is a state number
+        runs = []
+        row = state * self._nclasses
+        ends = list(self._bounds[1:]) + [ord(charset.max_char) + 1]
+        for first, end, cls in zip(self._bounds, ends, self._interval_classes):
+            target = self._table[row + cls]
+            if runs and runs[-1][2] == target:
+                runs[-1] = (runs[-1][0], end - 1, target)
             else:
-                return False
-        return state in self._end_states
+                runs.append((first, end - 1, target))
+        return runs
+
+    table_format = 2
+    """Version of the `_to_table` format, changed when the format changes."""
+
+    def _to_table(self):
+        # plain data representation used for caching
+        return {
+                'format': DFA.table_format,
+                'names': list(self._names),
+                'end_states': sorted(self._end_states),
+                'bounds': list(self._bounds),
+                'interval_classes': list(self._interval_classes),
+                'nclasses': self._nclasses,
+                'table': list(self._table),
+                'description': self._description,
+            }
+
+    @staticmethod
+    def _from_table(table):
+        dfa = DFA.__new__(DFA)
+        dfa._description = table['description']
+        dfa._set_table(table['names'], table['end_states'], {}, table['bounds'],
+                table['interval_classes'], table['nclasses'], table['table'])
+        return dfa
+
+    binary_magic = b'REJITDFA'
+    binary_version = 2
+    """Version of the binary format written by `to_bytes`."""
+
+    # magic, version, number of states without the rejecting one, number of
+    # classes, number of class intervals, length of the description
+    _binary_header = struct.Struct('<8sIIIII')
+
+    def to_bytes(self):
+        """Return the DFA in a compact binary format, read by `from_bytes`.
+
+        The format is a header, followed by the UTF-8 description padded to
+        4 bytes, the class map (first codes and classes of intervals, and
+        classes of codes below 256), the transition table with the
+        rejecting state as the last row, the accept map with a byte for every
+        state and the sink map with sink kinds of states. Integers are
+        little-endian 32-bit values. State names and tags aren't stored,
+        states of a loaded DFA are named with their numbers.
+        """
+        description = self._description.encode('utf8')
+        parts = [
+                DFA._binary_header.pack(DFA.binary_magic, DFA.binary_version, self._dead,
+                    self._nclasses, len(self._bounds), len(description)),
+                description + bytes(-len(description) % 4),
+            ]
+        for values in (self._bounds, self._interval_classes, self._byte_classes, self._table):
+            values = array.array('i', values)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            parts.append(values.tobytes())
+        parts.append(bytes(self._accepting))
+        parts.append(bytes(self._sinks))
+        return b''.join(parts)
+
+    def save(self, path):
+        """Write the DFA to the file `path` in the format of `to_bytes`.
+
+        The file is written to a temporary file which is atomically moved in
+        place, so processes which mapped the previous file to memory keep
+        using it unchanged.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Load a DFA written by `save`.
+
+        Args:
+        path (str): the DFA file
+        mmap (bool): map the file to memory instead of reading it. The DFA
+            then matches directly over the mapped transition table, so all
+            processes which load the same file share one copy of it in
+            the page cache. The tables are read once to validate them,
+            but aren't copied.
+
+        Raises:
+        DFAError: if the file isn't a valid DFA file
+        """
+        with open(path, 'rb') as f:
+            if not mmap:
+                return DFA.from_bytes(f.read())
+            try:
+                data = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+            except ValueError:
+                raise DFAError('Empty DFA file: {}'.format(path))
+        return DFA.from_bytes(data)
 
     @staticmethod
-    def _nfa_reachable_noneps_edges(state):
-        return filter(lambda e: e[0], functools.reduce(lambda x,y: x+y,[s._edges for s in NFA._moveEpsilon({state})]))
+    def from_bytes(data):
+        """Return a DFA from `data` in the format of `to_bytes`.
+
+        The DFA uses `data` in place, without copying its tables. States,
+        classes and flags in the tables are checked to be in range, so
+        damaged data can't make matching read outside of them. The checks
+        use numpy if it's available.
+
+        Args:
+        data (bytes-like): the DFA, e.g. `bytes` or a memory-mapped file
+
+        Raises:
+        DFAError: if `data` isn't a valid DFA
+        """
+        view = memoryview(data)
+        header = DFA._binary_header
+        if len(view) < header.size:
+            raise DFAError('Truncated DFA data')
+        magic, version, num_states, nclasses, nbounds, description_length = header.unpack_from(view)
+        if magic != DFA.binary_magic:
+            raise DFAError('Not a DFA file')
+        if version != DFA.binary_version:
+            raise DFAError('Unsupported DFA format version: {}'.format(version))
+        offset = header.size + description_length + -description_length % 4
+        try:
+            description = bytes(view[header.size:header.size + description_length]).decode('utf8')
+        except UnicodeDecodeError:
+            raise DFAError('Invalid description in DFA data')
+        sections = []
+        for count in (nbounds, nbounds, 256, (num_states + 1) * nclasses):
+            section = view[offset:offset + 4 * count]
+            if len(section) != 4 * count:
+                raise DFAError('Truncated DFA data')
+            if sys.byteorder == 'big':
+                section = array.array('i', section)
+                section.byteswap()
+            else:
+                section = section.cast('i')
+            sections.append(section)
+            offset += 4 * count
+        accepting = view[offset:offset + num_states + 1]
+        sinks = view[offset + num_states + 1:offset + 2 * (num_states + 1)]
+        if len(sinks) != num_states + 1:
+            raise DFAError('Truncated DFA data')
+        bounds, interval_classes, byte_classes, table = sections
+        if not nbounds or bounds[0] != 0 or any(a >= b for a, b in zip(bounds, bounds[1:])):
+            raise DFAError('Invalid class intervals in DFA data')
+        for values, limit, what in [(interval_classes, nclasses, 'class'), (byte_classes, nclasses, 'class'),
+                (table, num_states + 1, 'state'), (accepting, 2, 'accept flag'), (sinks, 3, 'sink kind')]:
+            DFA._check_range(values, limit, what)
+
+        dfa = DFA.__new__(DFA)
+        dfa._description = description
+        dfa._bounds, dfa._interval_classes, dfa._byte_classes, dfa._table = sections
+        dfa._nclasses = nclasses
+        dfa._names = _StateNumbers(num_states)
+        dfa._start = dfa._names[0]
+        dfa._dead = num_states
+        dfa._accepting = accepting
+        dfa._end_states = _AcceptingStates(accepting)
+        dfa._state_tags = {}
+        dfa._sinks = sinks
+        return dfa
 
     @staticmethod
-    def _nfa_char2statenum_set(st):
-        char2statenum_set = collections.defaultdict(lambda: set())
-        # gather all non-epsilon edges reachable from `st`
-        # for each char in edges find all states reachable using that char
-        for e in DFA._nfa_reachable_noneps_edges(st):
-            char2statenum_set[e[0]] |= {e[1]._state_num} | set(map(lambda x: x._state_num, NFA._moveEpsilon({e[1]})))
-        # if `any` edge reachable, than all other chars can use it too
-        if 'any' in char2statenum_set:
-            for char in char2statenum_set:
-                char2statenum_set[char] |= char2statenum_set['any']
-        return char2statenum_set
+    def _check_range(values, limit, what):
+        # raise DFAError unless all `values` of a loaded section are in
+        # range(limit)
+        if not len(values):
+            return
+        if numpy is not None:
+            values = numpy.asarray(values)
+            low, high = int(values.min()), int(values.max())
+        else:
+            low, high = min(values), max(values)
+        if low < 0 or high >= limit:
+            raise DFAError('Invalid {} in DFA data'.format(what))
 
     @staticmethod
-    def _multistate_name(states):
-        return functools.reduce(lambda acc, x: acc + ',' + x, sorted(map(str,states)))
+    def _subset_alphabet(nfa, accept_tags):
+        # Sets of NFA states are int bitsets. Only states with consuming
+        # edges, accepting states and tagged states matter, so DFA states
+        # are bitsets of epsilon closures restricted to them, and states
+        # which closures are equal are the same DFA state.
+        # Return a function mapping a state of `nfa` to the bitset of its
+        # closure, first codes of character classes, and edges of every
+        # state as (first class, end class, target bitset) tuples.
+        important = [
+                nfa._offsets[num] != nfa._offsets[num+1] or num in nfa._ends or num in accept_tags
+                for num in range(nfa.num_states)
+            ]
+        closures = [None] * nfa.num_states
+        def closure(num):
+            if closures[num] is None:
+                mask = 0
+                for st in nfa._epsilon_closure(num):
+                    if important[st]:
+                        mask |= 1 << st
+                closures[num] = mask
+            return closures[num]
+
+        # character classes are elementary intervals between boundaries of
+        # all edge ranges, an `any` edge covers all of them
+        points = {0}
+        for first, last in zip(nfa._firsts, nfa._lasts):
+            points.add(max(first, 0))
+            points.add(last + 1)
+        bounds = sorted(point for point in points if point <= ord(charset.max_char))
+        # edges of every state as (first class, end class, target bitset),
+        # made for states which DFA states contain
+        class_edges = _ClassEdges(nfa, bounds, closure)
+        return closure, bounds, class_edges
 
     @staticmethod
-    def _merge_states(merged_states,nfa_states_edges):
-        name = DFA._multistate_name(merged_states)
-        char2statenum_set = collections.defaultdict(lambda: set())
-        for st in merged_states:
-            merged_c2s = nfa_states_edges[st]
-            for c in merged_c2s:
-                char2statenum_set[c] |= merged_c2s[c]
-            if 'any' in char2statenum_set:
-                for char in char2statenum_set:
-                    char2statenum_set[char] |= char2statenum_set['any']
-        return name, char2statenum_set
+    def _bits(mask):
+        # numbers of bits set in `mask`, in increasing order. Sets of a few
+        # states are common, so only nonzero 64-bit words are read, with
+        # small int operations.
+        words = array.array('Q', mask.to_bytes((mask.bit_length() + 63) // 64 * 8, 'little'))
+        if sys.byteorder == 'big':
+            words.byteswap()
+        bits = []
+        for num in itertools.compress(range(len(words)), words):
+            word = words[num]
+            while word:
+                low = word & -word
+                bits.append(64 * num + low.bit_length() - 1)
+                word ^= low
+        return bits
 
     def _view_graph(self):
         g = graphviz.Digraph(self.description, format='png', filename='graphs/DFA_'+str(id(self)))
@@ -152,11 +733,90 @@ class DFA:
         for st in self._end_states:
             g.node(st)
         g.attr('node', shape='circle')
-        for st in self._states_edges:
+        for num, st in enumerate(self._names):
             g.node(st)
-            for char in self._states_edges[st]:
-                g.edge(st, self._states_edges[st][char], label=char)
+            for first, last, target in self._runs(num):
+                if target != self._dead:
+                    label = chr(first) if first == last else (chr(first), chr(last))
+                    g.edge(st, self._names[target], label=NFA._label_str(label))
         g.body.append(r'label = "\n\n{}"'.format(self.description))
         g.body.append('fontsize=20')
         g.view()
 
+class _ClassEdges(dict):
+    # edges of states of a CompactNFA as (first class, end class, target
+    # bitset) tuples, indexed by state numbers and made on demand, so
+    # closures of unreachable states aren't computed
+    def __init__(self, nfa, bounds, closure):
+        super().__init__()
+        self._nfa = nfa
+        self._bounds = bounds
+        self._closure = closure
+
+    def __missing__(self, num):
+        nfa = self._nfa
+        edges = self[num] = [
+                (bisect.bisect_right(self._bounds, max(nfa._firsts[e], 0)) - 1,
+                    bisect.bisect_right(self._bounds, nfa._lasts[e]),
+                    self._closure(nfa._targets[e]))
+                for e in range(nfa._offsets[num], nfa._offsets[num+1])
+            ]
+        return edges
+
+class _StateNumbers(collections.abc.Sequence):
+    # names of states of a loaded DFA, their numbers as strings, made on
+    # demand so loading doesn't create a string for every state
+    def __init__(self, count):
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, num):
+        if isinstance(num, slice):
+            return [str(n) for n in range(self._count)[num]]
+        return str(range(self._count)[num])
+
+class _LazyNames(collections.abc.Sequence):
+    # names of states made on demand by `name` from their `keys`, so
+    # constructions don't create a string for every state
+    def __init__(self, keys, name):
+        self._keys = keys
+        self._name = name
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, num):
+        if isinstance(num, slice):
+            return [self._name(key) for key in self._keys[num]]
+        return self._name(self._keys[num])
+
+class _AcceptingStates(collections.abc.Set):
+    # names of accepting states, read from an accept map. States of a loaded
+    # DFA are named with their numbers, other names are looked up in a set
+    # made on the first use.
+    def __init__(self, accepting, names=None):
+        self._accepting = accepting
+        self._names = names
+        self._name_set = None
+
+    def __contains__(self, name):
+        if self._names is not None:
+            if self._name_set is None:
+                self._name_set = frozenset(self)
+            return name in self._name_set
+        if not isinstance(name, str) or not name.isdecimal():
+            return False
+        num = int(name)
+        return str(num) == name and num < len(self._accepting) and bool(self._accepting[num])
+
+    def __iter__(self):
+        ends = bytes(self._accepting)
+        num = ends.find(1)
+        while num != -1:
+            yield str(num) if self._names is None else self._names[num]
+            num = ends.find(1, num + 1)
+
+    def __len__(self):
+        return len(self._accepting) - bytes(self._accepting).count(0)
@@ -0,0 +1,241 @@
+#encoding: utf8
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from rejit.common import RejitError
+from rejit.common import version
+
+class DiskCacheError(RejitError): pass
+
+class DiskCache:
+    """Persistent cache of compiled DFAs and x86 code.
+
+    Every part of a cached pattern's entry is stored in its own JSON file in
+    the cache directory: a DFA transition table under the 'dfa' key and the
+    final x86 binary under the 'x86_binary' key. The file name is a hash of
+    the pattern, `rejit` version, `cache_format`, target (see
+    `rejit.jitmatcher.target`) and the part's name, so a new version of
+    `rejit` or of the generated code, or a different platform, never reads
+    stale code.
+
+    Many processes can share one cache directory. A part is written to
+    a temporary file which is atomically moved in place, so readers see
+    either an old or a new complete part, and concurrent writers of
+    different parts don't overwrite each other. Corrupted parts are treated
+    as misses and removed. Temporary files left by crashed writers are
+    removed after `stale_seconds`.
+
+    The total size of entries is bounded by `max_size` bytes. When a write
+    makes the cache larger, the least recently used parts are removed.
+    Reading a part updates its modification time, which is used to order
+    parts by their last use. The total size is kept up to date by writes
+    and the directory is scanned again only to evict parts, or after as many
+    writes as there were files in the last scan, to account for writes of
+    other processes.
+
+    Attributes:
+    directory (str): cache directory, created if missing
+    max_size (int): the maximal total size of entries in bytes
+    target (str): the target of cached x86 code
+    """
+
+    suffix = '.json'
+
+    parts = ('dfa', 'x86_binary')
+    """Names of the parts of an entry."""
+
+    cache_format = 2
+    """Version of cached data and of the calling convention of cached x86
+    code, bumped whenever they change, e.g. when compiled code started to
+    return lengths of accepted prefixes and to read ranges of buffers."""
+
+    stale_seconds = 3600
+    """Age of temporary files which are removed as left by crashed writers."""
+
+    def __init__(self, directory, max_size=64*1024*1024, target=None):
+        if target is None:
+            import rejit.jitmatcher
+            target = rejit.jitmatcher.target()
+        self.directory = directory
+        self.max_size = max_size
+        self.target = target
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # the total size of entries, and the number of files found by
+        # the last scan of the directory and of writes since then
+        self._size = None
+        self._files = 0
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, pattern):
+        """Return the cached entry for `pattern`, or None on a miss."""
+        entry = {}
+        for name in DiskCache.parts:
+            path = self._path(pattern, name)
+            try:
+                with open(path, 'rt', encoding='utf8') as f:
+                    part = json.load(f)
+                if part.get('key') != self._key(pattern):
+                    raise DiskCacheError('Entry key mismatch in {}'.format(path))
+                value = part[name]
+                entry[name] = bytes.fromhex(value) if name == 'x86_binary' else value
+                os.utime(path, None)
+            except FileNotFoundError:
+                pass
+            except (ValueError, TypeError, AttributeError, KeyError, DiskCacheError):
+                # corrupted or colliding part, it will be overwritten
+                DiskCache._remove(path)
+        with self._lock:
+            if entry:
+                self._hits += 1
+            else:
+                self._misses += 1
+        return entry or None
+
+    def store(self, pattern, **data):
+        """Add `data` to the entry for `pattern`.
+
+        Parts of `data` which are already stored are replaced, other parts
+        are kept.
+
+        Args:
+        pattern (str): the cached pattern
+        data: parts of the entry, 'dfa' (dict) or 'x86_binary' (bytes)
+
+        Raises:
+        DiskCacheError: if a part's name isn't one of `parts`
+        """
+        for name, value in data.items():
+            if name not in DiskCache.parts:
+                raise DiskCacheError('Unknown cache entry part: {}'.format(name))
+            part = {'key': self._key(pattern), name: value.hex() if name == 'x86_binary' else value}
+            self._write(self._path(pattern, name), json.dumps(part))
+        self._evict()
+
+    def _write(self, path, text):
+        # replace the file at `path` with `text` and count its size
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wt', encoding='utf8') as f:
+                f.write(text)
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            new_size = os.stat(tmp_path).st_size
+            os.replace(tmp_path, path)
+        except BaseException:
+            DiskCache._remove(tmp_path)
+            raise
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += new_size - old_size
+
+    def purge(self):
+        """Remove all entries from the cache directory."""
+        for path, _, _ in self._entries():
+            DiskCache._remove(path)
+        with self._lock:
+            self._size = None
+
+    def size(self):
+        """Return the total size of entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def info(self):
+        """Return a dict with hit, miss and eviction counters of this object."""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions}
+
+    def _key(self, pattern):
+        return [version, DiskCache.cache_format, self.target, pattern]
+
+    def _path(self, pattern, name):
+        digest = hashlib.sha256(json.dumps(self._key(pattern)).encode('utf8')).hexdigest()
+        return os.path.join(self.directory, '{}-{}{}'.format(digest, name, DiskCache.suffix))
+
+    def _entries(self):
+        # files of entries as `(path, size, mtime)`, stale temporary files
+        # are removed
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            temporary = name.startswith('.tmp-')
+            if not temporary and (not name.endswith(DiskCache.suffix) or name.startswith('.')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            if not temporary:
+                entries.append((path, st.st_size, st.st_mtime))
+            elif now - st.st_mtime > DiskCache.stale_seconds:
+                DiskCache._remove(path)
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            scan = self._size is None or self._size > self.max_size or self._writes >= self._files
+        if not scan:
+            return
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        files = len(entries)
+        if total > self.max_size:
+            # least recently used first
+            entries.sort(key=lambda e: e[2])
+            for path, size, _ in entries:
+                if total <= self.max_size:
+                    break
+                DiskCache._remove(path)
+                total -= size
+                files -= 1
+                with self._lock:
+                    self._evictions += 1
+        with self._lock:
+            self._size = total
+            self._files = files
+            self._writes = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+_disk_cache = None
+
+def enable(directory, max_size=64*1024*1024):
+    """Enable the process-wide disk cache used by `Regex` compilation.
+
+    Args:
+    directory (str): cache directory, can be shared by many processes
+    max_size (int): the maximal total size of cache entries in bytes
+
+    Returns:
+    The enabled `DiskCache` object.
+    """
+    global _disk_cache
+    _disk_cache = DiskCache(directory, max_size)
+    return _disk_cache
+
+def disable():
+    """Disable the process-wide disk cache. Cached files are kept."""
+    global _disk_cache
+    _disk_cache = None
+
+def get_cache():
+    """Return the enabled `DiskCache` object, or None if disabled."""
+    return _disk_cache
@@ -0,0 +1,106 @@
+#encoding: utf8
+
+"""Glushkov construction of epsilon-free NFAs.
+
+The Glushkov (position) automaton of a regular expression has a state for
+every occurrence of a symbol, a set or `.` in the expression, called
+a position, and an initial state. An edge to a position is labeled with the
+position's symbol, and leads from every state which the position can follow
+in a matched string. There are no epsilon edges, so simulating the NFA and
+building a DFA from it don't need epsilon closures, and states reached by
+a character are exactly the positions which match it.
+
+The NFA is computed from the `first`, `last` and `follow` sets of positions
+of AST nodes in one bottom-up pass over the AST. The number of states is
+linear in the size of the pattern; the number of edges can be quadratic, e.g.
+for `(a|b|c|...)*`.
+"""
+
+import rejit.charset as charset
+import rejit.regex_ast as ast
+from rejit.common import RejitError
+from rejit.common import escape_symbol
+from rejit.compactnfa import ANY
+from rejit.compactnfa import CompactNFA
+
+class GlushkovError(RejitError): pass
+
+def build(tree):
+    """Build a Glushkov NFA from a transformed AST.
+
+    Raises:
+    GlushkovError: if the AST contains a node which isn't supported, e.g.
+        a `repeat` node which wasn't expanded by `Regex._transform`
+
+    Args:
+    tree (Node): the AST, like `Regex._final_ast`
+
+    Returns:
+    A `CompactNFA` without epsilon edges, where state 0 is the initial state
+    and state `p` is the `p`-th position of the AST.
+    """
+    # labels[p] - (first, last) ranges of codes matched by position p
+    labels = [()]
+    # follow[p] - positions which can follow position p
+    follow = [set()]
+
+    def position(ranges):
+        labels.append(tuple(ranges))
+        follow.append(set())
+        return frozenset({len(labels) - 1})
+
+    def node_fn(node, children):
+        # (nullable, first, last, description) of the node
+        if node.type == 'symbol':
+            p = position([(ord(node.char), ord(node.char))])
+            return False, p, p, escape_symbol(node.char)
+        elif node.type == 'set':
+            p = position((ord(first), ord(last)) for first, last in node.ranges)
+            return False, p, p, node.description
+        elif node.type == 'any':
+            p = position([(ANY, ord(charset.max_char))])
+            return False, p, p, '.'
+        elif node.type == 'empty':
+            return True, frozenset(), frozenset(), r'\E'
+        elif node.type == 'concat':
+            # positions which can come after each child, going from the right
+            after = frozenset()
+            for nullable, first, last, _ in reversed(children):
+                for p in last:
+                    follow[p] |= after
+                after = first | after if nullable else first
+            nullable = all(child[0] for child in children)
+            first = frozenset()
+            for child in children:
+                first |= child[1]
+                if not child[0]:
+                    break
+            last = frozenset()
+            for child in reversed(children):
+                last |= child[2]
+                if not child[0]:
+                    break
+            return nullable, first, last, ''.join(child[3] for child in children)
+        elif node.type == 'union':
+            return (any(child[0] for child in children),
+                    frozenset().union(*(child[1] for child in children)),
+                    frozenset().union(*(child[2] for child in children)),
+                    '(' + '|'.join(child[3] for child in children) + ')')
+        elif node.type in ('kleene-star', 'kleene-plus', 'zero-or-one'):
+            nullable, first, last, description = children[0]
+            if node.type != 'zero-or-one':
+                for p in last:
+                    follow[p] |= first
+            suffix = {'kleene-star': '*', 'kleene-plus': '+', 'zero-or-one': '?'}[node.type]
+            return nullable or suffix != '+', first, last, '(' + description + ')' + suffix
+        raise GlushkovError('Unsupported AST node: {}'.format(node))
+
+    # every occurrence of a shared subtree has its own positions
+    nullable, first, last, description = ast.fold(tree, node_fn, shared=False)
+    follow[0] = first
+    edges = [
+            [(low, high, target) for target in sorted(follow[p]) for low, high in labels[target]]
+            for p in range(len(labels))
+        ]
+    ends = set(last) | ({0} if nullable else set())
+    return CompactNFA._from_edges(edges, [()] * len(labels), ends, description)
@@ -1,51 +1,95 @@
 #encoding: utf8
 
+import collections
+
 class IRCompiler:
     def __init__(self):
         self._ir = []
-
-    def compile_to_ir(self, dfa, rewrite_state_names=False):
+        self._longest_prefix = False
+
+    def compile_to_ir(self, dfa, rewrite_state_names=False, accept_values=None, longest_prefix=False):
+        # the code is generated from the DFA's transition table
+        # accepting states return True, unless `accept_values` maps them
+        # to other values returned by the code
+        # with `longest_prefix` the code returns the length of the longest
+        # accepted prefix of the string instead, or -1, see
+        # `DFA.longest_prefix`. Accepting states save the position in
+        # `last`, which is returned at the end of the string or when
+        # the string can't be accepted anymore.
+        self._longest_prefix = longest_prefix
+        if longest_prefix:
+            accept_values = None
+        accept_values_given = accept_values is not None
+        if accept_values is None:
+            accept_values = {st: True for st in dfa._end_states}
         # change state names better readability
         if rewrite_state_names:
-            state_label = dict(zip(dfa._states_edges, map(str,range(len(dfa._states_edges)))))
-            states_edges = {
-                    state_label[st] : {char: state_label[st2] for char, st2 in c2s.items()}
-                        for st, c2s in dfa._states_edges.items()
-                        }
-            start = state_label[dfa._start]
-            end_states = {state_label[st] for st in dfa._end_states}
+            labels = list(map(str, range(dfa.num_states)))
         else:
-            states_edges = dfa._states_edges
-            start = dfa._start
-            end_states = dfa._end_states
+            labels = dfa._names
+        end_states = {labels[num]: accept_values[st] for num, st in enumerate(dfa._names) if st in accept_values}
+
+        # the code returns as soon as it enters a sink state, accept sinks
+        # must lead only to states with the same accept value
+        sinks = dfa._find_sinks(accept_values) if accept_values_given else dfa._sinks
+        if longest_prefix:
+            # the length of the string isn't known in accept sinks
+            sinks = bytearray(sink if sink == dfa.REJECT_SINK else 0 for sink in sinks)
 
         self._ir = []
-        # actual code
+        # actual code, the start state is the first one
         self._emit_set_var('i',-1)
-        self._state_code(start, states_edges[start], end_states)
-        for st,edges in filter(lambda x: x[0] != start, states_edges.items()):
-            self._state_code(st, edges, end_states)
+        if longest_prefix:
+            self._emit_set_var('last',-1)
+        for num, label in enumerate(labels):
+            if sinks[num]:
+                self._emit_label(label)
+                self._emit_ret(end_states.get(label, False) if sinks[num] == dfa.ACCEPT_SINK else False)
+                continue
+            runs = [
+                    (chr(first), chr(last), labels[target])
+                    for first, last, target in dfa._runs(num) if target != dfa._dead
+                ]
+            self._state_code(label, runs, end_states, len(runs) == len(dfa._runs(num)))
         variables = {'i':'long', 'string':'pointer', 'char':'byte', 'length':'long'}
+        if longest_prefix:
+            variables['last'] = 'long'
         return self._ir, variables
 
-    def _state_code(self, state, edges, end_states):
+    def _state_code(self, state, runs, end_states, total):
+        # `runs` are (first, last, target) ranges of chars in order, `total`
+        # is True if they cover all chars
         self._emit_label(state)
-        self._load_next(state, state in end_states, bool(edges)) # bool() to be more explicit
-        for char,st in filter(lambda x: x[0] != 'any', edges.items()):
-            self._emit_cmp_value('char', char)
+        self._load_next(state, end_states.get(state, False), bool(runs)) # bool() to be more explicit
+        # if all chars lead somewhere, the most common target is jumped to
+        # when no other range matches, like an `any` edge
+        default = None
+        if total:
+            counts = collections.Counter(target for _, _, target in runs)
+            default = max(counts, key=lambda target: (counts[target], target == runs[-1][2]))
+        for first, last, st in filter(lambda run: run[0] == run[1] and run[2] != default, runs):
+            self._emit_cmp_value('char', first)
             self._emit_jump_eq(st)
-        if 'any' in edges:
-            self._emit_jump(edges['any'])
+        # a range is checked with two comparisons, chars are unsigned
+        ranges = [run for run in runs if run[0] != run[1] and run[2] != default]
+        for num, (first, last, st) in enumerate(ranges):
+            skip = 'range_{}_{}'.format(num, state)
+            self._emit_cmp_value('char', first)
+            self._emit_jump_lt(skip)
+            self._emit_cmp_value('char', last)
+            self._emit_jump_le(st)
+            self._emit_label(skip)
+        if default is not None:
+            self._emit_jump(default)
         self._emit_ret(False)
 
-    def _load_next(self,label,accepting,load_next_needed):
+    def _load_next(self,label,accept_value,load_next_needed):
         self._emit_inc_var('i')
+        if self._longest_prefix and accept_value:
+            self._emit_move('last', 'i')
         self._emit_cmp_name('i', 'length')
         self._emit_jump_ne('load_' + label)
-        if accepting:
-            self._emit_ret(True)
-        else:
-            self._emit_ret(False)
+        self._emit_ret(accept_value)
         self._emit_label('load_' + label)
         if load_next_needed:
             self._emit_move_indexed('char', 'string', 'i')
@@ -62,6 +106,12 @@ class IRCompiler:
     def _emit_jump_ne(self, label):
         self._ir.append(('jump ne', label))
 
+    def _emit_jump_lt(self, label):
+        self._ir.append(('jump lt', label))
+
+    def _emit_jump_le(self, label):
+        self._ir.append(('jump le', label))
+
     def _emit_inc_var(self, var_name):
         self._ir.append(('inc', var_name))
 
@@ -81,5 +131,8 @@ class IRCompiler:
         self._ir.append(('cmp name', name1, name2))
 
     def _emit_ret(self, value):
-        self._ir.append(('ret', value))
+        if self._longest_prefix:
+            self._ir.append(('ret var', 'last'))
+        else:
+            self._ir.append(('ret', value))
 
@@ -14,9 +14,9 @@ class JITCompiler:
     def __init__(self):
         pass
 
-    def compile_to_x86_32(self, ir, args, var_sizes, save_hex_file=None):
+    def compile_to_x86_32(self, ir, args, var_sizes, save_hex_file=None, max_code_bytes=None):
         # used to relay information between passes (other than transformed IR)
-        compilation_data = {'args': args, 'var_sizes':var_sizes}
+        compilation_data = {'args': args, 'var_sizes':var_sizes, 'max_code_bytes': max_code_bytes}
         compilation_data['encoder'] = rejit.x86encoder.Encoder32()
 
         # apply compilation passes in this order
@@ -34,6 +34,7 @@ class JITCompiler:
                     JITCompiler._impl_ret_pass,
                     JITCompiler._find_labels_pass,
                     JITCompiler._impl_jmps_ins_placeholder_pass,
+                    JITCompiler._check_code_size_pass,
                     JITCompiler._impl_jmps_pass,
                     JITCompiler._purge_labels_pass,
                 ],
@@ -49,9 +50,9 @@ class JITCompiler:
 
         return x86_code, compilation_data
 
-    def compile_to_x86_64(self, ir, args, var_sizes, save_hex_file=None):
+    def compile_to_x86_64(self, ir, args, var_sizes, save_hex_file=None, max_code_bytes=None):
         # used to relay information between passes (other than transformed IR)
-        compilation_data = {'args': args, 'var_sizes':var_sizes}
+        compilation_data = {'args': args, 'var_sizes':var_sizes, 'max_code_bytes': max_code_bytes}
         compilation_data['encoder'] = rejit.x86encoder.Encoder64()
 
         # apply compilation passes in this order
@@ -69,6 +70,7 @@ class JITCompiler:
                     JITCompiler._impl_ret_pass,
                     JITCompiler._find_labels_pass,
                     JITCompiler._impl_jmps_ins_placeholder_pass,
+                    JITCompiler._check_code_size_pass,
                     JITCompiler._impl_jmps_pass,
                     JITCompiler._purge_labels_pass,
                 ],
@@ -100,6 +102,8 @@ class JITCompiler:
                 names_written.add(inst[1])
             elif inst[0] == 'inc':
                 names_read.add(inst[1])
+            elif inst[0] == 'ret var':
+                names_read.add(inst[1])
             elif inst[0] == 'move':
                 names_written.add(inst[1])
                 names_read.add(inst[2])
@@ -249,7 +253,7 @@ class JITCompiler:
 
         ir_1 = []
         for inst in ir:
-            if inst[0] in { 'cmp name',  'cmp value', 'set', 'inc', 'move', 'move indexed'}:
+            if inst[0] in { 'cmp name',  'cmp value', 'set', 'inc', 'move', 'move indexed', 'ret var'}:
                 if inst[0] == 'cmp name':
                     assert encoder.type2size(var_sizes[inst[1]]) == encoder.type2size(var_sizes[inst[2]])
                     ir_1.append((inst[0], var_regs[inst[1]],  var_regs[inst[2]], var_sizes[inst[1]]))
@@ -259,6 +263,8 @@ class JITCompiler:
                     ir_1.append((inst[0], var_regs[inst[1]], inst[2], var_sizes[inst[1]]))
                 elif inst[0] == 'inc':
                     ir_1.append((inst[0], var_regs[inst[1]], var_sizes[inst[1]]))
+                elif inst[0] == 'ret var':
+                    ir_1.append((inst[0], var_regs[inst[1]], var_sizes[inst[1]]))
                 elif inst[0] == 'move':
                     assert var_sizes[inst[1]] == var_sizes[inst[2]]
                     ir_1.append((inst[0], var_regs[inst[1]], var_regs[inst[2]], var_sizes[inst[1]]))
@@ -278,16 +284,26 @@ class JITCompiler:
         ir_1 = []
         for inst in ir:
             if inst[0] == 'cmp value':
-                ir_1.append((inst[0], inst[1], ord(inst[2]), inst[3]))
+                ir_1.append((inst[0], inst[1], JITCompiler._byte_value(inst[2]), inst[3]))
             elif inst[0] == 'set':
                 ir_1.append((inst[0], inst[1], inst[2], inst[3]))
             elif inst[0] == 'ret':
-                ir_1.append((inst[0], 1 if inst[1] else 0))
+                # bools and small ints are returned as they are
+                ir_1.append((inst[0], int(inst[1])))
             else:
                 ir_1.append(inst)
 
         return (ir_1, data)
 
+    @staticmethod
+    def _byte_value(char):
+        # compiled code only reads ASCII strings (`JITMatcher` matches other
+        # strings with a DFA), so chars above 0x7F never match and are
+        # clamped to 0xFF. The byte is encoded as a signed imm8, unsigned
+        # jumps interpret it correctly.
+        code = min(ord(char), 0xFF)
+        return code - 0x100 if code > 0x7F else code
+
     @staticmethod
     def _impl_cmp_pass(ir_data):
         ir, data = ir_data
@@ -378,7 +394,12 @@ class JITCompiler:
         ir_1 = []
         for inst in ir:
             if inst[0] == 'ret':
-                binary = encoder.encode_instruction([Opcode.MOV_R_IMM], opcode_reg=Reg.EAX, imm=1 if inst[1] else 0,size='int')
+                binary = encoder.encode_instruction([Opcode.MOV_R_IMM], opcode_reg=Reg.EAX, imm=inst[1],size='int')
+                ir_1.append((('mov', Reg.EAX, inst[1]),binary))
+                ir_1.append(('jump','return'))
+            elif inst[0] == 'ret var':
+                # the variable's register is copied to the return register
+                binary = encoder.encode_instruction([Opcode.MOV_R_RM], reg=Reg.EAX, reg_mem=inst[1], size=inst[2])
                 ir_1.append((('mov', Reg.EAX, inst[1]),binary))
                 ir_1.append(('jump','return'))
             else:
@@ -417,9 +438,9 @@ class JITCompiler:
         labels_set = set(labels)
         ir_1 = []
         jmp_targets = set()
-        jmp_map = {'jump':'jmp', 'jump eq':'je', 'jump ne':'jne'}
+        jmp_map = {'jump':'jmp', 'jump eq':'je', 'jump ne':'jne', 'jump lt':'jb', 'jump le':'jbe'}
         for num,inst in enumerate(ir):
-            if inst[0] in {'jump', 'jump eq', 'jump ne'}:
+            if inst[0] in jmp_map:
                 if inst[1] not in labels_set:
                     raise CompilationError('label "{}" not found'.format(inst[1]))
                 jmp_targets.add(inst[1])
@@ -429,6 +450,10 @@ class JITCompiler:
                     binary = encoder.enc_je_near(0)
                 elif inst[0] == 'jump ne':
                     binary = encoder.enc_jne_near(0)
+                elif inst[0] == 'jump lt':
+                    binary = encoder.enc_jb_near(0)
+                elif inst[0] == 'jump le':
+                    binary = encoder.enc_jbe_near(0)
                 ir_1.append(((jmp_map[inst[0]], inst[1]), binary))
             else:
                 ir_1.append(inst)
@@ -436,22 +461,34 @@ class JITCompiler:
         data['jmp_targets'] = jmp_targets
         return (ir_1, data)
 
+    @staticmethod
+    def _check_code_size_pass(ir_data):
+        # near jumps have a fixed size, so the size of the code is known
+        # before jump offsets are calculated
+        ir, data = ir_data
+        max_code_bytes = data['max_code_bytes']
+        if max_code_bytes is not None:
+            size = sum(len(inst[1]) for inst in ir if inst[0] != 'label')
+            if size > max_code_bytes:
+                raise rejit.common.BudgetExceededError('code_bytes', max_code_bytes)
+        return ir_data
+
     @staticmethod
     def _impl_jmps_pass(ir_data):
         ir, data = ir_data
         labels = data['labels']
 
+        # offsets[num] is the position of instruction `num` in the code
+        offsets = [0]
+        for inst in ir:
+            offsets.append(offsets[-1] + (0 if inst[0] == 'label' else len(inst[1])))
+
         ir_1 = []
         for num,inst in enumerate(ir):
-            if inst[0][0] in {'jmp', 'je', 'jne'}:
-                # calculate jump offset
+            if inst[0][0] in {'jmp', 'je', 'jne', 'jb', 'jbe'}:
+                # calculate jump offset, relative to the end of the jump
                 target_num = labels[inst[0][1]]
-                if target_num > num:
-                    no_label = filter(lambda x: x[0]!='label', ir[num+1:target_num])
-                    jump_length = functools.reduce(lambda acc,x: acc + len(x[1]), no_label, 0)
-                else: 
-                    no_label = filter(lambda x: x[0]!='label', ir[target_num:num+1])
-                    jump_length = functools.reduce(lambda acc,x: acc - len(x[1]), no_label, 0)
+                jump_length = offsets[target_num] - offsets[num+1]
                 new_bin = inst[1][:-4] + int32bin(jump_length)
                 ir_1.append((inst[0], new_bin))
             else:
@@ -466,5 +503,5 @@ class JITCompiler:
 
     @staticmethod
     def _merge_binary_instructions(ir):
-        return functools.reduce(lambda acc, x: acc+x, map(lambda x: x[1], ir))
+        return b''.join(map(lambda x: x[1], ir))
 
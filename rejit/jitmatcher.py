@@ -1,32 +1,96 @@
 #encoding: utf8
 
 import struct
+import os
 
+from rejit.common import BudgetExceededError
 import rejit.jitcompiler as jitcompiler
 import rejit.ir_compiler as ir_compiler
 import rejit.loadcode as loadcode
 
+def target():
+    """Return a name of the platform which JIT compiled code is generated for."""
+    encoder = 'Encoder64' if struct.calcsize("P") == 8 else 'Encoder32'
+    # calling conventions differ between systems
+    return '{}-{}'.format(encoder, os.name)
+
 class JITMatcher:
-    def __init__(self, dfa):
+    def __init__(self, dfa, accept_values=None, minimize=True, max_ir_instructions=None, max_code_bytes=None,
+            longest_prefix=False):
+        # `accept_values` optionally maps accepting DFA states to ints
+        # returned by the compiled code, see `_call`
+        # with `longest_prefix` the code computes `DFA.longest_prefix`
+        # instead of acceptance, see `longest_prefix`
+        # the DFA is minimized first, states with different accept values
+        # aren't merged and merged states keep names of the original ones
+        # the code reads bytes of ASCII strings, other strings are matched
+        # by the minimized DFA
+        # compilation stops with `BudgetExceededError` if the IR has more
+        # than `max_ir_instructions` instructions or the machine code more
+        # than `max_code_bytes` bytes, before jump offsets are calculated
+        # and any code is loaded
+        if minimize:
+            dfa = dfa.minimize(state_labels=accept_values)
         ir_cc = ir_compiler.IRCompiler()
         jit_cc = jitcompiler.JITCompiler()
-        self._ir, self._variables = ir_cc.compile_to_ir(dfa)
+        self._ir, self._variables = ir_cc.compile_to_ir(dfa, accept_values=accept_values,
+                longest_prefix=longest_prefix)
+        if max_ir_instructions is not None and len(self._ir) > max_ir_instructions:
+            raise BudgetExceededError('ir_instructions', max_ir_instructions)
 
         # function call arguments
         args = ('string','length')
         # 64bit Python
         if struct.calcsize("P") == 8:
-            self._x86_binary, self._compilation_data = jit_cc.compile_to_x86_64(self._ir, args, self._variables)
+            self._x86_binary, self._compilation_data = jit_cc.compile_to_x86_64(self._ir, args, self._variables,
+                    max_code_bytes=max_code_bytes)
         else:
-            self._x86_binary, self._compilation_data = jit_cc.compile_to_x86_32(self._ir, args, self._variables)
+            self._x86_binary, self._compilation_data = jit_cc.compile_to_x86_32(self._ir, args, self._variables,
+                    max_code_bytes=max_code_bytes)
 
         self._description = dfa.description
+        self._unicode_matcher = dfa
+        self._accept_values = accept_values
         self._jit_func = loadcode.load(self._x86_binary)
 
+    @staticmethod
+    def _from_binary(x86_binary, description, unicode_matcher):
+        # create a matcher from already compiled code, e.g. read from a cache,
+        # `unicode_matcher` accepts the same strings and matches non-ASCII ones
+        matcher = JITMatcher.__new__(JITMatcher)
+        matcher._ir = None
+        matcher._variables = None
+        matcher._compilation_data = None
+        matcher._x86_binary = x86_binary
+        matcher._description = description
+        matcher._unicode_matcher = unicode_matcher
+        matcher._accept_values = None
+        matcher._jit_func = loadcode.load(x86_binary)
+        return matcher
+
     @property
     def description(self):
         return self._description
 
     def accept(self, s):
-        return bool(loadcode.call(self._jit_func,s,len(s)))
+        if not s.isascii():
+            return self._unicode_matcher.accept(s)
+        return bool(self._call(s))
+
+    def _call(self, s):
+        # the value returned by the compiled code: 1, or a value from
+        # `accept_values`, if `s` was accepted and 0 otherwise
+        if not s.isascii():
+            if self._accept_values is None:
+                return int(self._unicode_matcher.accept(s))
+            return self._accept_values.get(self._unicode_matcher._final_state(s), 0)
+        return loadcode.call(self._jit_func,s,len(s))
+
+    def longest_prefix(self, text, start=0, end=None):
+        """Return the length of the longest accepted prefix of `text[start:end]`, or -1.
+
+        Only matchers compiled with `longest_prefix=True` can be used.
+        `text` is a bytes-like object, which isn't copied.
+        """
+        return loadcode.call_range(self._jit_func, text, start, len(text) if end is None else end)
 
@@ -0,0 +1,209 @@
+#encoding: utf8
+
+import array
+import bisect
+import collections
+import threading
+
+import rejit.charset as charset
+from rejit.pikevm import PikeVM
+
+LazyDFAInfo = collections.namedtuple('LazyDFAInfo',
+        ['hits', 'misses', 'flushes', 'fallbacks', 'states', 'max_states'])
+"""Statistics of a `LazyDFA`: cached transitions used, transitions computed,
+cache flushes, calls finished with NFA simulation, and the current and
+the maximal number of cached states."""
+
+class _StateCache:
+    # DFA states built so far, replaced with a new object on a flush
+    def __init__(self):
+        # state number -> (tuple of consuming NFA states, accepting)
+        self.states = []
+        # (tuple of consuming NFA states, accepting) -> state number
+        self.numbers = {}
+        # state number -> list of target state numbers per class, None if
+        # the transition wasn't computed yet
+        self.transitions = []
+
+class LazyDFA:
+    """DFA built on demand while matching.
+
+    A `LazyDFA` simulates a NFA like `PikeVM`, but remembers every set of
+    NFA states it reaches as a DFA state and every computed transition
+    between them. Transitions are computed once per character class, so
+    matching only reaches the NFA on the first visit of a state with
+    a class. States never visited by inputs are never built, so patterns
+    which full DFAs are exponential, like `(a|b)*a(a|b){20}`, stay cheap.
+
+    The number of cached states is bounded by `max_states`. When the cache
+    is full, it's flushed and rebuilt from the current state. If a call
+    flushes the cache again after fewer than `min_chars_per_flush`
+    characters, the cache doesn't help and the rest of the input is
+    matched with the NFA simulation. Counters of cache hits, misses, flushes
+    and fallbacks are returned by `info`.
+
+    A `LazyDFA` can be used by many threads at once.
+
+    Attributes:
+    max_states (int): the maximal number of cached DFA states
+    min_chars_per_flush (int): chars a call must match between flushes not
+        to fall back to the NFA simulation
+    _vm (PikeVM): NFA simulator computing closures and used as a fallback
+    _bounds (list of int): first codes of character classes
+    _byte_classes (array): classes of codes below 256
+    _start (tuple): consuming NFA states and acceptance of the start state
+    _cache (_StateCache): cached states and transitions
+    _lock (Lock): lock guarding changes of the cache and the counters
+    """
+
+    def __init__(self, nfa, max_states=1000, min_chars_per_flush=10):
+        """Prepare lazy matching of `nfa`.
+
+        Args:
+        nfa (NFA or CompactNFA): a valid NFA
+        max_states (int): the maximal number of cached DFA states, at
+            least 2
+        min_chars_per_flush (int): see the class description
+        """
+        self.max_states = max(max_states, 2)
+        self.min_chars_per_flush = min_chars_per_flush
+        self._vm = PikeVM(nfa)
+        cnfa = self._vm._nfa
+        # character classes, as first codes of intervals between boundaries
+        # of NFA edge ranges
+        points = {0}
+        for first, last in zip(cnfa._firsts, cnfa._lasts):
+            points.add(max(first, 0))
+            points.add(last + 1)
+        self._bounds = sorted(point for point in points if point <= ord(charset.max_char))
+        self._byte_classes = array.array('i', (self._class_of(code) for code in range(256)))
+        # key of the start state
+        self._start = self._vm._closure(cnfa._start)[:2]
+        self._cache = _StateCache()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._flushes = 0
+        self._fallbacks = 0
+
+    @property
+    def description(self):
+        return self._vm.description
+
+    def accept(self, s):
+        """Check if the NFA accepts the whole string `s`."""
+        with self._lock:
+            cache = self._cache
+            state = cache.numbers.get(self._start)
+            if state is None:
+                if len(cache.states) >= self.max_states:
+                    cache = self._flush(cache, None)
+                state = self._add_state(cache, self._start)
+        byte_classes = self._byte_classes
+        hits = 0
+        since_flush = 0
+        flushed = False
+        for index, char in enumerate(s):
+            code = ord(char)
+            cls = byte_classes[code] if code < 256 else self._class_of(code)
+            target = cache.transitions[state][cls]
+            if target is None:
+                with self._lock:
+                    if len(cache.states) >= self.max_states:
+                        if flushed and since_flush < self.min_chars_per_flush:
+                            # the cache is thrashing, finish with the NFA
+                            self._fallbacks += 1
+                            self._hits += hits
+                            return self._fallback(cache.states[state][0], s[index:])
+                        cache = self._flush(cache, state)
+                        state = 0
+                        flushed = True
+                        since_flush = 0
+                    target = self._compute(cache, state, cls)
+            else:
+                hits += 1
+            state = target
+            since_flush += 1
+            if state < 0:
+                break
+        with self._lock:
+            self._hits += hits
+        return state >= 0 and cache.states[state][1]
+
+    def info(self):
+        """Return a `LazyDFAInfo` with counters and the size of the cache."""
+        with self._lock:
+            return LazyDFAInfo(self._hits, self._misses, self._flushes, self._fallbacks,
+                    len(self._cache.states), self.max_states)
+
+    def _class_of(self, code):
+        return bisect.bisect_right(self._bounds, code) - 1
+
+    def _add_state(self, cache, key):
+        # number of the state with `key`, added to `cache` if it's missing
+        number = cache.numbers.get(key)
+        if number is None:
+            number = len(cache.states)
+            cache.states.append(key)
+            cache.numbers[key] = number
+            cache.transitions.append([None] * len(self._bounds))
+        return number
+
+    def _compute(self, cache, state, cls):
+        # compute, cache and return the transition of `state` with `cls`,
+        # -1 if no NFA state is left
+        target = cache.transitions[state][cls]
+        if target is not None:
+            # computed by another thread meanwhile
+            return target
+        self._misses += 1
+        nfa = self._vm._nfa
+        code = self._bounds[cls]
+        consumers = set()
+        accepting = False
+        for st in cache.states[state][0]:
+            for e in range(nfa._offsets[st], nfa._offsets[st+1]):
+                if nfa._firsts[e] <= code <= nfa._lasts[e]:
+                    closure = self._vm._closure(nfa._targets[e])
+                    consumers.update(closure[0])
+                    accepting = accepting or closure[1]
+        if consumers or accepting:
+            target = self._add_state(cache, (tuple(sorted(consumers)), accepting))
+        else:
+            target = -1
+        cache.transitions[state][cls] = target
+        return target
+
+    def _flush(self, cache, state):
+        # replace the cache with one holding only `state`, which gets number 0,
+        # or an empty one if `state` is None
+        self._flushes += 1
+        new = _StateCache()
+        if state is not None:
+            self._add_state(new, cache.states[state])
+        self._cache = new
+        return new
+
+    def _fallback(self, consumers, s):
+        # match the rest of the input `s` from NFA states `consumers` with
+        # the NFA simulation
+        vm = self._vm
+        nfa = vm._nfa
+        current = consumers
+        accepting = False
+        for char in s:
+            code = ord(char)
+            targets = set()
+            for st in current:
+                for e in range(nfa._offsets[st], nfa._offsets[st+1]):
+                    if nfa._firsts[e] <= code <= nfa._lasts[e]:
+                        targets.add(nfa._targets[e])
+            current = set()
+            accepting = False
+            for target in targets:
+                closure = vm._closure(target)
+                current.update(closure[0])
+                accepting = accepting or closure[1]
+            if not current and not accepting:
+                return False
+        return accepting
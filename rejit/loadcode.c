@@ -68,11 +68,39 @@ loadcode_call(PyObject *self, PyObject *args)
     return PyLong_FromLong(result);
 }
 
+static PyObject *
+loadcode_call_range(PyObject *self, PyObject *args)
+{
+    PyObject *capsule;
+    Py_buffer bytes;
+    Py_ssize_t start, end;
+    FunObj *funobj;
+    int result;
+
+    if (!PyArg_ParseTuple(args, "Oy*nn", &capsule, &bytes, &start, &end)) // PyBuffer_Release --\/
+        return NULL;
+
+    if (start < 0 || end < start || end > bytes.len) {
+        PyBuffer_Release(&bytes);
+        PyErr_SetString(PyExc_IndexError, "Range outside of the buffer");
+        return NULL;
+    }
+
+    funobj = (FunObj*)PyCode_AsPtr(capsule);
+    result = funobj->func((const char*)bytes.buf + start, end - start);
+
+    PyBuffer_Release(&bytes); // PyArg_ParseTuple --^
+
+    return PyLong_FromLong(result);
+}
+
 static PyMethodDef LoadcodeMethods[] = {
     {"load", loadcode_load, METH_VARARGS,
      "Create a jitted function from bytes"},
     {"call", loadcode_call, METH_VARARGS,
      "Call a jitted function"},
+    {"call_range", loadcode_call_range, METH_VARARGS,
+     "Call a jitted function with a range of a bytes-like object"},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -5,6 +5,8 @@ import copy
 
 from rejit.common import RejitError
 from rejit.common import escape_symbol
+import rejit.charset as charset
+from rejit.pikevm import PikeVM
 
 try:
     import graphviz
@@ -30,6 +32,8 @@ class State:
 
     Transition's requirement label can be:
     * a single character
+    * a tuple `(first, last)` of characters for a range of characters,
+      `first` and `last` included
     * an empty string for an epsilon edge
     * a special string for a special edge type
 
@@ -37,7 +41,7 @@ class State:
     character.
 
     Attributes:
-    _edges (list of tuples(str, State)): a list of edges from the state to
+    _edges (list of tuples(label, State)): a list of edges from the state to
         other states.
     _state_num (int): a unique id number for each state which should be human
     readable.
@@ -62,13 +66,14 @@ class State:
 
         Transition's requirement label can be:
         * a single character
+        * a tuple `(first, last)` of characters for a range of characters
         * an empty string for an epsilon edge
         * a special string for a special edge type
 
         For more information about edges see `State` class' documentation.
 
         Args:
-        label (str): A label, requirement for transition to the other state.
+        label (str or tuple(str, str)): A label, requirement for transition to the other state.
         state (State): Other state, to which the edge points.
         """
         self._edges.append((label,state))
@@ -126,6 +131,7 @@ class NFA:
     _start (State): NFA's starting state
     _end (State): NFA's finishing state
     _description (str): internal variable for `description` property
+    _vm (PikeVM): simulator used by `accept`, created on the first use
     """
 
     def __init__(self,start,end):
@@ -148,6 +154,7 @@ class NFA:
         self._start = start
         self._end = end
         self._description = ''
+        self._vm = None
 
     @property
     def description(self):
@@ -161,7 +168,8 @@ class NFA:
         """Check if a string belongs to the NFA's accepted language.
 
         In other words, this checks if the string exactly matches the NFA's
-        regular expression equivalent.
+        regular expression equivalent. The NFA is simulated with a `PikeVM`,
+        in time linear in the length of the string.
         
         This method can only be called on a valid NFA object.
         
@@ -176,14 +184,10 @@ class NFA:
         """
         if not self.valid:
             raise NFAInvalidError('Trying to use invalid NFA object')
-        states = {self._start}
-        while states:
-            states = NFA._moveEpsilon(states)
-            if not s:
-                break
-            states = NFA._moveChar(states,s[0])
-            s = s[1:]
-        return self._end in states and s == ''
+        # states are numbered and converted to a `CompactNFA` on the first use
+        if self._vm is None:
+            self._vm = PikeVM(self)
+        return self._vm.accept(s)
 
     def __str__(self):
         return '<NFA id: {ident}, regex: {desc}>'.format(ident=id(self), desc=self.description)
@@ -218,11 +222,17 @@ class NFA:
         for st in states:
             g.node(str(st._state_num))
             for e in st._edges:
-                g.edge(str(st._state_num), str(e[1]._state_num), label=e[0] if e[0] else 'ε')
+                g.edge(str(st._state_num), str(e[1]._state_num), label=NFA._label_str(e[0]))
         g.body.append(r'label = "\n\n{}"'.format(self.description))
         g.body.append('fontsize=20')
         g.view()
 
+    @staticmethod
+    def _label_str(label):
+        if isinstance(label, tuple):
+            return '{}-{}'.format(*label)
+        return label if label else 'ε'
+
     def _invalidate(self):
         """Invalidate a NFA object making it not suitable for any use.
         
@@ -232,6 +242,7 @@ class NFA:
         self._start = None
         self._end = None
         self._description = None
+        self._vm = None
 
     @staticmethod
     def _get_all_reachable_states(state):
@@ -266,6 +277,22 @@ class NFA:
         """
         return set(map(lambda edge: edge[1], filter(lambda edge: edge[0]==char, state._edges)))
 
+    @staticmethod
+    def _get_range_states(state, char):
+        """Return a set of states connected to a `state` by an immediate edge
+        labeled with a range of characters which contains `char`.
+
+        Args:
+        state (State): the state from which the search is performed
+        char (str): a character which has to be in the edge's range
+
+        Returns:
+        A set of states connected to a `state` by a range edge containing
+        `char`.
+        """
+        return set(map(lambda edge: edge[1], filter(
+            lambda edge: isinstance(edge[0], tuple) and edge[0][0] <= char <= edge[0][1], state._edges)))
+
     @staticmethod
     def _moveEpsilon(in_to_check):
         """Return a set of states which are reachable from the input
@@ -307,7 +334,7 @@ class NFA:
         by consuming `char` character without eplison-moves.
         """
         return functools.reduce(
-                lambda x, st: x | NFA._get_char_states(st,char) | NFA._get_char_states(st,'any'),
+                lambda x, st: x | NFA._get_char_states(st,char) | NFA._get_range_states(st,char) | NFA._get_char_states(st,'any'),
                 in_to_check,
                 set())
 
@@ -388,10 +415,14 @@ class NFA:
         """Return a NFA which accepts one character from a set.
 
         `char_set` NFA accepts a string which comprises exactly one character
-        from a set of character literals. Character set is passed by a
-        `char_list` - list of str, which allows duplicates. Duplicates don't
-        change the behavior of the NFA, but result in creation of unnecessary
-        states and edges in the NFA, and thus it is discouraged.
+        from a set of characters. The set is passed by a `char_list` - list of
+        single characters and `(first, last)` ranges of characters, `first`
+        and `last` included. The list allows duplicates and overlapping ranges.
+
+        The set is normalized to sorted, disjoint ranges (see `rejit.charset`)
+        and the NFA has a single edge for each range, no matter how many
+        characters the range contains. Single characters are kept as ordinary
+        character edges.
 
         `char_list` can be empty. Returned NFA is equivalent to `none` NFA.
 
@@ -399,18 +430,16 @@ class NFA:
         as a description of the NFA. The external description is used because
         any description created knowing only `char_list` could be misleading.
         Example: for a regular expression `[a-e]` user passes a list
-        `['a','b','c','d','e']`, but `char_set` doesn't know whether user had
-        `[a-e]` or `[abcde]` in mind. Therefore user has to pass the expected
+        `[('a','e')]`, but `char_set` doesn't know whether user had `[a-e]` or
+        `[abcde]` in mind. Therefore user has to pass the expected
         description.
 
         Returned NFA object is valid.
 
-        Warning:
-        This method is likely to change in future versions.
-
         Args:
-        char_list (list of str): A list of character literals one of which
-            should be accepted. Allows duplicates. Can be empty.
+        char_list (list of str or tuple(str, str)): A list of characters and
+            ranges of characters one of which should be accepted. Allows
+            duplicates. Can be empty.
         description (str): A regular expression description for the NFA.
             Due to its limitations, `char_set` can't reconstruct the expected
             description from `char_list` only.
@@ -418,8 +447,9 @@ class NFA:
         Returns:
         A NFA which accepts one character from a set.
         """
-        # Empty set results in `none` NFA, as in `union_many`
-        n = NFA.union_many(list(map(NFA.symbol, char_list)))
+        n = NFA(State(),State())
+        for first, last in charset.normalize(char_list):
+            n._start.add(first if first == last else (first, last), n._end)
         n._description = description
         return n
 
@@ -564,6 +594,10 @@ class NFA:
 
         Returned NFA object is valid.
 
+        The NFA is built like a Kleene star without the edge skipping `s`, so
+        it adds two states and three edges to `s`, which isn't copied. Nested
+        pluses grow the NFA linearly.
+
         Raises:
         NFAInvalidError: if `s` is invalid.
 
@@ -573,11 +607,16 @@ class NFA:
         Returns:
         A valid NFA which accepts a Kleene plus of `s` language
         """
-        # validation and invalidation of `s` is performed inside `concat`
-        s_copy = copy.deepcopy(s)
-        s_description = s._description
-        n = NFA.concat(s,NFA.kleene(s_copy))
-        n._description = '('+s_description+')+'
+        if not s.valid:
+            raise NFAInvalidError('Trying to use invalid NFA object')
+        q = State()
+        f = State()
+        q.add('',s._start)
+        s._end.add('',s._start)
+        s._end.add('',f)
+        n = NFA(q,f)
+        n._description = '('+s._description+')+'
+        s._invalidate()
         return n
 
     @staticmethod
@@ -638,9 +677,9 @@ class NFA:
         Returned NFA object is valid.
 
         Note:
-        Using this method is almost equivalent to chaining calls to `concat`. 
-        This method serves only as a better interface. It also invalidates all
-        objects in a list or none of them.
+        Using this method is almost equivalent to chaining calls to `concat`,
+        but it runs in time linear in the length of the list. It also
+        invalidates all objects in a list or none of them.
 
         Raises:
         NFAInvalidError: if any NFA in `concat_list` is invalid. Valid ones are
@@ -655,21 +694,22 @@ class NFA:
         Returns:
         A valid NFA which accepts a concatenation of languages in a list.
         """
-        # Validation of elements of `concat_list` is performed also outside of
-        # `concat`, because `concat_many` shouldn't invalidate part of
-        # `concat_list` before reaching an invalid NFA.
-        # Invalidation of elements of `concat_list` is performed inside
-        # `concat`. This algorithm sets good description without intervention. 
+        # NFAs are linked directly instead of chaining `concat` calls, which
+        # would rebuild the growing description for every element and make
+        # long concatenations quadratic.
         if not concat_list:
             return NFA.empty()
         if not all(map(lambda x: x.valid, concat_list)):
             raise NFAInvalidError('Trying to use invalid NFA object')
         if len(set(concat_list)) != len(concat_list):
             raise NFAArgumentError("Can't use the same object more than once in the concat_list")
-        return functools.reduce(
-                lambda acc, x: NFA.concat(acc,x),
-                concat_list
-            )
+        n = NFA(concat_list[0]._start, concat_list[-1]._end)
+        for s, t in zip(concat_list, concat_list[1:]):
+            s._end.add('',t._start)
+        n._description = ''.join(map(lambda x: x._description, concat_list))
+        for x in concat_list:
+            x._invalidate()
+        return n
 
     @staticmethod
     def union_many(union_list):
@@ -718,7 +758,7 @@ class NFA:
         for u in union_list:
             n._start.add('',u._start)
             u._end.add('',n._end)
-        n._description = '(' + functools.reduce(lambda acc, x: acc+"|"+x.description,union_list[1:],union_list[0].description) + ')'
+        n._description = '(' + '|'.join(map(lambda x: x.description, union_list)) + ')'
         for x in union_list:
             x._invalidate()
         return n
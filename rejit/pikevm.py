@@ -0,0 +1,113 @@
+#encoding: utf8
+
+from rejit.compactnfa import compact
+
+class PikeVM:
+    """NFA simulation over densely numbered states.
+
+    `PikeVM` runs on the integer tables of a `CompactNFA`. A NFA given as
+    a graph of states is converted to the compact form first, and is left
+    unchanged. A consuming edge matches a character if the character's code
+    is in the edge's range.
+
+    The NFA is simulated by keeping a list of current states, which is
+    advanced by one character of the input at a time. Epsilon closures of
+    states are computed once, when they are first needed, and cached. A
+    closure keeps only states with consuming edges, so epsilon-only states
+    are never visited while matching. Lists of states are deduplicated with
+    a sparse set: an array of generation marks allocated once per call and
+    reused by every step, so a step doesn't allocate sets. Matching takes
+    time linear in the length of the input, for every pattern.
+
+    A `PikeVM` can be used by many threads at once.
+
+    Attributes:
+    _nfa (CompactNFA): the simulated NFA
+    _closures (list): maps each state to a cached `(consumers, accepting,
+        tags)` tuple, or None if it's not computed yet
+    _tags (list): maps each state to its tag from `accept_tags` or None
+    """
+
+    def __init__(self, nfa, accept_tags=None):
+        """Prepare simulation of `nfa`.
+
+        Args:
+        nfa (NFA or CompactNFA): a valid NFA
+        accept_tags (dict): optionally maps NFA states to tags, returned by
+            `accepted_tags` when the states are reached at the end of input
+        """
+        self._nfa, tags = compact(nfa, accept_tags)
+        self._tags = [None] * self._nfa.num_states
+        for st, tag in tags.items():
+            self._tags[st] = tag
+        self._closures = [None] * self._nfa.num_states
+
+    @property
+    def description(self):
+        return self._nfa.description
+
+    def accept(self, s):
+        """Check if the NFA accepts the whole string `s`."""
+        return any(self._closure(target)[1] for target in self._run(s))
+
+    def accepted_tags(self, s):
+        """Return a frozenset of tags of states reached at the end of `s`.
+
+        Tags are assigned to NFA states with the `accept_tags` argument of
+        the constructor.
+        """
+        return frozenset().union(*(self._closure(target)[2] for target in self._run(s)))
+
+    def _run(self, s):
+        # Return targets of edges taken with the last character of `s`, or
+        # [start] for an empty `s`. NFA's states at the end of `s` are
+        # epsilon closures of the targets.
+        nfa = self._nfa
+        offsets, firsts, lasts, edge_targets = nfa._offsets, nfa._firsts, nfa._lasts, nfa._targets
+        # sparse set marks, a state is in the set if marked with `generation`
+        marks = [0] * nfa.num_states
+        generation = 0
+        targets = [nfa._start]
+        for char in s:
+            code = ord(char)
+            # consuming states in closures of targets, without duplicates
+            generation += 1
+            current = []
+            for target in targets:
+                for st in self._closure(target)[0]:
+                    if marks[st] != generation:
+                        marks[st] = generation
+                        current.append(st)
+            # targets of edges matching `char`, without duplicates
+            generation += 1
+            targets = []
+            for st in current:
+                for e in range(offsets[st], offsets[st+1]):
+                    if firsts[e] <= code <= lasts[e]:
+                        target = edge_targets[e]
+                        if marks[target] != generation:
+                            marks[target] = generation
+                            targets.append(target)
+            if not targets:
+                break
+        return targets
+
+    def _closure(self, state):
+        # (consumers, accepting, tags) of the epsilon closure of `state`
+        closure = self._closures[state]
+        if closure is None:
+            # threads computing the same closure store equal values
+            nfa = self._nfa
+            consumers = []
+            accepting = False
+            tags = set()
+            for st in sorted(nfa._epsilon_closure(state)):
+                if nfa._offsets[st] != nfa._offsets[st+1]:
+                    consumers.append(st)
+                if st in nfa._ends:
+                    accepting = True
+                if self._tags[st] is not None:
+                    tags.add(self._tags[st])
+            closure = (tuple(consumers), accepting, frozenset(tags))
+            self._closures[state] = closure
+        return closure
@@ -0,0 +1,169 @@
+#encoding: utf8
+
+import collections
+import os.path
+
+import rejit.regex_ast as ast
+
+PrefilterInfo = collections.namedtuple('PrefilterInfo',
+        ['prefix', 'suffix', 'inner', 'anchor', 'calls', 'rejected', 'skipped'])
+"""A `Prefilter` of a regex: literals every match starts with, ends with and
+contains ('' if there is none), the `(literal, max_offset)` anchor used by
+searches, the number of checked inputs, of inputs rejected without running
+the automaton, and of characters skipped by searches."""
+
+# Literals of strings matched by an AST node: `exact` is the only string the
+# node matches or None, `prefix` and `suffix` start and end every match,
+# `bounded` is the best `(literal, max_offset)` required at most `max_offset`
+# characters after the start of a match or None, `longest` is the longest
+# required literal. `min` and `max` are the lengths of the shortest and the
+# longest match, `max` is None if it's unbounded.
+_Factors = collections.namedtuple('_Factors', ['exact', 'prefix', 'suffix', 'bounded', 'longest', 'min', 'max'])
+
+def _literal(string):
+    return _Factors(string, string, string, (string, 0) if string else None, string, len(string), len(string))
+
+_char = _Factors(None, '', '', None, '', 1, 1)
+
+def _add(offset, length):
+    return None if offset is None or length is None else offset + length
+
+def _best_bounded(candidates):
+    # the longest of `(literal, max_offset)` candidates, the closest to
+    # the start if they are equally long
+    bounded = [(literal, offset) for literal, offset in candidates if literal and offset is not None]
+    return max(bounded, key=lambda candidate: (len(candidate[0]), -candidate[1]), default=None)
+
+def _node_factors(node, children):
+    if node.type == 'symbol':
+        return _literal(node.char)
+    elif node.type == 'set':
+        if len(node.ranges) == 1 and node.ranges[0][0] == node.ranges[0][1]:
+            return _literal(node.ranges[0][0])
+        return _char
+    elif node.type == 'any':
+        return _char
+    elif node.type == 'empty':
+        return _literal('')
+    elif node.type == 'kleene-star':
+        return _Factors(None, '', '', None, '', 0, 0 if children[0].max == 0 else None)
+    elif node.type == 'zero-or-one':
+        return _Factors(None, '', '', None, '', 0, children[0].max)
+    elif node.type in {'kleene-plus', 'repeat'}:
+        child = children[0]
+        low, high = (1, None) if node.type == 'kleene-plus' else (node.min, node.max)
+        high_length = None if high is None or child.max is None else child.max * high
+        if low == 0:
+            return _Factors(None, '', '', None, '', 0, high_length)
+        # literals of the first repetition are in every match
+        return _Factors(None, child.prefix, child.suffix, child.bounded, child.longest, child.min * low, high_length)
+    elif node.type == 'union':
+        exact = children[0].exact if all(child.exact == children[0].exact for child in children) else None
+        prefix = os.path.commonprefix([child.prefix for child in children])
+        suffix = os.path.commonprefix([child.suffix[::-1] for child in children])[::-1]
+        lengths = [child.max for child in children]
+        return _Factors(exact, prefix, suffix, (prefix, 0) if prefix else None, max(prefix, suffix, key=len),
+                min(child.min for child in children), None if None in lengths else max(lengths))
+    elif node.type == 'concat':
+        exact = ''.join(child.exact for child in children) if all(child.exact is not None for child in children) else None
+        prefix = ''
+        for child in children:
+            prefix += child.prefix if child.exact is None else child.exact
+            if child.exact is None:
+                break
+        suffix = ''
+        for child in reversed(children):
+            suffix = (child.suffix if child.exact is None else child.exact) + suffix
+            if child.exact is None:
+                break
+        # consecutive exact children with the suffix of the child before
+        # them and the prefix of the one after them form a literal
+        candidates = []
+        offset = 0
+        run, run_offset = '', 0
+        for child in children:
+            if child.exact is not None:
+                run += child.exact
+            else:
+                candidates.append((run + child.prefix, run_offset))
+                if child.bounded:
+                    candidates.append((child.bounded[0], _add(offset, child.bounded[1])))
+                candidates.append((child.longest, None))
+                end = _add(offset, child.max)
+                run, run_offset = child.suffix, _add(end, -len(child.suffix))
+            offset = _add(offset, child.max)
+        candidates.append((run, run_offset))
+        longest = max((literal for literal, _ in candidates), key=len)
+        return _Factors(exact, prefix, suffix, _best_bounded(candidates), longest,
+                sum(child.min for child in children), offset)
+    raise ast.ASTError('Unknown AST node: {}'.format(node))
+
+class Prefilter:
+    """Skips input which can't match a regex, using `str.find`.
+
+    Literals required by every match are extracted from the regex' AST:
+    a prefix, a suffix, and the longest literal found anywhere in
+    a match. An input without them is rejected before any automaton reads
+    it, with C-speed string methods.
+
+    Searches use an anchor literal, the longest one found at a bounded
+    distance from the start of a match, e.g. `ERROR` in `ERROR [0-9]+`.
+    A match can't start more than the distance before the next occurrence
+    of the anchor, so the automaton only runs from there. Without a bounded
+    literal, like in `.*ERROR`, the longest literal is only checked to exist.
+
+    Counters aren't locked, concurrent calls may miss a few updates.
+
+    Attributes:
+    prefix (str): literal every match starts with, or ''
+    suffix (str): literal every match ends with, or ''
+    inner (str): the longest literal every match contains, or '' if it's
+        a part of `prefix` or `suffix`
+    anchor (tuple): `(literal, max_offset)` used by searches, `max_offset`
+        is None if it's unbounded
+    """
+
+    def __init__(self, prefix, suffix, inner, anchor):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.inner = '' if inner in prefix or inner in suffix else inner
+        self.anchor = anchor
+        self._calls = 0
+        self._rejected = 0
+        self._skipped = 0
+
+    @staticmethod
+    def from_ast(tree):
+        """Return a `Prefilter` of literals required by `tree`, or None if there are none."""
+        factors = ast.fold(tree, _node_factors)
+        if not factors.longest:
+            return None
+        anchor = factors.bounded or (factors.longest, None)
+        return Prefilter(factors.prefix, factors.suffix, factors.longest, anchor)
+
+    def rejects(self, s):
+        """Check if the whole string `s` can't be matched, because it misses a literal."""
+        self._calls += 1
+        if s.startswith(self.prefix) and s.endswith(self.suffix) and self.inner in s:
+            return False
+        self._rejected += 1
+        return True
+
+    def skip(self, s, pos):
+        """Return the position where a search of `s[pos:]` can start, or -1 if nothing matches."""
+        self._calls += 1
+        literal, max_offset = self.anchor
+        found = s.find(literal, pos)
+        if found < 0:
+            self._rejected += 1
+            return -1
+        if max_offset is None:
+            return pos
+        start = max(pos, found - max_offset)
+        self._skipped += start - pos
+        return start
+
+    def info(self):
+        """Return a `PrefilterInfo` with the literals and counters."""
+        return PrefilterInfo(self.prefix, self.suffix, self.inner, self.anchor,
+                self._calls, self._rejected, self._skipped)
@@ -1,14 +1,28 @@
 #encoding: utf8
 
+import collections
 import functools
-import copy
+import string
+import threading
+import time
 
 from rejit.common import RejitError
+from rejit.common import BudgetExceededError
 from rejit.common import special_chars
 
+import rejit.charset as charset
+import rejit.diskcache
+import rejit.glushkov
+import rejit.regex_ast as ast
 from rejit.nfa import NFA
+from rejit.compactnfa import CompactNFA
 from rejit.dfa import DFA
 from rejit.jitmatcher import JITMatcher
+from rejit.bitparallel import BitParallelMatcher
+from rejit.bitparallel import BitParallelError
+from rejit.lazydfa import LazyDFA
+from rejit.search import Searcher
+from rejit.prefilter import Prefilter
 
 class RegexError(RejitError): pass
 
@@ -18,24 +32,192 @@ class RegexCompilationError(RegexError): pass
 
 class RegexMatcherError(RegexError): pass
 
+class RegexBudgetError(RegexCompilationError):
+    """Compilation of a regex exceeded a budget, see `Regex.compile_to_DFA`.
+
+    Attributes:
+    budget (str): name of the exceeded budget, e.g. 'dfa_states'
+    limit (int): the exceeded limit
+    """
+
+    def __init__(self, budget, limit):
+        super().__init__('Compilation exceeded the {} budget of {}'.format(budget, limit))
+        self.budget = budget
+        self.limit = limit
+
+TierInfo = collections.namedtuple('TierInfo', ['tier', 'calls', 'chars', 'promotions'])
+"""Statistics of an adaptive `Regex`: the current matcher type, the number of
+`accept` calls and of characters they consumed, and a list of `Promotion`s."""
+
+Promotion = collections.namedtuple('Promotion', ['tier', 'calls', 'chars', 'seconds', 'error', 'fallback'])
+"""A promotion of an adaptive `Regex` to the `tier` matcher type, done after
+`calls` calls and `chars` characters. `seconds` is the compilation time,
+`error` is None, or the error message if the compilation failed, and
+`fallback` is None, or the `Fallback` taken when a budget was exceeded."""
+
+Match = collections.namedtuple('Match', ['start', 'end', 'group'])
+"""A match found by `Regex.search` or `Regex.finditer`: `group` is the
+matched substring `s[start:end]`."""
+
+Fallback = collections.namedtuple('Fallback', ['requested', 'matcher_type', 'budget', 'limit'])
+"""A compilation of a `Regex` to the `requested` matcher type which exceeded
+the `budget` with `limit`, after which the regex uses `matcher_type`."""
+
 class Regex:
-    def __init__(self, pattern=None):
+    constructions = ('thompson', 'glushkov')
+    """NFA constructions: 'thompson' builds the NFA from fragments joined with
+    epsilon edges, 'glushkov' builds an epsilon-free NFA with a state for every
+    symbol occurrence in the pattern (see `rejit.glushkov`)."""
+
+    def __init__(self, pattern=None, construction='thompson'):
+        if construction not in Regex.constructions:
+            raise RegexCompilationError('Unknown NFA construction: {}'.format(construction))
         self.pattern = pattern
         self._ast = None
         self._final_ast = None
         self._matcher = None
         self._matcher_type = 'None'
+        self._tiering = None
+        self._fallback = None
+        self._searcher = None
+        self._prefilter = None
         if self.pattern is not None:
             self._ast = self._parse(pattern)
             self._final_ast = self._transform(self._ast)
-            self._matcher = self._compile(self._final_ast)
+            self._prefilter = Prefilter.from_ast(self._final_ast)
+            if construction == 'glushkov':
+                self._matcher = rejit.glushkov.build(self._final_ast)
+            else:
+                # the graph NFA is only kept in the compact form
+                self._matcher = CompactNFA(self._compile(self._final_ast))
             self._matcher_type = 'NFA'
 
+    def __and__(self, other):
+        """Return a regex matching strings matched by both regexes, see `_combine`."""
+        return self._combine(other, DFA.intersect)
+
+    def __or__(self, other):
+        """Return a regex matching strings matched by any of the regexes, see `_combine`."""
+        return self._combine(other, DFA.union)
+
+    def __sub__(self, other):
+        """Return a regex matching strings matched by this regex but not `other`."""
+        return self._combine(other, DFA.difference)
+
+    def __invert__(self):
+        """Return a regex matching strings this regex doesn't match."""
+        regex = Regex()
+        regex._matcher = self._operand_DFA().complement()
+        regex._matcher_type = 'DFA'
+        return regex
+
+    def _combine(self, other, operation):
+        # A new regex with a DFA matcher built with the product `operation`
+        # of DFAs of both regexes, which are left unchanged. A composite
+        # rule is matched in one pass, and can be compiled to x86 code.
+        # It has no pattern, so it isn't stored in the disk cache.
+        if not isinstance(other, Regex):
+            return NotImplemented
+        regex = Regex()
+        regex._matcher = operation(self._operand_DFA(), other._operand_DFA())
+        regex._matcher_type = 'DFA'
+        return regex
+
+    def _operand_DFA(self):
+        # DFA of the regex used as an operand of a boolean operator
+        if self._matcher_type == 'DFA':
+            return self._matcher
+        if self._matcher_type != 'NFA':
+            raise RegexCompilationError(
+                    "Can only combine NFA- and DFA-type matchers. Current matcher type: {}".format(self._matcher_type))
+        budgets = Regex.default_budgets
+        try:
+            return DFA(self._matcher, max_states=budgets['dfa_states'], max_transitions=budgets['dfa_transitions'])
+        except BudgetExceededError as e:
+            raise RegexBudgetError(e.budget, e.limit) from e
+
     def accept(self, s):
         if self._matcher:
+            if self._tiering is not None:
+                self._count_use(s)
+            # x86 code reads strings as fast as the prefilter
+            if self._prefilter is not None and self._matcher_type != 'JIT' and self._prefilter.rejects(s):
+                return False
             return self._matcher.accept(s)
         raise RegexMatcherError("No matcher found")
 
+    def search(self, s, pos=0):
+        """Find the leftmost-longest match of the regex in `s[pos:]`.
+
+        Unlike `accept`, the regex can match any substring. Of the matches
+        which start leftmost, the longest one is returned, like in POSIX.
+        `s` is scanned once to find the end of the match and the match is
+        read backwards to find its start, see `rejit.search.Searcher`.
+
+        The search uses DFAs of the pattern, built on the first search with
+        `default_budgets`. A regex with a JIT matcher also compiles them to
+        x86 code, which scans ASCII strings.
+
+        Returns:
+        A `Match`, or None if the regex doesn't match any substring.
+
+        Raises:
+        RegexMatcherError: if the regex has no pattern
+        RegexBudgetError: if building the DFAs or code exceeds a budget
+        """
+        span = self._get_searcher(s).search(s, pos)
+        return Match(span[0], span[1], s[span[0]:span[1]]) if span else None
+
+    def finditer(self, s):
+        """Yield non-overlapping leftmost-longest matches of the regex in `s`.
+
+        Matches are `Match`es found from left to right, each like `search`
+        finds it in the rest of `s` after the previous match. An empty
+        match is never followed by another one at the same position.
+
+        Raises:
+        RegexMatcherError: if the regex has no pattern
+        RegexBudgetError: if building the DFAs or code exceeds a budget
+        """
+        for start, end in self._get_searcher(s).finditer(s):
+            yield Match(start, end, s[start:end])
+
+    def _get_searcher(self, s):
+        # a searcher of the tier of the matcher, rebuilt when the regex is
+        # compiled to x86 code
+        if self._final_ast is None:
+            raise RegexMatcherError("Can only search with a regex compiled from a pattern")
+        if self._tiering is not None:
+            self._count_use(s)
+        jit = self._matcher_type == 'JIT'
+        searcher = self._searcher
+        if searcher is None or searcher[0] != jit:
+            nfa = CompactNFA(self._compile(self._final_ast))
+            reversed_nfa = CompactNFA(self._compile(ast.reverse(self._final_ast)))
+            try:
+                searcher = (jit, Searcher(nfa, reversed_nfa, jit, Regex.default_budgets,
+                    None if jit else self._prefilter))
+            except BudgetExceededError as e:
+                raise RegexBudgetError(e.budget, e.limit) from e
+            self._searcher = searcher
+        return searcher[1]
+
+    def prefilter_info(self):
+        """Return a `PrefilterInfo` of the regex' prefilter, or None if it has none.
+
+        A prefilter is chosen when every string matched by the pattern
+        contains a literal, like `ERROR` in `.*ERROR [0-9]+.*`. `accept`
+        rejects strings without required literals with `str` methods, before
+        the matcher reads them, and `search` and `finditer` use `str.find`
+        to skip input which can't start a match, see
+        `rejit.prefilter.Prefilter`. The counters show how often it helped.
+
+        The prefilter is used by all matchers except JIT compiled ones.
+        Their x86 code reads strings about as fast as `str.find`, so
+        calling the prefilter first would only add overhead.
+        """
+        return self._prefilter.info() if self._prefilter is not None else None
+
     def get_matcher_description(self):
         if self._matcher:
             return self._matcher.description
@@ -45,152 +227,618 @@ class Regex:
     def description(self):
         return self.get_matcher_description()
 
-    def compile_to_DFA(self):
+    default_budgets = {'dfa_states': None, 'dfa_transitions': None, 'ir_instructions': None, 'code_bytes': None}
+    """Default compilation budgets, see `compile_to_DFA`. None is no limit."""
+
+    default_fallback = 'error'
+    """Default action when a budget is exceeded, see `compile_to_DFA`."""
+
+    fallbacks = ('error', 'nfa', 'lazydfa', 'bitparallel')
+    """Actions when a budget is exceeded: raise `RegexBudgetError`, or stay
+    on or switch to a NFA-based matcher."""
+
+    def compile_to_DFA(self, budgets=None, fallback=None):
+        """Switch to a DFA matcher.
+
+        Construction of the DFA can be limited with budgets. It stops as
+        soon as a budget is exceeded, and the regex either raises
+        `RegexBudgetError` or switches to a matcher which doesn't build
+        a DFA, according to `fallback`. The fallback is recorded and
+        returned by `fallback_info`.
+
+        Args:
+        budgets (dict): maps budget names to limits, None is no limit.
+            'dfa_states' limits DFA states, 'dfa_transitions' transitions to
+            non-rejecting states, counted per character class. Missing
+            entries are taken from `default_budgets`.
+        fallback (str): one of `fallbacks`: 'error' raises, 'nfa' keeps the
+            NFA matcher, 'lazydfa' and 'bitparallel' switch to a `LazyDFA`
+            or a `BitParallelMatcher`. If the bit-parallel matcher can't be
+            built either, the regex keeps the NFA matcher. By default
+            `default_fallback`.
+
+        Returns:
+        The matcher type of the regex after the compilation.
+
+        Raises:
+        RegexCompilationError: if the matcher isn't NFA-based or `fallback`
+            is unknown
+        RegexBudgetError: if a budget is exceeded and `fallback` is 'error'
+        """
+        budgets, fallback = self._compilation_options(budgets, fallback)
         if self._matcher_type == 'DFA':
-            return
+            return self._matcher_type
         if self._matcher_type != 'NFA':
             raise RegexCompilationError(
                     "Can only compile NFA-type matcher to a DFA. Current matcher type: {}".format(self._matcher_type))
-        self._matcher = DFA(self._matcher)
+        # regexes combined with operators have no pattern to cache them by
+        disk_cache = rejit.diskcache.get_cache() if self.pattern is not None else None
+        entry = disk_cache.load(self.pattern) if disk_cache else None
+        # tables in an older format are rebuilt and replaced
+        if entry and entry.get('dfa', {}).get('format') == DFA.table_format:
+            self._matcher = DFA._from_table(entry['dfa'])
+        else:
+            try:
+                self._matcher = DFA(self._matcher, max_states=budgets['dfa_states'],
+                        max_transitions=budgets['dfa_transitions'])
+            except BudgetExceededError as e:
+                return self._fall_back('DFA', e, fallback)
+            if disk_cache:
+                disk_cache.store(self.pattern, dfa=self._matcher._to_table())
         self._matcher_type = 'DFA'
+        return self._matcher_type
+
+    def compile_to_x86(self, budgets=None, fallback=None):
+        """Switch to a JIT compiled matcher, compiling the regex to a DFA first.
+
+        Compilation can be limited with budgets, like in `compile_to_DFA`.
+        Additionally, 'ir_instructions' limits instructions of the
+        intermediate representation and 'code_bytes' the size of machine
+        code. When one of them is exceeded, the regex keeps its DFA matcher
+        unless `fallback` is 'error'.
+
+        Code loaded from the disk cache is used only if it's within the
+        'code_bytes' budget, otherwise the regex is compiled and falls back
+        like above. The IR of cached code isn't kept, so 'ir_instructions'
+        only limits code compiled here.
 
-    def compile_to_x86(self):
+        Returns:
+        The matcher type of the regex after the compilation.
+
+        Raises:
+        RegexCompilationError: if the matcher isn't NFA- or DFA-based, or
+            `fallback` is unknown
+        RegexBudgetError: if a budget is exceeded and `fallback` is 'error'
+        """
+        budgets, fallback = self._compilation_options(budgets, fallback)
         if self._matcher_type == 'JIT':
-            return
-        self.compile_to_DFA()
-        self._matcher = JITMatcher(self._matcher)
+            return self._matcher_type
+        # regexes combined with operators have no pattern to cache them by
+        disk_cache = rejit.diskcache.get_cache() if self.pattern is not None else None
+        if disk_cache and self._matcher_type in ('NFA', 'DFA'):
+            entry = disk_cache.load(self.pattern)
+            code_bytes = budgets['code_bytes']
+            if entry and 'x86_binary' in entry and (code_bytes is None or len(entry['x86_binary']) <= code_bytes):
+                # non-ASCII strings are matched by the cached DFA, or by
+                # the current matcher
+                unicode_matcher = self._matcher
+                if self._matcher_type == 'NFA' and entry.get('dfa', {}).get('format') == DFA.table_format:
+                    unicode_matcher = DFA._from_table(entry['dfa'])
+                self._matcher = JITMatcher._from_binary(entry['x86_binary'], self._matcher.description,
+                        unicode_matcher)
+                self._matcher_type = 'JIT'
+                return self._matcher_type
+        if self.compile_to_DFA(budgets, fallback) != 'DFA':
+            # the DFA exceeded a budget, the fallback is already recorded
+            return self._matcher_type
+        try:
+            matcher = JITMatcher(self._matcher, max_ir_instructions=budgets['ir_instructions'],
+                    max_code_bytes=budgets['code_bytes'])
+        except BudgetExceededError as e:
+            # the DFA is within budgets and faster than NFA-based matchers
+            return self._fall_back('JIT', e, 'error' if fallback == 'error' else 'dfa')
+        self._matcher = matcher
         self._matcher_type = 'JIT'
+        if disk_cache:
+            disk_cache.store(self.pattern, x86_binary=self._matcher._x86_binary)
+        return self._matcher_type
+
+    def fallback_info(self):
+        """Return the last `Fallback` of the regex, or None if there was none."""
+        return self._fallback
+
+    def _compilation_options(self, budgets, fallback):
+        # budgets with defaults and a validated fallback
+        merged = dict(Regex.default_budgets)
+        merged.update(budgets or {})
+        fallback = fallback or Regex.default_fallback
+        if fallback not in Regex.fallbacks:
+            raise RegexCompilationError('Unknown fallback: {}'.format(fallback))
+        return merged, fallback
+
+    def _fall_back(self, requested, error, fallback):
+        # handle `error` of compilation to the `requested` matcher type,
+        # return the matcher type used instead
+        if fallback == 'error':
+            raise RegexBudgetError(error.budget, error.limit) from error
+        if fallback == 'lazydfa':
+            self.compile_to_lazy_DFA()
+        elif fallback == 'bitparallel':
+            try:
+                self.compile_to_bitparallel()
+            except BitParallelError:
+                pass
+        self._fallback = Fallback(requested, self._matcher_type, error.budget, error.limit)
+        return self._matcher_type
+
+    def compile_to_bitparallel(self):
+        """Switch to a `BitParallelMatcher` of the pattern's Glushkov NFA.
+
+        The matcher simulates the NFA with a few integer operations per
+        character and doesn't build a DFA, so it's a good choice for patterns
+        which DFAs are too large, like `(a|b)*a(a|b){20}`.
+
+        Raises:
+        RegexCompilationError: if the matcher isn't NFA-based
+        BitParallelError: if the Glushkov NFA has too many states
+        """
+        if self._matcher_type == 'BitParallel':
+            return
+        if self._matcher_type != 'NFA':
+            raise RegexCompilationError(
+                    "Can only compile NFA-type matcher to a bit-parallel one. Current matcher type: {}".format(
+                        self._matcher_type))
+        self._matcher = BitParallelMatcher(rejit.glushkov.build(self._final_ast))
+        self._matcher_type = 'BitParallel'
+
+    def compile_to_lazy_DFA(self, max_states=1000):
+        """Switch to a `LazyDFA`, which builds DFA states while matching.
+
+        Only states reached by matched strings are built, and at most
+        `max_states` of them are kept, so it's a good choice for patterns
+        which full DFAs are too large to build.
+        Counters of the matcher's state cache are returned by
+        `lazy_dfa_info`.
+
+        Raises:
+        RegexCompilationError: if the matcher isn't NFA-based
+        """
+        if self._matcher_type == 'LazyDFA':
+            return
+        if self._matcher_type != 'NFA':
+            raise RegexCompilationError(
+                    "Can only compile NFA-type matcher to a lazy DFA. Current matcher type: {}".format(
+                        self._matcher_type))
+        self._matcher = LazyDFA(self._matcher, max_states)
+        self._matcher_type = 'LazyDFA'
+
+    def lazy_dfa_info(self):
+        """Return a `LazyDFAInfo` named tuple with counters of the lazy DFA's state cache.
+
+        Returns None if the matcher isn't a `LazyDFA`.
+        """
+        return self._matcher.info() if self._matcher_type == 'LazyDFA' else None
+
+    tier_thresholds = {'DFA': (16, 4096), 'JIT': (256, 65536)}
+    """Default thresholds of adaptive matchers, see `enable_tiering`."""
+
+    _next_tier = {'NFA': 'DFA', 'DFA': 'JIT'}
+    _tier_compilers = {'DFA': compile_to_DFA, 'JIT': compile_to_x86}
+
+    def enable_tiering(self, thresholds=None):
+        """Make the regex promote its matcher as it gets used.
+
+        An adaptive regex counts `accept` calls and characters consumed by
+        them. Once the count of calls or characters reaches a threshold of the
+        next matcher type, the regex compiles itself to it: from NFA to DFA
+        and from DFA to x86 code. Rarely used regexes don't pay for
+        compilation, while hot ones get the fastest matcher. Counters and
+        compilation times are returned by `tier_info`. All tiers accept the
+        same strings, x86 code matches only ASCII strings and leaves others
+        to its DFA, like searches do.
+
+        A failed compilation is recorded and the regex stays with its current
+        matcher. So does a compilation which exceeded a budget and fell back
+        to another matcher type. Either way, the tier isn't tried again.
+
+        Raises:
+        RegexCompilationError: if the regex has no matcher
+
+        Args:
+        thresholds (dict): maps 'DFA' and 'JIT' to `(calls, chars)`
+            thresholds. Missing entries are taken from `tier_thresholds`,
+            a None threshold disables promotion to the tier.
+        """
+        if self._matcher is None:
+            raise RegexCompilationError("Can't enable tiering for a regex without a matcher")
+        merged = dict(Regex.tier_thresholds)
+        merged.update(thresholds or {})
+        self._tiering = {
+                'thresholds': merged,
+                'calls': 0,
+                'chars': 0,
+                'promotions': [],
+                'lock': threading.Lock(),
+            }
+
+    def tier_info(self):
+        """Return statistics of an adaptive regex as a `TierInfo` named tuple.
+
+        Returns None if tiering isn't enabled.
+        """
+        if self._tiering is None:
+            return None
+        return TierInfo(self._matcher_type, self._tiering['calls'], self._tiering['chars'],
+                list(self._tiering['promotions']))
+
+    def _count_use(self, s):
+        # counters aren't locked, they may miss a few concurrent calls
+        tiering = self._tiering
+        tiering['calls'] += 1
+        tiering['chars'] += len(s)
+        # counters can cross thresholds of more than one tier at once
+        while self._promotion_due():
+            with tiering['lock']:
+                # another thread could have promoted the regex meanwhile
+                if self._promotion_due():
+                    self._promote()
+
+    def _promote(self):
+        tiering = self._tiering
+        tier = Regex._next_tier[self._matcher_type]
+        start = time.perf_counter()
+        error = None
+        fallback = self._fallback
+        try:
+            Regex._tier_compilers[tier](self)
+        except RejitError as e:
+            error = str(e)
+        if self._matcher_type != tier:
+            # a failed or fallen back promotion isn't retried on every call
+            tiering['thresholds'][tier] = None
+        fallback = self._fallback if self._fallback is not fallback else None
+        tiering['promotions'].append(
+                Promotion(tier, tiering['calls'], tiering['chars'], time.perf_counter() - start, error, fallback))
+
+    def _promotion_due(self):
+        tiering = self._tiering
+        threshold = tiering['thresholds'].get(Regex._next_tier.get(self._matcher_type))
+        if threshold is None:
+            return False
+        return tiering['calls'] >= threshold[0] or tiering['chars'] >= threshold[1]
 
     def _getchar(self):
-        if self._input:
-            self._last_char = self._input[0]
-            self._input = self._input[1:]
+        if self._pos < len(self._input):
+            self._last_char = self._input[self._pos]
+            self._pos += 1
         else:
             self._last_char = ''
 
     def _parse(self, pattern):
         self._input = pattern
+        self._pos = 0
         self._last_char = ''
         self._getchar()
         if not self._last_char:
-            return ('empty',)
-        else:
-            ast = self._unionRE()
-            if self._last_char == ')':
-                raise RegexParseError('Unmatched parentheses')
-            return ast
-
-    def _compile(self, ast):
-        if ast[0] == 'concat':
-            return NFA.concat_many(list(map(self._compile, ast[1])))
-        elif ast[0] == 'union':
-            return NFA.union_many(list(map(self._compile, ast[1])))
-        elif ast[0] == 'kleene-star':
-            return NFA.kleene(self._compile(ast[1]))
-        elif ast[0] == 'kleene-plus':
-            return NFA.kleene_plus(self._compile(ast[1]))
-        elif ast[0] == 'zero-or-one':
-            return NFA.zero_or_one(self._compile(ast[1]))
-        elif ast[0] == 'any':
+            return ast.Empty()
+        # the parser keeps an explicit stack of open groups instead of
+        # recursing, so the stack depth doesn't depend on the pattern.
+        # Each open group saves its alternatives and the sequence of elements
+        # of the alternative being parsed.
+        groups = []
+        alternatives = []
+        sequence = []
+        while True:
+            if self._last_char == '(':
+                self._getchar() # '('
+                groups.append((alternatives, sequence))
+                alternatives = []
+                sequence = []
+                continue
+            sequence.append(self._kleeneRE(self._elementaryRE()))
+            while self._last_char == ')':
+                if not groups:
+                    raise RegexParseError('Unmatched parentheses')
+                self._getchar() # ')'
+                alternatives.append(Regex._concat_node(sequence))
+                ast_paren = Regex._union_node(alternatives)
+                alternatives, sequence = groups.pop()
+                sequence.append(self._kleeneRE(ast_paren))
+            if self._last_char == '|':
+                self._getchar() # '|'
+                alternatives.append(Regex._concat_node(sequence))
+                sequence = []
+            elif not self._last_char:
+                if groups:
+                    raise RegexParseError('Expected ")", got {}'.format(self._last_char))
+                alternatives.append(Regex._concat_node(sequence))
+                return Regex._union_node(alternatives)
+
+    @staticmethod
+    def _concat_node(sequence):
+        return sequence[0] if len(sequence) == 1 else ast.Concat(sequence)
+
+    @staticmethod
+    def _union_node(alternatives):
+        return alternatives[0] if len(alternatives) == 1 else ast.Union(alternatives)
+
+    def _compile(self, input_ast):
+        # every occurrence of a shared subtree needs its own NFA fragment
+        return ast.fold(input_ast, Regex._compile_node, shared=False)
+
+    @staticmethod
+    def _compile_node(node, nfas):
+        # `nfas` are NFAs already compiled from the node's children
+        if node.type == 'concat':
+            return NFA.concat_many(nfas)
+        elif node.type == 'union':
+            return NFA.union_many(nfas)
+        elif node.type == 'kleene-star':
+            return NFA.kleene(nfas[0])
+        elif node.type == 'kleene-plus':
+            return NFA.kleene_plus(nfas[0])
+        elif node.type == 'zero-or-one':
+            return NFA.zero_or_one(nfas[0])
+        elif node.type == 'any':
             return NFA.any()
-        elif ast[0] == 'empty':
+        elif node.type == 'empty':
             return NFA.empty()
-        elif ast[0] == 'symbol':
-            return NFA.symbol(ast[1])
-        elif ast[0] == 'set':
-            return NFA.char_set(ast[1],ast[2])
-        raise RegexCompilationError("Unknown AST node: {node}".format(node=ast))
+        elif node.type == 'symbol':
+            return NFA.symbol(node.char)
+        elif node.type == 'set':
+            return NFA.char_set(node.ranges,node.description)
+        raise RegexCompilationError("Unknown AST node: {node}".format(node=node))
 
     def _transform(self, input_ast):
         return functools.reduce(
-            lambda ast, transform: transform(ast),
+            lambda tree, transform: transform(tree),
             [
+                self._expand_repeat,
+                functools.partial(self._flatten_nodes,'concat'),
+                functools.partial(self._flatten_nodes,'union'),
+                self._simplify_quant,
+                self._drop_empty,
+                self._optimize_unions,
+                # optimizations can create nodes which need simplifying again
                 functools.partial(self._flatten_nodes,'concat'),
                 functools.partial(self._flatten_nodes,'union'),
                 self._simplify_quant,
             ],
             input_ast)
 
-    def _flatten_nodes(self, node_type, ast):
-        # for a list of nodes return a list of transformed nodes
-        if isinstance(ast, list):
-            return list(map(functools.partial(self._flatten_nodes,node_type), ast))
-        # for leaf nodes return a copy 
-        if ast[0] in ['any','empty','symbol','set']:
-            return copy.deepcopy(ast)
-        # for nodes with children return node with its children transformed by `_flatten_nodes`
-            # for tuple based node ast[1:] are children
-            # ('type', _flatten(child1), _flatten(child2))
-            # for list based node ast[1] is a list of children
-            # ('type', [ _flatten(child1), _flatten(child2)]
-        if ast[0] != node_type:
-            return tuple([ast[0]] + list(map(functools.partial(self._flatten_nodes,node_type), ast[1:])))
-        # for `concat` node transform children with `flatten_nodes`
-        left = self._flatten_nodes(node_type,ast[1][0])
-        right = self._flatten_nodes(node_type,ast[1][1])
-        # `concat` node list is created from lists extracted from children `concat` nodes, or by simply inserting other nodes
-        node_list = (left[1] if left[0] == node_type else [left]) + (right[1] if right[0] == node_type else [right])
-        return (node_type , node_list)
-
-    def _simplify_quant(self, ast):
+    def _flatten_nodes(self, node_type, input_ast):
+        # `ast.transform` transforms children first, so nested `node_type`
+        # nodes are already flattened and only need to be spliced into
+        # the parent
+        def flatten(node):
+            if node.type != node_type:
+                return node
+            if not any(map(lambda child: child.type == node_type, node.children)):
+                return node
+            node_list = []
+            for child in node.children:
+                if child.type == node_type:
+                    node_list += child.children
+                else:
+                    node_list.append(child)
+            return ast.node_types[node_type](node_list)
+        return ast.transform(input_ast, flatten)
+
+    def _simplify_quant(self, input_ast):
         quant_nodes = {'kleene-star','kleene-plus','zero-or-one'}
-        if isinstance(ast, list):
-            return list(map(self._simplify_quant, ast))
-        if ast[0] in ['any','empty','symbol','set']:
-            return copy.deepcopy(ast)
-        if ast[0] not in quant_nodes:
-            return tuple([ast[0]] + list(map(self._simplify_quant, ast[1:])))
-        child = self._simplify_quant(ast[1])
-        if child[0] in quant_nodes:
-            if child[0] == ast[0] == 'kleene-plus':
-                return ('kleene-plus', child[1])
-            elif child[0] == ast[0] == 'zero-or-one':
-                return ('zero-or-one', child[1])
+        def simplify(node):
+            if node.type not in quant_nodes:
+                return node
+            child = node.child
+            if child.type in quant_nodes:
+                if child.type == node.type == 'kleene-plus':
+                    return ast.KleenePlus(child.child)
+                elif child.type == node.type == 'zero-or-one':
+                    return ast.ZeroOrOne(child.child)
+                else:
+                    return ast.KleeneStar(child.child)
+            return node
+        return ast.transform(input_ast, simplify)
+
+    def _expand_repeat(self, input_ast):
+        # `x{m,n}` becomes `m` copies of `x` followed by nested optional
+        # copies `(x(x(x)?)?)?`, and `x{m,}` becomes `m` copies and `x*`.
+        # Copies share the `x` subtree in the AST. Nesting optional copies,
+        # instead of writing `x?x?x?`, keeps epsilon closures in the NFA small.
+        def expand(node):
+            if node.type != 'repeat':
+                return node
+            items = [node.child] * node.min
+            if node.max is None:
+                items.append(ast.KleeneStar(node.child))
             else:
-                return ('kleene-star', child[1])
-        else:
-            return (ast[0], child)
-
-    def _unionRE(self):
-        ast1 = self._concatRE()
-        if self._last_char == '|':
-            self._getchar() # '|'
-            ast2 = self._unionRE()
-            return ('union',[ast1,ast2])
-        return ast1
-
-    def _concatRE(self):
-        ast1 = self._kleeneRE()
-        if self._last_char and self._last_char not in '|)':
-            ast2 = self._concatRE()
-            return ('concat', [ast1, ast2])
-        return ast1
-
-    def _kleeneRE(self):
-        ast = self._elementaryRE()
+                optional = None
+                for _ in range(node.max - node.min):
+                    optional = ast.ZeroOrOne(node.child if optional is None else ast.Concat([node.child, optional]))
+                if optional:
+                    items.append(optional)
+            return Regex._concat_node(items) if items else ast.Empty()
+        return ast.transform(input_ast, expand)
+
+    def _drop_empty(self, input_ast):
+        # `empty` doesn't change a concatenation, and a quantified `empty`
+        # is `empty`. Unions with `empty` are handled by `_optimize_unions`.
+        def drop(node):
+            if node.type == 'concat':
+                items = [x for x in node.children if x.type != 'empty']
+                if len(items) == len(node.children):
+                    return node
+                return Regex._concat_node(items) if items else ast.Empty()
+            if node.type in {'kleene-star','kleene-plus','zero-or-one'} and node.child.type == 'empty':
+                return node.child
+            return node
+        return ast.transform(input_ast, drop)
+
+    def _optimize_unions(self, input_ast):
+        def optimize(node):
+            if node.type != 'union':
+                return node
+            return Regex._factor_alternatives(node.children)
+        return ast.transform(input_ast, optimize)
+
+    @staticmethod
+    def _factor_alternatives(alternatives):
+        """Return a node equivalent to a union of `alternatives`, with common
+        prefixes and suffixes factored out, e.g. `foo|foz` becomes `fo[oz]`.
+
+        Alternatives are inserted into a trie as sequences of nodes, which
+        merges common prefixes. The trie is then converted back to an AST,
+        and at every branch common suffixes of the branch's alternatives are
+        factored out. Both steps use loops instead of recursion, so long
+        alternatives are fine.
+        """
+        # a trie node is a dict which maps the next node of a sequence to
+        # a child trie node. The `None` key marks the end of an alternative.
+        root = {}
+        for alt in alternatives:
+            trie = root
+            for item in Regex._sequence(alt):
+                trie = trie.setdefault(item, {})
+            trie[None] = None
+
+        def follow(item, trie):
+            # collect a chain of trie nodes without branches
+            items = [item]
+            while len(trie) == 1 and None not in trie:
+                (item, trie), = trie.items()
+                items.append(item)
+            return items, trie
+
+        # `values` maps id of a branching trie node to an AST of the part of
+        # the union after the branch
+        values = {}
+        stack = [(root, False)]
+        while stack:
+            trie, expanded = stack.pop()
+            if not expanded:
+                stack.append((trie, True))
+                stack.extend((follow(item, sub)[1], False) for item, sub in trie.items() if item is not None)
+                continue
+            sequences = []
+            for item, sub in trie.items():
+                if item is None:
+                    sequences.append([])
+                    continue
+                items, branch = follow(item, sub)
+                if branch != {None: None}:
+                    items += Regex._sequence(values[id(branch)])
+                sequences.append(items)
+            values[id(trie)] = Regex._factor_suffix(sequences)
+        return values[id(root)]
+
+    @staticmethod
+    def _factor_suffix(sequences):
+        # find the longest suffix common to all sequences
+        shortest = min(map(len, sequences))
+        suffix_length = 0
+        while suffix_length < shortest and all(map(
+                lambda seq: seq[-1-suffix_length] is sequences[0][-1-suffix_length], sequences)):
+            suffix_length += 1
+        split = lambda seq: seq[:len(seq)-suffix_length]
+        union = Regex._union_of([Regex._concat_node(split(seq)) if split(seq) else ast.Empty() for seq in sequences])
+        items = Regex._sequence(union) + sequences[0][len(sequences[0])-suffix_length:]
+        if not items:
+            return ast.Empty()
+        return Regex._concat_node(items)
+
+    @staticmethod
+    def _union_of(alternatives):
+        # `.*` accepts anything, so it subsumes all other alternatives
+        any_star = ast.KleeneStar(ast.Any())
+        if any_star in alternatives:
+            return any_star
+        # `.` subsumes single characters
+        if ast.Any() in alternatives:
+            alternatives = [x for x in alternatives if x.type not in {'symbol','set'}]
+        # merge single characters into one set
+        chars = [x for x in alternatives if x.type in {'symbol','set'}]
+        if len(chars) > 1:
+            ranges = [r for x in chars for r in (x.ranges if x.type == 'set' else [x.char])]
+            if any(map(lambda x: x.type == 'set' and x.description.startswith('[^'), chars)):
+                # a negative set can't be written together with other chars
+                description = '(' + '|'.join(x.description if x.type == 'set' else x.char for x in chars) + ')'
+            else:
+                description = '[' + ''.join(x.description[1:-1] if x.type == 'set' else x.char for x in chars) + ']'
+            merged = ast.Set(ranges, description)
+            alternatives = [merged if x is chars[0] else x for x in alternatives if x not in chars[1:]]
+        # remove duplicates, keeping the order
+        alternatives = list(dict.fromkeys(alternatives))
+        # `empty` is redundant if other alternatives accept an empty string
+        rest = [x for x in alternatives if x.type != 'empty']
+        if not rest:
+            return ast.Empty()
+        union = Regex._union_node(rest)
+        if len(rest) < len(alternatives) and not any(map(ast.nullable, rest)):
+            return ast.ZeroOrOne(union)
+        return union
+
+    @staticmethod
+    def _sequence(node):
+        # a node as a list of concatenated nodes
+        if node.type == 'concat':
+            return list(node.children)
+        if node.type == 'empty':
+            return []
+        return [node]
+
+    def _kleeneRE(self, node):
         if self._last_char == '*':
             self._getchar() # '*'
-            return ('kleene-star', ast)
+            return ast.KleeneStar(node)
         elif self._last_char == '+':
             self._getchar() # '+'
-            return ('kleene-plus', ast)
+            return ast.KleenePlus(node)
         elif self._last_char == '?':
             self._getchar() # '?'
-            return ('zero-or-one', ast)
+            return ast.ZeroOrOne(node)
+        bounds = self._repeat_bounds()
+        if bounds:
+            return ast.Repeat(node, *bounds)
+        return node
+
+    def _repeat_bounds(self):
+        # Check if `{` at `_last_char` starts a counted repetition `{m}`,
+        # `{m,}` or `{m,n}`. If it does, consume it and return its bounds,
+        # otherwise `{` is an ordinary symbol and nothing is consumed.
+        if self._last_char != '{':
+            return None
+        def number(pos):
+            end = pos
+            while end < len(self._input) and self._input[end] in string.digits:
+                end += 1
+            return (int(self._input[pos:end]) if end > pos else None), end
+        low, pos = number(self._pos)
+        if low is None or pos >= len(self._input):
+            return None
+        if self._input[pos] == '}':
+            high = low
+        elif self._input[pos] == ',':
+            high, pos = number(pos + 1)
+            if pos >= len(self._input) or self._input[pos] != '}':
+                return None
         else:
-            return ast
+            return None
+        self._pos = pos + 1
+        self._getchar()
+        if high is not None and high < low:
+            raise RegexParseError('Invalid counted repetition {{{},{}}}, the minimum is larger than the maximum'.format(low, high))
+        if max(low, high or 0) > Regex.max_repeat:
+            raise RegexParseError('Counted repetition larger than {}'.format(Regex.max_repeat))
+        return low, high
+
+    max_repeat = 1000
+    """The largest bound allowed in a counted repetition."""
 
     def _elementaryRE(self):
-        if self._last_char == '(':
-            self._getchar()
-            ast_paren = self._unionRE()
-            if self._last_char != ')':
-                raise RegexParseError('Expected ")", got {}'.format(self._last_char))
-            self._getchar() # ')'
-            return ast_paren
-        elif self._last_char == '.':
+        # groups are handled by `_parse`
+        if self._last_char == '.':
             self._getchar() # '.'
-            return ('any',)
+            return ast.Any()
         elif self._last_char == '[':
             return self._parse_charset()
         elif self._last_char == '':
@@ -201,20 +849,24 @@ class Regex:
     def _symbolRE(self):
         if self._last_char in special_chars and self._last_char != '\\':
             raise RegexParseError('Unescaped special character "{}" can\'t be used here'.format(self._last_char))
+        if self._repeat_bounds():
+            raise RegexParseError('Counted repetition can\'t be used here')
         if self._last_char == "\\":
             self._getchar() # '\'
         if not self._last_char:
             raise RegexParseError('Unexpected end of the pattern after an escape character "\\"')
-        ast = ('symbol', self._last_char)
+        node = ast.Symbol(self._last_char)
         self._getchar()
-        return ast
+        return node
 
     def _parse_charset(self):
         self._getchar() # '['
-        symbol_list = []
+        ranges = []
         charset_desc = '['
-        if self._last_char == '^':
-            raise RegexParseError('Negative character set not supported')
+        negative = self._last_char == '^'
+        if negative:
+            charset_desc += '^'
+            self._getchar() # '^'
         while self._last_char and self._last_char != ']':
             symbol1 = self._last_char
             self._getchar()
@@ -222,24 +874,19 @@ class Regex:
                 self._getchar() # '-'
                 if self._last_char:
                     charset_desc += symbol1 + '-'
-                    symbol_list += list(Regex.char_range(symbol1,self._last_char))
+                    ranges.append((symbol1,self._last_char))
                     charset_desc += self._last_char
                     self._getchar()
                 else:
                     raise RegexParseError('Expected a symbol after "-" but the end of the pattern reached')
             else:
                 charset_desc += symbol1
-                symbol_list.append(symbol1)
+                ranges.append(symbol1)
         if self._last_char != ']':
             raise RegexParseError('Expected "]" but end of the pattern reached'.format(self._last_char))
         self._getchar() # ']'
         charset_desc += ']'
-        ast = ('set',symbol_list,charset_desc)
-        return ast
-
-    @staticmethod
-    def char_range(c1, c2):
-        """Generates the characters from `c1` to `c2`, inclusive."""
-        for c in range(ord(c1), ord(c2)+1):
-            yield chr(c)
-
+        ranges = charset.normalize(ranges)
+        if negative:
+            ranges = charset.complement(ranges)
+        return ast.Set(ranges,charset_desc)
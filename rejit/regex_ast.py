@@ -0,0 +1,317 @@
+#encoding: utf8
+
+import threading
+import weakref
+
+from rejit.common import RejitError
+import rejit.charset as charset
+
+class ASTError(RejitError): pass
+
+class Node:
+    """Base class of immutable, hash-consed regex AST nodes.
+
+    Nodes are interned: creating a node equal to an existing one returns the
+    existing object. Identical subtrees of an AST, and of all ASTs alive in
+    the process, are therefore shared, and nodes can be compared by identity.
+    The intern table holds nodes weakly, so unused nodes are freed.
+
+    Every node has a `type` string, the same as the name of the node in
+    the grammar, and a tuple of `children`, which is empty for leaf nodes.
+
+    Attributes:
+    type (str): the node's type
+    children (tuple of Node): child nodes
+    """
+
+    __slots__ = ('__weakref__',)
+
+    type = None
+    _field_names = ()
+
+    _interned = weakref.WeakValueDictionary()
+    _intern_lock = threading.Lock()
+
+    def __new__(cls, *args):
+        key = (cls,) + cls._fields_from_args(*args)
+        node = Node._interned.get(key)
+        if node is None:
+            with Node._intern_lock:
+                node = Node._interned.get(key)
+                if node is None:
+                    node = object.__new__(cls)
+                    for name, value in zip(cls._field_names, key[1:]):
+                        object.__setattr__(node, name, value)
+                    Node._interned[key] = node
+        return node
+
+    @classmethod
+    def _fields_from_args(cls):
+        return ()
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self._field_names)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('AST nodes are immutable')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), self._fields())
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(map(repr, self._fields())))
+
+    @property
+    def children(self):
+        return ()
+
+    def with_children(self, children):
+        """Return a node of the same type with `children` replaced.
+
+        The node itself is returned if `children` are the same objects.
+        """
+        return self
+
+    def to_tuple(self):
+        """Return the AST in a tuple form, for printing and tests."""
+        return fold(self, lambda node, children: node._to_tuple(children), shared=False)
+
+class Empty(Node):
+    __slots__ = ()
+    type = 'empty'
+
+    def _to_tuple(self, children):
+        return ('empty',)
+
+class Any(Node):
+    __slots__ = ()
+    type = 'any'
+
+    def _to_tuple(self, children):
+        return ('any',)
+
+class Symbol(Node):
+    __slots__ = ('char',)
+    type = 'symbol'
+    _field_names = ('char',)
+
+    @classmethod
+    def _fields_from_args(cls, char):
+        return (char,)
+
+    def _to_tuple(self, children):
+        return ('symbol', self.char)
+
+class Set(Node):
+    """Character set node.
+
+    Characters are kept as a normalized set of intervals, see
+    `rejit.charset`.
+
+    Attributes:
+    ranges (tuple of (str, str)): sorted, disjoint intervals of characters
+    description (str): the set as written in the pattern, e.g. '[a-z]'
+    """
+    __slots__ = ('ranges', 'description')
+    type = 'set'
+    _field_names = ('ranges', 'description')
+
+    @classmethod
+    def _fields_from_args(cls, ranges, description):
+        return (charset.normalize(ranges), description)
+
+    def _to_tuple(self, children):
+        return ('set', list(self.ranges), self.description)
+
+class _Quantifier(Node):
+    __slots__ = ('child',)
+    _field_names = ('child',)
+
+    @classmethod
+    def _fields_from_args(cls, child):
+        return (child,)
+
+    @property
+    def children(self):
+        return (self.child,)
+
+    def with_children(self, children):
+        child, = children
+        return self if child is self.child else type(self)(child)
+
+    def _to_tuple(self, children):
+        return (self.type, children[0])
+
+class KleeneStar(_Quantifier):
+    __slots__ = ()
+    type = 'kleene-star'
+
+class KleenePlus(_Quantifier):
+    __slots__ = ()
+    type = 'kleene-plus'
+
+class ZeroOrOne(_Quantifier):
+    __slots__ = ()
+    type = 'zero-or-one'
+
+class Repeat(Node):
+    """Counted repetition node `child{min,max}`.
+
+    Attributes:
+    child (Node): the repeated node
+    min (int): the minimal number of repetitions
+    max (int or None): the maximal number of repetitions, None if unbounded
+    """
+    __slots__ = ('child', 'min', 'max')
+    type = 'repeat'
+    _field_names = ('child', 'min', 'max')
+
+    @classmethod
+    def _fields_from_args(cls, child, min, max):
+        return (child, min, max)
+
+    @property
+    def children(self):
+        return (self.child,)
+
+    def with_children(self, children):
+        child, = children
+        return self if child is self.child else Repeat(child, self.min, self.max)
+
+    def _to_tuple(self, children):
+        return ('repeat', children[0], self.min, self.max)
+
+class _Sequence(Node):
+    __slots__ = ('items',)
+    _field_names = ('items',)
+
+    @classmethod
+    def _fields_from_args(cls, items):
+        return (tuple(items),)
+
+    @property
+    def children(self):
+        return self.items
+
+    def with_children(self, children):
+        children = tuple(children)
+        if len(children) == len(self.items) and all(map(lambda x: x[0] is x[1], zip(children, self.items))):
+            return self
+        return type(self)(children)
+
+    def _to_tuple(self, children):
+        return (self.type, list(children))
+
+class Concat(_Sequence):
+    __slots__ = ()
+    type = 'concat'
+
+class Union(_Sequence):
+    __slots__ = ()
+    type = 'union'
+
+node_types = {cls.type: cls for cls in [Empty, Any, Symbol, Set, KleeneStar, KleenePlus, ZeroOrOne, Repeat, Concat, Union]}
+
+def fold(ast, node_fn, shared=True):
+    """Compute a value for an AST bottom-up.
+
+    `node_fn` is called with a node and a list of values already computed
+    for its children. The value for the root node is returned. The tree is
+    walked with an explicit stack, so deep trees don't hit the recursion
+    limit.
+
+    Args:
+    ast (Node): the AST
+    node_fn (callable): a function `node_fn(node, children_values)`
+    shared (bool): if True, a subtree shared by many parents is processed
+        once and its value is reused. Use False when every occurrence needs
+        its own value, e.g. an NFA fragment.
+
+    Returns:
+    The value computed for the root node.
+    """
+    done = {}
+    values = []
+    stack = [(ast, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if shared and id(node) in done:
+            values.append(done[id(node)])
+            continue
+        children = node.children
+        if not expanded and children:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(children))
+            continue
+        # values of the children are on top of `values`
+        start = len(values) - len(children)
+        value = node_fn(node, values[start:])
+        del values[start:]
+        if shared:
+            done[id(node)] = value
+        values.append(value)
+    return values[0]
+
+def transform(ast, node_fn):
+    """Rebuild an AST bottom-up, applying `node_fn` to every node.
+
+    `node_fn` is called with a node which children were already transformed
+    and its result replaces the node. A node which children didn't change is
+    passed to `node_fn` as it is, so unchanged subtrees aren't copied.
+
+    Args:
+    ast (Node): the AST to rebuild
+    node_fn (callable): a function mapping a node to its replacement
+
+    Returns:
+    The transformed AST.
+    """
+    return fold(ast, lambda node, children: node_fn(node.with_children(children)))
+
+def nullable(ast):
+    """Check if an AST accepts an empty string."""
+    def node_nullable(node, children):
+        if node.type in {'empty', 'kleene-star', 'zero-or-one'}:
+            return True
+        if node.type == 'concat':
+            return all(children)
+        if node.type in {'union', 'kleene-plus'}:
+            return any(children)
+        if node.type == 'repeat':
+            return node.min == 0 or children[0]
+        return False
+    return fold(ast, node_nullable)
+
+def reverse(ast):
+    """Return an AST accepting reversed strings accepted by `ast`."""
+    def reverse_node(node):
+        if node.type == 'concat':
+            return Concat(reversed(node.children))
+        return node
+    return transform(ast, reverse_node)
+
+def from_tuple(ast):
+    """Create an AST from its tuple form, e.g. ('concat', [('symbol','a')]).
+
+    Character sets are written as lists of `(first, last)` intervals or single
+    characters, e.g. ('set', [('a','z'), '_'], '[a-z_]').
+
+    Raises:
+    ASTError: if a node type is unknown
+    """
+    if not isinstance(ast, tuple) or not ast or ast[0] not in node_types:
+        raise ASTError('Unknown AST node: {}'.format(ast))
+    cls = node_types[ast[0]]
+    if issubclass(cls, _Sequence):
+        return cls([from_tuple(x) for x in ast[1]])
+    if issubclass(cls, _Quantifier):
+        return cls(from_tuple(ast[1]))
+    if cls is Repeat:
+        return cls(from_tuple(ast[1]), *ast[2:])
+    return cls(*ast[1:])
@@ -0,0 +1,104 @@
+#encoding: utf8
+
+from rejit.regex import Regex
+from rejit.regex import RegexCompilationError
+from rejit.nfa import NFA
+from rejit.compactnfa import CompactNFA
+from rejit.pikevm import PikeVM
+from rejit.dfa import DFA
+from rejit.jitmatcher import JITMatcher
+
+class RegexSet:
+    """A set of regular expressions matched in a single pass.
+
+    All patterns are compiled to one automaton, a union of their NFAs, so
+    a string is scanned once no matter how many patterns there are. `matches`
+    returns ids of all patterns which accept the string, where an id is the
+    pattern's index in `patterns`.
+
+    Like `Regex`, a `RegexSet` starts with a NFA-based matcher, which can be
+    compiled to a DFA with `compile_to_DFA` and to x86 code with
+    `compile_to_x86`. Each accepting DFA state is tagged with the ids of
+    patterns which accept in it. The compiled code returns a number of
+    the tag set of the state it finished in.
+
+    Attributes:
+    patterns (list of str): the regular expressions
+    _matcher: the CompactNFA, DFA or JITMatcher of the union of all patterns
+    _matcher_type (str): 'NFA', 'DFA' or 'JIT'
+    _end_ids (dict): maps the number of each pattern's NFA end state to
+        the pattern's id
+    _vm (PikeVM): simulator of the NFA tagging pattern end states with ids
+    _tag_sets (list of tuple): ids returned for JIT results, indexed by
+        the value returned by the compiled code
+    """
+
+    def __init__(self, patterns):
+        """Compile patterns to a NFA-based matcher.
+
+        Raises:
+        RegexParseError: if any pattern is invalid
+
+        Args:
+        patterns (iterable of str): the regular expressions
+        """
+        self.patterns = list(patterns)
+        nfas = [RegexSet._graph_nfa(pattern) for pattern in self.patterns]
+        # union invalidates the combined NFAs, so their end states are saved
+        ends = [nfa._end for nfa in nfas]
+        union = NFA.union_many(nfas)
+        numbers = CompactNFA.state_numbers(union)
+        self._end_ids = {numbers[end]: num for num, end in enumerate(ends) if end in numbers}
+        self._matcher = CompactNFA(union, numbers)
+        self._vm = PikeVM(self._matcher, accept_tags=self._end_ids)
+        self._matcher_type = 'NFA'
+        self._tag_sets = None
+
+    @staticmethod
+    def _graph_nfa(pattern):
+        # `Regex` keeps only a compact NFA, which can't be combined
+        re = Regex()
+        return re._compile(re._transform(re._parse(pattern)))
+
+    def __len__(self):
+        return len(self.patterns)
+
+    @property
+    def description(self):
+        return self._matcher.description
+
+    def matches(self, s):
+        """Return a sorted list of ids of patterns which accept `s`."""
+        if self._matcher_type == 'NFA':
+            return sorted(self._vm.accepted_tags(s))
+        elif self._matcher_type == 'DFA':
+            return sorted(self._matcher.accepted_tags(s))
+        return list(self._tag_sets[self._matcher._call(s)])
+
+    def accept(self, s):
+        """Check if any pattern accepts `s`."""
+        if self._matcher_type == 'NFA':
+            return self._vm.accept(s)
+        return self._matcher.accept(s)
+
+    def compile_to_DFA(self):
+        if self._matcher_type == 'DFA':
+            return
+        if self._matcher_type != 'NFA':
+            raise RegexCompilationError(
+                    "Can only compile NFA-type matcher to a DFA. Current matcher type: {}".format(self._matcher_type))
+        self._matcher = DFA(self._matcher, accept_tags=self._end_ids)
+        self._matcher_type = 'DFA'
+        self._vm = None
+
+    def compile_to_x86(self):
+        if self._matcher_type == 'JIT':
+            return
+        self.compile_to_DFA()
+        dfa = self._matcher
+        # compiled code returns 0 for no match, so tag sets are numbered from 1
+        self._tag_sets = [()] + sorted(set(tuple(sorted(dfa._state_tags[st])) for st in dfa._end_states))
+        numbers = {tags: num for num, tags in enumerate(self._tag_sets)}
+        accept_values = {st: numbers[tuple(sorted(dfa._state_tags[st]))] for st in dfa._end_states}
+        self._matcher = JITMatcher(dfa, accept_values=accept_values)
+        self._matcher_type = 'JIT'
@@ -0,0 +1,211 @@
+#encoding: utf8
+
+from rejit.dfa import DFA
+from rejit.dfa import _LazyNames
+from rejit.compactnfa import compact
+from rejit.common import BudgetExceededError
+from rejit.jitmatcher import JITMatcher
+
+def leftmost_longest_DFA(nfa, max_states=None, max_transitions=None):
+    """Build a DFA which finds the end of the leftmost-longest match of `nfa`.
+
+    The DFA runs `nfa` unanchored, as if it was preceded by `.*`: a new
+    thread of the NFA starts at every position of the input. Threads which
+    started at the same position form a group, and groups are kept in
+    the order of their start positions. A NFA state reached by two groups
+    is kept only in the earlier one, as matches starting earlier are
+    preferred. When a group accepts, groups which started later are dropped
+    and no new threads are started, but the accepting group can still find
+    a longer match and earlier groups a match which starts more to the left.
+
+    A prefix of the input is accepted if it ends with the best match found
+    so far, so `DFA.longest_prefix` returns the end of the leftmost-longest
+    match, reading the input only until it can't change anymore.
+
+    Args:
+    nfa (NFA or CompactNFA): a valid NFA
+    max_states (int): see `DFA`
+    max_transitions (int): see `DFA`
+
+    Returns:
+    A `DFA` with the description of `nfa`.
+
+    Raises:
+    BudgetExceededError: if a budget is exceeded
+    """
+    nfa, _ = compact(nfa)
+    closure, bounds, class_edges = DFA._subset_alphabet(nfa, {})
+    nclasses = len(bounds)
+    ends = sum(1 << num for num in nfa._ends)
+    restart = closure(nfa._start)
+
+    def settle(groups, restarting):
+        # key of the state with `groups` in order, which still starts new
+        # threads if `restarting`
+        seen = 0
+        kept = []
+        for group in groups:
+            group &= ~seen
+            if group:
+                seen |= group
+                kept.append(group)
+                if group & ends:
+                    return (tuple(kept), False)
+        return (tuple(kept), restarting)
+
+    # subset construction of states (tuple of group bitsets, restarting)
+    dead_key = ((), False)
+    start = settle([restart], True)
+    numbers = {start: 0}
+    keys = [start]
+    members = {}
+    table = []
+    transitions = 0
+    while len(table) < len(keys):
+        groups, restarting = keys[len(table)]
+        group_edges = []
+        for group in groups:
+            if group not in members:
+                members[group] = DFA._bits(group)
+            group_edges.append([edge for num in members[group] for edge in class_edges[num]])
+        # classes where the set of matching edges of any group changes
+        cuts = sorted({0, nclasses} | {cls for edges in group_edges for first, end, _ in edges for cls in (first, end)})
+        row = []
+        for first, end in zip(cuts, cuts[1:]):
+            stepped = []
+            for edges in group_edges:
+                mask = 0
+                for edge_first, edge_end, target in edges:
+                    if edge_first <= first and end <= edge_end:
+                        mask |= target
+                stepped.append(mask)
+            if restarting:
+                stepped.append(restart)
+            key = settle(stepped, restarting)
+            if key == dead_key:
+                number = None
+            else:
+                number = numbers.get(key)
+                if number is None:
+                    number = numbers[key] = len(keys)
+                    keys.append(key)
+                transitions += end - first
+            row += [number] * (end - first)
+        table.append(row)
+        if max_states is not None and len(keys) > max_states:
+            raise BudgetExceededError('dfa_states', max_states)
+        if max_transitions is not None and transitions > max_transitions:
+            raise BudgetExceededError('dfa_transitions', max_transitions)
+
+    dead = len(keys)
+    # groups are separated with '|', a trailing ';' marks restarting states,
+    # names are made on demand
+    names = _LazyNames(keys, lambda key: '|'.join(','.join(map(str, members[group])) for group in key[0])
+            + (';' if key[1] else ''))
+    flat = [dead if target is None else target for row in table for target in row]
+    flat += [dead] * nclasses
+    accepting = bytearray(bool(groups and groups[-1] & ends) for groups, _ in keys)
+    dfa = DFA.__new__(DFA)
+    dfa._description = nfa.description
+    dfa._set_table(names, None, {}, bounds, list(range(nclasses)), nclasses, flat, accepting)
+    return dfa
+
+class Searcher:
+    """Finds leftmost-longest matches of a regex in strings.
+
+    The end of a match is found in one pass with a `leftmost_longest_DFA`
+    of the regex, and its start with a DFA of the reversed regex, which
+    reads the match backwards from its end, so no part of the input is
+    tried more than once for every match. Like in POSIX, of the matches
+    which start leftmost, the longest one is found.
+
+    With `jit`, both DFAs are compiled to x86 code, which scans ASCII
+    strings. Other strings are scanned with the DFAs. The bytes of the last
+    string searched are kept, so calls of `search` on the same string with
+    increasing `pos` don't check and encode it again.
+
+    With a `Prefilter`, the DFAs only run from positions where a match can
+    start according to the next occurrence of a required literal.
+
+    Attributes:
+    _forward (DFA): DFA finding ends of matches
+    _backward (DFA): DFA of the reversed regex
+    _jit (tuple): JIT compiled `_forward` and `_backward`, or None
+    _prefilter (Prefilter): prefilter of the regex, or None
+    _last (tuple): the last string passed to `search` and its scanners, or None
+    """
+
+    def __init__(self, nfa, reversed_nfa, jit=False, budgets=None, prefilter=None):
+        """Build DFAs, and optionally x86 code, of `nfa` and `reversed_nfa`.
+
+        Args:
+        nfa (NFA or CompactNFA): a valid NFA of the regex
+        reversed_nfa (NFA or CompactNFA): a valid NFA accepting reversed
+            strings accepted by `nfa`
+        jit (bool): compile the DFAs to x86 code
+        budgets (dict): optional limits of every DFA and code, with keys
+            like `Regex.default_budgets`
+        prefilter (Prefilter): optional prefilter of the regex
+
+        Raises:
+        BudgetExceededError: if a budget is exceeded
+        """
+        budgets = budgets or {}
+        dfa_budgets = {'max_states': budgets.get('dfa_states'), 'max_transitions': budgets.get('dfa_transitions')}
+        self._forward = leftmost_longest_DFA(nfa, **dfa_budgets)
+        self._backward = DFA(reversed_nfa, **dfa_budgets)
+        self._prefilter = prefilter
+        self._last = None
+        self._jit = None
+        if jit:
+            self._jit = tuple(JITMatcher(dfa, longest_prefix=True,
+                max_ir_instructions=budgets.get('ir_instructions'), max_code_bytes=budgets.get('code_bytes'))
+                for dfa in (self._forward, self._backward))
+
+    def search(self, s, pos=0):
+        """Return `(start, end)` of the leftmost-longest match in `s[pos:]`, or None."""
+        if self._prefilter is not None:
+            pos = self._prefilter.skip(s, pos)
+            if pos < 0:
+                return None
+        last = self._last
+        if last is None or last[0] is not s:
+            last = self._last = (s,) + self._scanners(s)
+        _, text, forward, backward = last
+        end = forward.longest_prefix(text, pos)
+        if end < 0:
+            return None
+        end += pos
+        return end - backward.longest_prefix(text[pos:end][::-1]), end
+
+    def finditer(self, s):
+        """Yield `(start, end)` of non-overlapping leftmost-longest matches in `s`.
+
+        Matches are searched from left to right, every one after the end
+        of the previous one. An empty match is never followed by another
+        match at the same position.
+        """
+        text, forward, backward = self._scanners(s)
+        # matches are read backwards from the reversed text, without copying
+        reversed_text = text[::-1]
+        pos = 0
+        while pos <= len(text):
+            if self._prefilter is not None:
+                # `text` has the same positions as `s`
+                pos = self._prefilter.skip(s, pos)
+                if pos < 0:
+                    return
+            end = forward.longest_prefix(text, pos)
+            if end < 0:
+                return
+            end += pos
+            start = end - backward.longest_prefix(reversed_text, len(text) - end, len(text) - pos)
+            yield start, end
+            pos = end if end > start else end + 1
+
+    def _scanners(self, s):
+        # the text to scan and scanners of matches' ends and starts, x86 code
+        # scans bytes of strings which have one byte per character
+        if self._jit is not None and s.isascii():
+            return (s.encode('ascii'),) + self._jit
+        return s, self._forward, self._backward
@@ -29,7 +29,8 @@ class VMMatcher:
             ))
         var = dict()
         var.update(input_vars)
-        eq_reg = False
+        # operands of the last comparison
+        cmp_reg = (None, None)
         ret_val = None
         ip = 0
         icounter = 0
@@ -51,16 +52,22 @@ class VMMatcher:
                 index = var[inst[3]]
                 var[to] = var[from_][index]
             elif inst[0] == 'cmp name':
-                eq_reg = var[inst[1]] == var[inst[2]]
+                cmp_reg = (var[inst[1]], var[inst[2]])
             elif inst[0] == 'cmp value':
-                eq_reg = var[inst[1]] == inst[2]
+                cmp_reg = (var[inst[1]], inst[2])
             elif inst[0] == 'jump':
                 ip = label2ip[inst[1]]
             elif inst[0] == 'jump eq':
-                if eq_reg:
+                if cmp_reg[0] == cmp_reg[1]:
                     ip = label2ip[inst[1]]
             elif inst[0] == 'jump ne':
-                if not eq_reg:
+                if cmp_reg[0] != cmp_reg[1]:
+                    ip = label2ip[inst[1]]
+            elif inst[0] == 'jump lt':
+                if cmp_reg[0] < cmp_reg[1]:
+                    ip = label2ip[inst[1]]
+            elif inst[0] == 'jump le':
+                if cmp_reg[0] <= cmp_reg[1]:
                     ip = label2ip[inst[1]]
             elif inst[0] == 'ret':
                 ret_val = inst[1]
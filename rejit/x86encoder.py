@@ -280,6 +280,12 @@ class Encoder:
     def enc_jne_near(self, rel32):
         return self.encode_instruction([Opcode.JNE_REL_A, Opcode.JNE_REL_B], imm=rel32, size=4)
 
+    def enc_jb_near(self, rel32):
+        return self.encode_instruction([Opcode.JB_REL_A, Opcode.JB_REL_B], imm=rel32, size=4)
+
+    def enc_jbe_near(self, rel32):
+        return self.encode_instruction([Opcode.JBE_REL_A, Opcode.JBE_REL_B], imm=rel32, size=4)
+
     def enc_cmp(self, operand1, operand2, size):
         type1 = type(operand1)
         type2 = type(operand2)
@@ -662,6 +668,10 @@ class Opcode(IntEnum):
     JE_REL_B = 0x84
     JNE_REL_A = 0x0F
     JNE_REL_B = 0x85
+    JB_REL_A = 0x0F
+    JB_REL_B = 0x82
+    JBE_REL_A = 0x0F
+    JBE_REL_B = 0x86
 
 def int8bin(int8):
     return struct.pack('@b', int8)
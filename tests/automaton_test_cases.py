@@ -147,6 +147,44 @@ char_set_cases_2 = [
             ('a',False),
         ]
 
+char_set_nfa_3 = NFA.char_set([('a', 'z'), 'A', ('0', '9'), ('x', '~')], '[a-zA0-9x-~]')
+char_set_cases_3 = [
+            ('a',True),
+            ('m',True),
+            ('z',True),
+            ('~',True),
+            ('{',True),
+            ('5',True),
+            ('A',True),
+            ('B',False),
+            ('/',False),
+            ('',False),
+            ('aa',False),
+        ]
+
+# overlapping ranges: '[a-k]1|[f-z]2|[b-d]3|.4'
+char_set_nfa_4 = NFA.union_many([
+        NFA.concat(NFA.char_set([('a', 'k')], '[a-k]'), NFA.symbol('1')),
+        NFA.concat(NFA.char_set([('f', 'z')], '[f-z]'), NFA.symbol('2')),
+        NFA.concat(NFA.char_set([('b', 'd')], '[b-d]'), NFA.symbol('3')),
+        NFA.concat(NFA.any(), NFA.symbol('4')),
+    ])
+char_set_cases_4 = [
+            ('a1',True),
+            ('g1',True),
+            ('g2',True),
+            ('z2',True),
+            ('c1',True),
+            ('c3',True),
+            ('c4',True),
+            ('#4',True),
+            ('a2',False),
+            ('z1',False),
+            ('g3',False),
+            ('#1',False),
+            ('',False),
+        ]
+
 zero_or_one_nfa = NFA.zero_or_one(NFA.symbol('a'))
 zero_or_one_cases = [
             ('',True),
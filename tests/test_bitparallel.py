@@ -0,0 +1,57 @@
+#encoding: utf8
+
+import pytest
+
+import rejit.glushkov as glushkov
+from rejit.bitparallel import BitParallelMatcher
+from rejit.bitparallel import BitParallelError
+from rejit.regex import Regex
+from rejit.regex import RegexCompilationError
+from rejit.nfa import NFA
+from rejit.compactnfa import CompactNFA
+from tests.helper import accept_test_helper
+
+from tests.test_glushkov import patterns
+from tests.test_glushkov import strings
+
+class TestBitParallel:
+    def test_same_language(self):
+        for pattern in patterns:
+            nfa = Regex(pattern)
+            matcher = BitParallelMatcher(glushkov.build(nfa._final_ast))
+            assert matcher.description == nfa.description
+            for s in strings():
+                assert matcher.accept(s) == nfa.accept(s), (pattern, s)
+
+    def test_regex_matcher_type(self):
+        re = Regex('(a|b)*a(a|b){20}')
+        re.compile_to_bitparallel()
+        assert re._matcher_type == 'BitParallel'
+        cases = [('a' * 21, True), ('b' * 5 + 'a' + 'b' * 20, True), ('a' + 'b' * 21, False), ('a' * 20, False)]
+        accept_test_helper(re, cases)
+        # compiling again is a no-op, other matchers can't be compiled
+        re.compile_to_bitparallel()
+        with pytest.raises(RegexCompilationError):
+            re.compile_to_DFA()
+        dfa = Regex('ab')
+        dfa.compile_to_DFA()
+        with pytest.raises(RegexCompilationError):
+            dfa.compile_to_bitparallel()
+
+    def test_many_states(self):
+        # follow masks span many bytes of the state vector
+        re = Regex('(x|y)*' + 'x[a-z]' * 100 + '.')
+        re.compile_to_bitparallel()
+        accept_test_helper(re, [('xa' * 100 + '!', True), ('yxa' + 'xa' * 99 + 'Ā', True), ('xa' * 100, False)])
+
+    def test_non_ascii(self):
+        re = Regex('[Ā-￿]+[^Ā-￿]')
+        re.compile_to_bitparallel()
+        accept_test_helper(re, [('Ā￿a', True), ('ሴ\U00010000', True), ('a', False), ('ሴ', False)])
+
+    def test_unsupported_nfa(self):
+        with pytest.raises(BitParallelError):
+            BitParallelMatcher(CompactNFA(NFA.kleene(NFA.symbol('a'))))
+        limit = BitParallelMatcher.max_states
+        with pytest.raises(BitParallelError):
+            BitParallelMatcher(glushkov.build(Regex('a' * limit)._final_ast))
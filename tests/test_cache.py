@@ -0,0 +1,89 @@
+#encoding: utf8
+
+import pytest
+
+import rejit
+import rejit.regex
+from rejit.cache import RegexCache
+from rejit.regex import Regex
+
+from tests.helper import accept_test_helper
+
+cases = [
+            ('a', True),
+            ('bbb', True),
+            ('', True),
+            ('ab', False),
+            ('x', False),
+        ]
+
+class TestRegexCache:
+    def test_hit_and_miss(self):
+        cache = RegexCache(4)
+        re1 = cache.get('a|b*')
+        re2 = cache.get('a|b*')
+        assert re1 is re2
+        assert cache.info() == (1, 1, 0, 4, 1)
+        accept_test_helper(re1, cases)
+
+    def test_engines(self):
+        cache = RegexCache(5)
+        for engine, matcher_type in [('nfa','NFA'), ('dfa','DFA'), ('jit','JIT'), ('bitparallel','BitParallel'),
+                ('lazydfa','LazyDFA')]:
+            re = cache.get('a|b*', engine)
+            assert re._matcher_type == matcher_type
+            accept_test_helper(re, cases)
+        # every engine is cached under its own key
+        assert cache.info().currsize == 5
+        assert cache.info().misses == 5
+        with pytest.raises(rejit.regex.RegexCompilationError):
+            cache.get('a', 'xyz')
+
+    def test_adaptive_engine(self):
+        cache = RegexCache(4)
+        re = cache.get('a|b*', 'adaptive')
+        assert re._matcher_type == 'NFA'
+        assert cache.get('a|b*', 'adaptive') is re
+        for _ in range(Regex.tier_thresholds['JIT'][0]):
+            accept_test_helper(re, cases[:1])
+        assert re.tier_info().tier == 'JIT'
+        accept_test_helper(re, cases)
+
+    def test_lru_eviction(self):
+        cache = RegexCache(2)
+        re_a = cache.get('a')
+        cache.get('b')
+        # `a` becomes the most recently used one, so `b` is evicted
+        assert cache.get('a') is re_a
+        cache.get('c')
+        assert cache.info() == (1, 3, 1, 2, 2)
+        assert cache.get('a') is re_a
+        cache.get('b')
+        assert cache.info() == (2, 4, 2, 2, 2)
+
+    def test_zero_size(self):
+        cache = RegexCache(0)
+        assert cache.get('a') is not cache.get('a')
+        assert cache.info() == (0, 2, 0, 0, 0)
+
+    def test_parse_error_not_cached(self):
+        cache = RegexCache(2)
+        with pytest.raises(rejit.regex.RegexParseError):
+            cache.get('a|')
+        assert cache.info().currsize == 0
+
+    def test_purge(self):
+        cache = RegexCache(2)
+        cache.get('a')
+        cache.get('a')
+        cache.purge()
+        assert cache.info() == (0, 0, 0, 2, 0)
+
+def test_module_compile():
+    rejit.purge()
+    re = rejit.compile('a|b*', engine='dfa')
+    assert rejit.compile('a|b*', engine='dfa') is re
+    accept_test_helper(re, cases)
+    assert rejit.cache_info().hits == 1
+    rejit.purge()
+    assert rejit.cache_info().currsize == 0
@@ -0,0 +1,55 @@
+#encoding: utf8
+
+import gc
+
+from rejit.nfa import NFA
+from rejit.compactnfa import CompactNFA
+from rejit.compactnfa import compact
+from rejit.dfa import DFA
+from rejit.regex import Regex
+from tests.helper import accept_test_helper
+
+from tests.test_pikevm import all_cases
+
+class TestCompactNFA:
+    def test_accept(self):
+        for nfa, cases in all_cases:
+            accept_test_helper(CompactNFA(nfa), cases)
+
+    def test_dfa_from_compact(self):
+        for nfa, cases in all_cases:
+            accept_test_helper(DFA(CompactNFA(nfa)), cases)
+
+    def test_numbering(self):
+        nfa = NFA.concat(NFA.char_set([('a', 'z')], '[a-z]'), NFA.any())
+        numbers = CompactNFA.state_numbers(nfa)
+        cnfa = CompactNFA(nfa, numbers)
+        assert cnfa.num_states == len(NFA._get_all_reachable_states(nfa._start))
+        assert numbers[nfa._start] == cnfa._start == 0
+        assert cnfa._ends == {numbers[nfa._end]}
+        assert cnfa.description == nfa.description
+        edges = [edge for st in range(cnfa.num_states) for edge in cnfa._edges(st)]
+        assert sorted(map(str, (label for label, _ in edges))) == ["('a', 'z')", 'any']
+
+    def test_constant_object_count(self):
+        # the number of objects for the garbage collector to traverse doesn't
+        # depend on the NFA's size
+        def tracked(cnfa):
+            return [obj for obj in vars(cnfa).values() if gc.is_tracked(obj)]
+        small = Regex('ab')._matcher
+        large = Regex('(ab|cd)*[x-z]{3,}' * 50)._matcher
+        assert isinstance(large, CompactNFA)
+        assert large.num_states > 100 * small.num_states
+        assert len(tracked(large)) == len(tracked(small))
+        tables = [large._offsets, large._firsts, large._lasts, large._targets, large._eps_offsets, large._eps_targets]
+        for table in tables:
+            assert gc.get_referents(table) == [type(table)]
+        assert large.nbytes() == sum(len(t) * t.itemsize for t in tables)
+
+    def test_compact_tags(self):
+        nfas = [NFA.symbol('a'), NFA.symbol('b')]
+        tags = {nfa._end: num for num, nfa in enumerate(nfas)}
+        cnfa, numbered = compact(NFA.union_many(nfas), tags)
+        assert sorted(numbered.values()) == [0, 1]
+        assert all(0 <= st < cnfa.num_states for st in numbered)
+        assert compact(cnfa, numbered) == (cnfa, numbered)
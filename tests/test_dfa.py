@@ -1,11 +1,18 @@
 #encoding: utf8
 
+import random
+
 import pytest
 
 import rejit.nfa
+import rejit.dfa
 from rejit.nfa import NFA
 from rejit.dfa import DFA
+from rejit.dfa import DFAError
+from rejit.regex import Regex
+from rejit.jitmatcher import JITMatcher
 from tests.helper import accept_test_helper
+from tests.test_pikevm import all_cases
 
 import tests.automaton_test_cases as auto_cases
 
@@ -49,6 +56,8 @@ class TestDFAaccept:
     def test_char_set_DFA(self):
         accept_test_helper(DFA(auto_cases.char_set_nfa_1),auto_cases.char_set_cases_1)
         accept_test_helper(DFA(auto_cases.char_set_nfa_2),auto_cases.char_set_cases_2)
+        accept_test_helper(DFA(auto_cases.char_set_nfa_3),auto_cases.char_set_cases_3)
+        accept_test_helper(DFA(auto_cases.char_set_nfa_4),auto_cases.char_set_cases_4)
 
     def test_zero_or_one_DFA(self):
         accept_test_helper(DFA(auto_cases.zero_or_one_nfa),auto_cases.zero_or_one_cases)
@@ -57,6 +66,15 @@ class TestDFAaccept:
         accept_test_helper(DFA(auto_cases.complex_nfa_1),auto_cases.complex_cases_1)
         accept_test_helper(DFA(auto_cases.complex_nfa_2),auto_cases.complex_cases_2)
 
+    def test_large_state_sets(self):
+        # DFA states of `.*` patterns are large sets of NFA states
+        re = Regex('(.*ab)' * 20 + '(a|b)*a' + '(a|b)?' * 20)
+        dfa = DFA(re._matcher)
+        cases = [('ab' * 20 + 'a', True), ('xab' * 20 + 'b' * 21 + 'a' + 'b' * 20, True),
+                ('ab' * 19 + 'a', False), ('ab' * 20 + 'a' + 'b' * 21, False)]
+        accept_test_helper(dfa, cases)
+        accept_test_helper(re, cases)
+
 class TestDFAvalidation:
     def test_validation(self):
         nfa = NFA.symbol('a')
@@ -71,3 +89,290 @@ class TestDFAvalidation:
         assert dfa.accept('aaa') == True
         assert dfa.accept('aab') == False
 
+
+class TestDFAminimize:
+    def test_minimize_cases(self):
+        for nfa, cases in all_cases:
+            dfa = DFA(nfa)
+            minimal = dfa.minimize()
+            assert minimal.num_states <= dfa.num_states
+            accept_test_helper(minimal, cases)
+            # minimizing again doesn't change the size
+            assert minimal.minimize().num_states == minimal.num_states
+
+    def test_merge_equivalent(self):
+        cases = [('', True), ('ab', True), ('abab', True), ('a', False), ('aba', False), ('b', False)]
+        dfa = DFA(Regex('(ab|ab)*(ab)*')._matcher)
+        minimal = dfa.minimize()
+        assert minimal.num_states == 2
+        assert minimal._start == dfa._start
+        assert set(minimal._names) <= set(dfa._names)
+        accept_test_helper(minimal, cases)
+
+    def test_any_edge(self):
+        # edges to rejecting states must stay when they override `any`
+        cases = [('xa', True), ('xb', False), ('xc', True), ('ab', False), ('yyyc', True), ('yyb', False)]
+        dfa = DFA(Regex('.*[^b]')._matcher)
+        minimal = dfa.minimize()
+        assert minimal.num_states == 2
+        accept_test_helper(minimal, cases)
+        dfa = DFA(Regex('[^a]*a|b.')._matcher)
+        minimal = dfa.minimize()
+        accept_test_helper(minimal, [('a', True), ('ba', True), ('bb', True), ('bab', False), ('bca', True), ('b', False)])
+
+    def test_tags_and_labels(self):
+        nfas = [NFA.kleene(NFA.symbol('a')), NFA.kleene(NFA.symbol('a')), NFA.concat(NFA.symbol('a'), NFA.symbol('a'))]
+        tags = {nfa._end: num for num, nfa in enumerate(nfas)}
+        dfa = DFA(NFA.union_many(nfas), accept_tags=tags)
+        minimal = dfa.minimize()
+        for s in ['', 'a', 'aa', 'aaa', 'b']:
+            assert minimal.accepted_tags(s) == dfa.accepted_tags(s)
+        # states with different labels are never merged
+        labels = {name: num for num, name in enumerate(dfa._names)}
+        assert dfa.minimize(state_labels=labels).num_states == dfa.num_states
+
+class TestDFAtable:
+    def test_dense_table(self):
+        dfa = DFA(Regex('(a|b)*abb')._matcher)
+        assert dfa._names[0] == dfa._start
+        assert len(dfa._table) == (dfa.num_states + 1) * dfa._nclasses
+        # a, b and all other characters
+        assert dfa._nclasses == 3
+        assert dfa._byte_classes[ord('c')] == dfa._byte_classes[ord('z')] == dfa._class_of(0x10ffff)
+        # the rejecting state is the last row and never left
+        dead = dfa.num_states
+        assert all(target == dead for target in dfa._table[dead * dfa._nclasses:])
+        assert not dfa._accepting[dead]
+
+    def test_lazy_names(self):
+        dfa = DFA(Regex('(a|b)*abb')._matcher)
+        names = list(dfa._names)
+        assert len(names) == len(set(names)) == dfa.num_states
+        assert dfa._names[1:3] == names[1:3]
+        assert set(dfa._end_states) == {names[num] for num in range(dfa.num_states) if dfa._accepting[num]}
+        assert dfa._final_state('aabb') in dfa._end_states
+        assert dfa._final_state('aab') not in dfa._end_states
+
+    def test_classes_of_ranges(self):
+        dfa = DFA(Regex('[a-fĀ-\U0010ffff]x|.y')._matcher)
+        cases = [('ax', True), ('\U0010ffffx', True), ('gx', False), ('gy', True), ('ÿx', False), ('Āy', True)]
+        accept_test_helper(dfa, cases)
+        # [a-f] and the range above ÿ behave the same, so they share a class
+        assert dfa._class_of(ord('a')) == dfa._class_of(0x100) == dfa._byte_classes[ord('f')]
+        runs = dfa._runs(0)
+        assert runs[0][0] == 0 and runs[-1][1] == 0x10ffff
+        assert all(a[1] + 1 == b[0] for a, b in zip(runs, runs[1:]))
+
+    def test_table_round_trip(self):
+        dfa = DFA(Regex('x[^a-c]*y')._matcher)
+        copy = DFA._from_table(dfa._to_table())
+        assert list(copy._table) == list(dfa._table)
+        accept_test_helper(copy, [('xy', True), ('xdey', True), ('xay', False)])
+
+class TestDFAsinks:
+    def test_sink_kinds(self):
+        dfa = DFA(Regex('ab.*|ac')._matcher)
+        sinks = dfa._sinks
+        assert sinks[dfa._final_number('ab')] == DFA.ACCEPT_SINK
+        assert sinks[dfa._final_number('ac')] == 0
+        assert sinks[dfa._final_number('a')] == 0
+        assert sinks[dfa._dead] == DFA.REJECT_SINK
+        # after 'x', only 'y's can be read and nothing is accepted
+        nfa = NFA.union(NFA.concat_many([NFA.symbol('x'), NFA.kleene(NFA.symbol('y')), NFA.none()]), NFA.symbol('a'))
+        doomed = DFA(nfa)
+        assert doomed._final_number('x') != doomed._dead
+        assert doomed._sinks[doomed._final_number('x')] == DFA.REJECT_SINK
+        assert not doomed.accept(iter('x'))
+        # an accept sink must lead only to states with the same label
+        dfa = DFA(Regex('a.*|ab.*')._matcher)
+        assert dfa._sinks[dfa._final_number('a')] == DFA.ACCEPT_SINK
+        labels = {dfa._final_state('a'): 1, dfa._final_state('ab'): 2}
+        assert dfa._find_sinks(labels)[dfa._final_number('a')] == 0
+        assert dfa._find_sinks(labels)[dfa._final_number('ab')] == DFA.ACCEPT_SINK
+
+    def test_early_exit(self):
+        def chars(prefix):
+            yield from prefix
+            raise AssertionError('read past a sink state')
+        dfa = DFA(Regex('ab.*|ac')._matcher)
+        assert dfa.accept(chars('abc'))
+        assert not dfa.accept(chars('x'))
+        assert not dfa.accept(chars('acx'))
+        # accepted tags are found at the end of the input
+        assert dfa.accepted_tags('abxyz') == frozenset()
+        accept_test_helper(dfa, [('ab' + 'x' * 10000, True), ('ac', True), ('acx', False), ('a', False)])
+
+    def test_sinks_round_trip(self):
+        dfa = DFA(Regex('ab.*|ac')._matcher)
+        copy = DFA.from_bytes(dfa.to_bytes())
+        assert bytes(copy._sinks) == bytes(dfa._sinks)
+        assert bytes(dfa.minimize()._sinks).count(DFA.ACCEPT_SINK) == 1
+
+    def test_longest_prefix(self):
+        def chars(prefix):
+            yield from prefix
+            raise AssertionError('read past a sink state')
+        dfa = DFA(Regex('ab*|c')._matcher)
+        assert dfa.longest_prefix('abbbx') == 4
+        assert dfa.longest_prefix('abbb') == 4
+        assert dfa.longest_prefix('cab') == 1
+        assert dfa.longest_prefix('xab') == -1
+        assert dfa.longest_prefix('') == -1
+        assert dfa.longest_prefix('xxabbc', 2) == 3
+        assert dfa.longest_prefix('xxabbc', 2, 4) == 2
+        assert DFA(Regex('a*')._matcher).longest_prefix('b') == 0
+        # the rest of the input isn't read in sink states
+        assert DFA(Regex('ab.*')._matcher).longest_prefix('abx' * 10) == 30
+
+class TestDFAproduct:
+    strings = [''] + [a + b + c for a in 'axyZ' for b in ' axy1' for c in ' ax']
+
+    def check(self, dfa, expected):
+        for s in TestDFAproduct.strings:
+            s = s.replace(' ', '')
+            assert dfa.accept(s) == expected(s), s
+
+    def test_operations(self):
+        patterns = ['[a-z]+', '.*x.*', 'a*', '', '(xy|a)*1?']
+        dfas = [DFA(Regex(pattern)._matcher) for pattern in patterns]
+        for a in dfas:
+            self.check(a.complement(), lambda s: not a.accept(s))
+            for b in dfas:
+                self.check(a.intersect(b), lambda s: a.accept(s) and b.accept(s))
+                self.check(a.union(b), lambda s: a.accept(s) or b.accept(s))
+                self.check(a.difference(b), lambda s: a.accept(s) and not b.accept(s))
+
+    def test_minimal_result(self):
+        a = DFA(Regex('[a-z]+')._matcher)
+        assert a.difference(a).num_states == 1
+        assert not a.difference(a)._end_states
+        assert a.complement().complement().num_states == a.minimize().num_states
+        assert a.union(a.complement()).num_states == 1
+        assert a.union(a.complement()).description == '(([a-z])+)|(~(([a-z])+))'
+
+class TestDFAbinary:
+    cases = [('xy', True), ('xdey', True), ('xĀy', True), ('xay', False), ('x', False), ('', False)]
+
+    def test_bytes_round_trip(self):
+        dfa = DFA(Regex('x[^a-c]*y')._matcher)
+        copy = DFA.from_bytes(dfa.to_bytes())
+        assert list(copy._table) == list(dfa._table)
+        assert copy.description == dfa.description
+        assert copy.num_states == dfa.num_states
+        assert len(copy._end_states) == len(dfa._end_states)
+        accept_test_helper(copy, TestDFAbinary.cases)
+        # a loaded DFA can be minimized and compiled
+        accept_test_helper(copy.minimize(), TestDFAbinary.cases)
+        accept_test_helper(JITMatcher(copy), [case for case in TestDFAbinary.cases if 'Ā' not in case[0]])
+
+    def test_save_and_load(self, tmpdir):
+        dfa = DFA(Regex('x[^a-c]*y')._matcher)
+        path = str(tmpdir.join('x.dfa'))
+        dfa.save(path)
+        for mmap in (True, False):
+            loaded = DFA.load(path, mmap=mmap)
+            accept_test_helper(loaded, TestDFAbinary.cases)
+        # saving again doesn't change the mapped file
+        DFA(Regex('z')._matcher).save(path)
+        accept_test_helper(loaded, TestDFAbinary.cases)
+        accept_test_helper(DFA.load(path), [('z', True), ('xy', False)])
+
+    def test_invalid_data(self, tmpdir):
+        data = DFA(Regex('ab')._matcher).to_bytes()
+        with pytest.raises(DFAError):
+            DFA.from_bytes(b'NOTADFA!' + data[8:])
+        with pytest.raises(DFAError):
+            DFA.from_bytes(data[:-1])
+        with pytest.raises(DFAError):
+            DFA.from_bytes(data[:10])
+        with pytest.raises(DFAError):
+            DFA.from_bytes(data[:8] + bytes([99]) + data[9:])
+        path = tmpdir.join('empty.dfa')
+        path.write('')
+        with pytest.raises(DFAError):
+            DFA.load(str(path))
+
+    def test_random_corruption(self):
+        # damaged data is loaded, or rejected with DFAError
+        rng = random.Random(0)
+        for pattern in ['(ab|c)*d?', '[^a]b+', '']:
+            data = DFA(Regex(pattern)._matcher).to_bytes()
+            for _ in range(300):
+                damaged = bytearray(data)
+                for _ in range(rng.randint(1, 3)):
+                    damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+                try:
+                    dfa = DFA.from_bytes(bytes(damaged))
+                except DFAError:
+                    continue
+                for s in ['', 'abcd', 'ébb']:
+                    dfa.accept(s)
+
+    @pytest.mark.parametrize('use_numpy', [False, True])
+    def test_tampered_data(self, monkeypatch, use_numpy):
+        if use_numpy and rejit.dfa.numpy is None:
+            pytest.skip('numpy is not installed')
+        if not use_numpy:
+            monkeypatch.setattr(rejit.dfa, 'numpy', None)
+        data = DFA(Regex('ab')._matcher).to_bytes()
+        _, _, num_states, nclasses, nbounds, description_length = DFA._binary_header.unpack_from(data)
+        bounds = DFA._binary_header.size + description_length + -description_length % 4
+        interval_classes = bounds + 4 * nbounds
+        byte_classes = interval_classes + 4 * nbounds
+        table = byte_classes + 4 * 256
+        accepting = table + 4 * (num_states + 1) * nclasses
+        sinks = accepting + num_states + 1
+
+        def tampered(offset, value, size=4):
+            return data[:offset] + value.to_bytes(size, 'little', signed=True) + data[offset + size:]
+        for offset, value, size in [
+                (table, num_states + 1, 4), (table + 4, -1, 4),
+                (interval_classes, nclasses, 4), (byte_classes + 4 * ord('a'), -1, 4),
+                (bounds, 1, 4), (accepting, 2, 1), (sinks, 3, 1)]:
+            with pytest.raises(DFAError):
+                DFA.from_bytes(tampered(offset, value, size))
+        # a description which isn't UTF-8
+        description = DFA._binary_header.size
+        for pattern in ['(ab|c)*d?', '[^a]b+', 'é']:
+            data_description = DFA(Regex(pattern)._matcher).to_bytes()
+            with pytest.raises(DFAError):
+                DFA.from_bytes(data_description[:description] + b'\xff' + data_description[description + 1:])
+        # the rejecting state is a valid target
+        assert DFA.from_bytes(tampered(table, num_states, 4)).num_states == num_states
+
+class TestDFAbatch:
+    def test_uint8_rows(self):
+        numpy = pytest.importorskip('numpy')
+        dfa = DFA(Regex('[a-c]+x|ÿ')._matcher)
+        strings = ['abx', 'cx', 'x', 'ab', 'ÿ', 'aaaax', 'abxx', '']
+        width = max(map(len, strings))
+        rows = numpy.zeros((len(strings), width), dtype=numpy.uint8)
+        for num, s in enumerate(strings):
+            rows[num, :len(s)] = [ord(char) for char in s]
+        lengths = numpy.array([len(s) for s in strings])
+        result = dfa.accept_batch(rows, lengths)
+        assert result.dtype == numpy.bool_
+        assert list(result) == [dfa.accept(s) for s in strings]
+        # without lengths, whole rows are matched
+        assert list(dfa.accept_batch(rows[:1, :3])) == [True]
+
+    def test_byte_strings(self):
+        numpy = pytest.importorskip('numpy')
+        dfa = DFA(Regex('[0-9]+\\-[A-Z]{2}')._matcher)
+        strings = [b'123-AB', b'1-XY', b'-XY', b'12-ABC', b'12-A', b'']
+        assert list(dfa.accept_batch(numpy.array(strings))) == [dfa.accept(s.decode()) for s in strings]
+
+    def test_invalid_arrays(self):
+        numpy = pytest.importorskip('numpy')
+        dfa = DFA(Regex('a')._matcher)
+        with pytest.raises(DFAError):
+            dfa.accept_batch(numpy.zeros(3, dtype=numpy.uint8))
+        with pytest.raises(DFAError):
+            dfa.accept_batch(numpy.zeros((2, 2), dtype=numpy.int32))
+        with pytest.raises(DFAError):
+            dfa.accept_batch(numpy.zeros((2, 2), dtype=numpy.uint8), [1, 2, 3])
+
+    def test_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(rejit.dfa, 'numpy', None)
+        with pytest.raises(DFAError):
+            DFA(Regex('a')._matcher).accept_batch([[97]])
@@ -0,0 +1,174 @@
+#encoding: utf8
+
+import os
+
+import pytest
+
+import rejit.diskcache
+import rejit.regex
+from rejit.diskcache import DiskCache
+from rejit.regex import Regex
+
+from tests.helper import accept_test_helper
+
+cases = [
+            ('xx', True),
+            ('xabbax', True),
+            ('', False),
+            ('xab', False),
+        ]
+
+@pytest.fixture
+def disk_cache(tmpdir):
+    cache = rejit.diskcache.enable(str(tmpdir))
+    yield cache
+    rejit.diskcache.disable()
+
+def test_store_and_load(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    assert cache.load('a') is None
+    cache.store('a', dfa={'start': '1'})
+    cache.store('a', x86_binary=b'\xc3')
+    entry = cache.load('a')
+    assert entry['dfa'] == {'start': '1'}
+    assert entry['x86_binary'] == b'\xc3'
+    assert cache.info() == {'hits': 1, 'misses': 1, 'evictions': 0}
+    # one file per part, no temporary files are left behind
+    assert len(os.listdir(str(tmpdir))) == 2
+    with pytest.raises(rejit.diskcache.DiskCacheError):
+        cache.store('a', xyz=1)
+
+def test_concurrent_writers(tmpdir):
+    # writers of different parts don't overwrite each other's parts
+    first = DiskCache(str(tmpdir))
+    second = DiskCache(str(tmpdir))
+    first.store('a', dfa={'start': '1'})
+    second.store('a', x86_binary=b'\xc3')
+    first.store('a', dfa={'start': '2'})
+    assert second.load('a') == {'dfa': {'start': '2'}, 'x86_binary': b'\xc3'}
+
+def test_stale_temporary_files(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    stale = os.path.join(str(tmpdir), '.tmp-stale')
+    fresh = os.path.join(str(tmpdir), '.tmp-fresh')
+    for path in (stale, fresh):
+        open(path, 'w').close()
+    os.utime(stale, (0, 0))
+    cache.store('a', x86_binary=b'\xc3')
+    # a fresh file can belong to a write in progress
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+
+def test_key_includes_target(tmpdir):
+    cache32 = DiskCache(str(tmpdir), target='Encoder32-posix')
+    cache64 = DiskCache(str(tmpdir), target='Encoder64-posix')
+    cache32.store('a', x86_binary=b'\x90')
+    assert cache64.load('a') is None
+    assert cache32.load('a')['x86_binary'] == b'\x90'
+
+def test_key_includes_cache_format(tmpdir, monkeypatch):
+    cache = DiskCache(str(tmpdir))
+    monkeypatch.setattr(DiskCache, 'cache_format', DiskCache.cache_format - 1)
+    cache.store('a', x86_binary=b'\x90')
+    monkeypatch.undo()
+    assert cache.load('a') is None
+
+def test_corrupted_entry(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    cache.store('a', x86_binary=b'\xc3')
+    path = cache._path('a', 'x86_binary')
+    with open(path, 'wt') as f:
+        f.write('{"key": [')
+    assert cache.load('a') is None
+    assert not os.path.exists(path)
+
+def test_size_bounded_eviction(tmpdir):
+    cache = DiskCache(str(tmpdir), max_size=1000)
+    for i in range(5):
+        cache.store(str(i), x86_binary=b'\x90' * 100)
+        # make modification times distinct and ordered
+        path = cache._path(str(i), 'x86_binary')
+        os.utime(path, (i, i))
+    assert cache.size() <= 1000
+    assert cache.info()['evictions'] > 0
+    # the most recently used entry is kept, the oldest one is evicted
+    assert cache.load('4') is not None
+    assert cache.load('0') is None
+    cache.purge()
+    assert cache.size() == 0
+
+def test_size_without_rescans(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    scans = []
+    entries = cache._entries
+    cache._entries = lambda: scans.append(1) or entries()
+    for i in range(256):
+        cache.store(str(i), x86_binary=b'\x90' * (i % 7))
+    # rescans get rarer as the cache grows
+    assert len(scans) <= 10
+    assert cache._size == cache.size()
+
+def test_regex_uses_disk_cache(disk_cache, monkeypatch):
+    re = Regex('x(ab|ba)*x')
+    re.compile_to_x86()
+    accept_test_helper(re, cases)
+    entry = disk_cache.load('x(ab|ba)*x')
+    assert 'dfa' in entry and 'x86_binary' in entry
+
+    # a hit doesn't construct a DFA or compile code
+    def fail(*args):
+        raise AssertionError('cache not used')
+    monkeypatch.setattr(rejit.regex.DFA, '__init__', fail)
+    monkeypatch.setattr(rejit.regex.JITMatcher, '__init__', fail)
+    re = Regex('x(ab|ba)*x')
+    re.compile_to_x86()
+    assert re._matcher_type == 'JIT'
+    assert re.description == 'x((ab|ba))*x'
+    accept_test_helper(re, cases)
+
+    re = Regex('x(ab|ba)*x')
+    re.compile_to_DFA()
+    assert re._matcher_type == 'DFA'
+    accept_test_helper(re, cases)
+
+def test_range_edges(disk_cache, monkeypatch):
+    pattern = '[^a-c][a-z]*'
+    range_cases = [('xyz', True), ('d', True), ('ab', False), ('', False)]
+    Regex(pattern).compile_to_DFA()
+
+    def fail(*args):
+        raise AssertionError('cache not used')
+    monkeypatch.setattr(rejit.regex.DFA, '__init__', fail)
+    re = Regex(pattern)
+    re.compile_to_DFA()
+    accept_test_helper(re, range_cases)
+
+def test_combined_regex_not_cached(disk_cache, tmpdir):
+    # regexes combined with operators have no pattern to key entries with
+    first = Regex('a+') - Regex('aa')
+    first.compile_to_x86()
+    second = Regex('b+') - Regex('bb')
+    second.compile_to_x86()
+    accept_test_helper(first, [('a', True), ('aa', False), ('b', False)])
+    accept_test_helper(second, [('b', True), ('bb', False), ('a', False)])
+    assert not os.listdir(str(tmpdir))
+
+def test_cached_code_within_budget(disk_cache):
+    Regex('x(ab|ba)*x').compile_to_x86()
+    size = len(disk_cache.load('x(ab|ba)*x')['x86_binary'])
+    re = Regex('x(ab|ba)*x')
+    assert re.compile_to_x86({'code_bytes': size}) == 'JIT'
+    # cached code over the budget is compiled again and falls back
+    re = Regex('x(ab|ba)*x')
+    assert re.compile_to_x86({'code_bytes': size - 1}, 'nfa') == 'DFA'
+    assert re.fallback_info() == ('JIT', 'DFA', 'code_bytes', size - 1)
+    accept_test_helper(re, cases)
+
+def test_cached_code_non_ascii(disk_cache):
+    Regex('a.c').compile_to_x86()
+    for compile_DFA in (False, True):
+        re = Regex('a.c')
+        if compile_DFA:
+            re.compile_to_DFA()
+        assert re.compile_to_x86() == 'JIT'
+        accept_test_helper(re, [('aéc', True), ('abc', True), ('aéé', False)])
@@ -0,0 +1,69 @@
+#encoding: utf8
+
+import itertools
+import pytest
+
+import rejit.glushkov as glushkov
+import rejit.regex_ast as ast
+from rejit.regex import Regex
+from rejit.regex import RegexCompilationError
+from rejit.dfa import DFA
+from rejit.pikevm import PikeVM
+
+patterns = [
+        '', 'a', 'ab', 'a|b', 'a*', 'a+', 'a?', '.', '[a-c]', '[^b]',
+        'a(b|c)*d', '(a|b)*abb', '(ab|a)*b', '(x+x+)+y', 'a?b?c?', '(a*b*)*',
+        '((a+b)+c)+', 'a{2,3}b{1,}', '(a|\\E)(b|c)', '[ab]*c[^ab]', '.*a.?',
+    ]
+
+def strings(alphabet='abcdx', max_length=5):
+    for length in range(max_length + 1):
+        for chars in itertools.product(alphabet, repeat=length):
+            yield ''.join(chars)
+
+class TestGlushkov:
+    def test_same_language(self):
+        for pattern in patterns:
+            thompson = Regex(pattern)
+            position = Regex(pattern, construction='glushkov')
+            assert position.description == thompson.description
+            for s in strings():
+                assert position.accept(s) == thompson.accept(s), (pattern, s)
+
+    def test_dfa_and_jit(self):
+        for pattern in patterns:
+            thompson = Regex(pattern)
+            position = Regex(pattern, construction='glushkov')
+            dfa = DFA(position._matcher)
+            position.compile_to_x86()
+            for s in strings(max_length=4):
+                expected = thompson.accept(s)
+                assert dfa.accept(s) == expected, (pattern, s)
+                assert position.accept(s) == expected, (pattern, s)
+
+    def test_state_per_position(self):
+        nfa = glushkov.build(Regex('(a|bc)*[d-f].')._final_ast)
+        # the initial state and 5 positions
+        assert nfa.num_states == 6
+        assert not nfa._eps_targets
+        # every edge to a position has the position's label
+        labels = {}
+        for st in range(nfa.num_states):
+            for label, target in nfa._edges(st):
+                assert labels.setdefault(target, label) == label
+        assert sorted(labels) == [1, 2, 3, 4, 5]
+
+    def test_accepted_tags(self):
+        nfa = glushkov.build(Regex('ab*')._final_ast)
+        vm = PikeVM(nfa, accept_tags={st: st for st in nfa._ends})
+        assert vm.accepted_tags('a') == {1}
+        assert vm.accepted_tags('abb') == {2}
+        assert vm.accepted_tags('b') == frozenset()
+
+    def test_unsupported_node(self):
+        with pytest.raises(glushkov.GlushkovError):
+            glushkov.build(ast.Repeat(ast.Symbol('a'), 2, 3))
+
+    def test_unknown_construction(self):
+        with pytest.raises(RegexCompilationError):
+            Regex('a', construction='brzozowski')
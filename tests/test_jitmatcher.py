@@ -2,6 +2,7 @@
 
 from rejit.nfa import NFA
 from rejit.dfa import DFA
+from rejit.regex import Regex
 from rejit.jitmatcher import JITMatcher
 from tests.helper import accept_test_helper
 
@@ -47,6 +48,8 @@ class TestJITMatcherAccept:
     def test_char_set_JITMatcher(self):
         accept_test_helper(JITMatcher(DFA(auto_cases.char_set_nfa_1)),auto_cases.char_set_cases_1)
         accept_test_helper(JITMatcher(DFA(auto_cases.char_set_nfa_2)),auto_cases.char_set_cases_2)
+        accept_test_helper(JITMatcher(DFA(auto_cases.char_set_nfa_3)),auto_cases.char_set_cases_3)
+        accept_test_helper(JITMatcher(DFA(auto_cases.char_set_nfa_4)),auto_cases.char_set_cases_4)
 
     def test_zero_or_one_JITMatcher(self):
         accept_test_helper(JITMatcher(DFA(auto_cases.zero_or_one_nfa)),auto_cases.zero_or_one_cases)
@@ -61,3 +64,37 @@ def test_jitmatcher_accept_return_bool():
     assert isinstance(matcher.accept('a'), bool)
     assert isinstance(matcher.accept('b'), bool)
 
+
+def test_jitmatcher_minimizes_dfa():
+    # states after 'a' and after 'c' are different NFA states, but equivalent
+    dfa = DFA(NFA.union(NFA.concat(NFA.symbol('a'), NFA.symbol('b')), NFA.concat(NFA.symbol('c'), NFA.symbol('b'))))
+    minimal = JITMatcher(dfa)
+    full = JITMatcher(dfa, minimize=False)
+    assert len(minimal._x86_binary) < len(full._x86_binary)
+    accept_test_helper(minimal, [('ab', True), ('cb', True), ('', False), ('b', False), ('abb', False)])
+
+def test_jitmatcher_sink_states():
+    matcher = JITMatcher(DFA(Regex('ab.*')._matcher))
+    # the accept sink returns without a loop over the rest of the input
+    sink = matcher._ir.index(('ret', True))
+    assert matcher._ir[sink - 1][0] == 'label'
+    accept_test_helper(matcher, [('ab' + 'x' * 100000, True), ('a' + 'x' * 100000, False), ('ab', True)])
+
+def test_jitmatcher_longest_prefix():
+    dfa = DFA(Regex('ab*|c|x.*')._matcher)
+    matcher = JITMatcher(dfa, longest_prefix=True)
+    for text in ['', 'a', 'abbbx', 'xab', 'c', 'cab', 'abbb', 'bab', 'x', 'xyz']:
+        assert matcher.longest_prefix(text.encode()) == dfa.longest_prefix(text), text
+    assert matcher.longest_prefix(b'zzabbc', 2) == 3
+    assert matcher.longest_prefix(b'zzabbc', 2, 4) == 2
+    assert ('ret var', 'last') in matcher._ir
+
+def test_jitmatcher_non_ascii():
+    # x86 code reads ASCII strings, others are matched by the DFA
+    for pattern, cases in [
+            ('a.c', [('aéc', True), ('a\U00010000c', True), ('abc', True), ('aééc', False)]),
+            ('.*é.*', [('é', True), ('caf\xe9!', True), ('cafe', False), ('ü', False)]),
+            ('[^a]+', [('ÿĀ', True), ('b', True), ('aé', False), ('', False)])]:
+        matcher = JITMatcher(DFA(Regex(pattern)._matcher))
+        accept_test_helper(matcher, cases)
+        assert matcher.accept('a' + 'é' * 1000 + 'c') == (pattern != '[^a]+' and pattern != 'a.c')
@@ -0,0 +1,102 @@
+#encoding: utf8
+
+import random
+import threading
+
+import pytest
+
+from rejit.lazydfa import LazyDFA
+from rejit.regex import Regex
+from rejit.regex import RegexCompilationError
+from tests.helper import accept_test_helper
+
+from tests.test_glushkov import patterns
+from tests.test_glushkov import strings
+
+class TestLazyDFA:
+    def test_same_language(self):
+        for pattern in patterns:
+            nfa = Regex(pattern)
+            matcher = LazyDFA(nfa._matcher)
+            assert matcher.description == nfa.description
+            for s in strings():
+                assert matcher.accept(s) == nfa.accept(s), (pattern, s)
+
+    def test_counters(self):
+        matcher = LazyDFA(Regex('(a|b)*c')._matcher)
+        assert matcher.info() == (0, 0, 0, 0, 0, 1000)
+        assert matcher.accept('aac')
+        info = matcher.info()
+        # `(a|b)*` loops in the start state, so the second 'a' is a hit
+        assert info.misses == 2
+        assert info.hits == 1
+        assert info.states == 2
+        # the same transitions are taken from the cache
+        assert matcher.accept('aac')
+        assert matcher.info().misses == 2
+        assert matcher.info().hits == 4
+        assert matcher.info().flushes == 0
+
+    def test_flush(self):
+        pattern = '(a|b)*a(a|b){8}'
+        matcher = LazyDFA(Regex(pattern)._matcher, max_states=20, min_chars_per_flush=0)
+        rand = random.Random(0)
+        s = ''.join(rand.choice('ab') for _ in range(500))
+        assert matcher.accept(s) == (s[-9] == 'a')
+        info = matcher.info()
+        assert info.flushes > 0
+        assert info.fallbacks == 0
+        assert info.states <= 20
+
+    def test_fallback(self):
+        # every character builds a new state, so the cache is flushed too often
+        pattern = '(a|b)*a(a|b){8}'
+        nfa = Regex(pattern)
+        matcher = LazyDFA(nfa._matcher, max_states=4, min_chars_per_flush=10)
+        rand = random.Random(1)
+        for _ in range(20):
+            s = ''.join(rand.choice('ab') for _ in range(rand.randint(0, 50)))
+            assert matcher.accept(s) == nfa.accept(s), s
+        assert matcher.info().fallbacks > 0
+        assert matcher.info().states <= 4
+
+    def test_threads(self):
+        nfa = Regex('(a|b)*a(a|b){5}')
+        matcher = LazyDFA(nfa._matcher, max_states=10, min_chars_per_flush=0)
+        rand = random.Random(2)
+        inputs = [''.join(rand.choice('ab') for _ in range(rand.randint(0, 30))) for _ in range(50)]
+        expected = [nfa.accept(s) for s in inputs]
+        errors = []
+        def run():
+            if [matcher.accept(s) for s in inputs] != expected:
+                errors.append(True)
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+
+    def test_regex_matcher_type(self):
+        re = Regex('(a|b)*a(a|b){20}')
+        assert re.lazy_dfa_info() is None
+        re.compile_to_lazy_DFA()
+        assert re._matcher_type == 'LazyDFA'
+        cases = [('a' * 21, True), ('b' * 5 + 'a' + 'b' * 20, True), ('a' + 'b' * 21, False), ('a' * 20, False)]
+        accept_test_helper(re, cases)
+        info = re.lazy_dfa_info()
+        assert info.max_states == 1000
+        assert info.hits + info.misses == sum(len(s) for s, _ in cases)
+        # compiling again is a no-op, other matchers can't be compiled
+        re.compile_to_lazy_DFA()
+        with pytest.raises(RegexCompilationError):
+            re.compile_to_DFA()
+        dfa = Regex('ab')
+        dfa.compile_to_DFA()
+        with pytest.raises(RegexCompilationError):
+            dfa.compile_to_lazy_DFA()
+
+    def test_non_ascii(self):
+        re = Regex('[Ā-￿]+[^Ā-￿]')
+        re.compile_to_lazy_DFA()
+        accept_test_helper(re, [('Ā￿a', True), ('ሴ\U00010000', True), ('a', False), ('ሴ', False), ('', False)])
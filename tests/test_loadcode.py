@@ -1,5 +1,7 @@
 #encoding: utf8
 
+import pytest
+
 import rejit.loadcode as loadcode
 
 def test_dynamic_code_loading():
@@ -9,3 +11,13 @@ def test_dynamic_code_loading():
     code = loadcode.load(binary)
     assert(loadcode.call(code, "elo", 3) == 7)
 
+
+def test_call_with_range():
+    binary = b'\xb8\x07\x00\x00\x00\xc3'
+    code = loadcode.load(binary)
+    assert loadcode.call_range(code, b'elo', 1, 3) == 7
+    assert loadcode.call_range(code, bytearray(b'elo'), 3, 3) == 7
+    with pytest.raises(IndexError):
+        loadcode.call_range(code, b'elo', 2, 4)
+    with pytest.raises(IndexError):
+        loadcode.call_range(code, b'elo', 2, 1)
@@ -56,6 +56,8 @@ class TestNFAaccept:
     def test_char_set_NFA(self):
         accept_test_helper(auto_cases.char_set_nfa_1,auto_cases.char_set_cases_1)
         accept_test_helper(auto_cases.char_set_nfa_2,auto_cases.char_set_cases_2)
+        accept_test_helper(auto_cases.char_set_nfa_3,auto_cases.char_set_cases_3)
+        accept_test_helper(auto_cases.char_set_nfa_4,auto_cases.char_set_cases_4)
 
     def test_zero_or_one_NFA(self):
         accept_test_helper(auto_cases.zero_or_one_nfa,auto_cases.zero_or_one_cases)
@@ -320,3 +322,15 @@ class TestNFAother:
         accept_test_helper(nfa, cases)
         accept_test_helper(nfc, cases)
 
+
+    def test_nested_kleene_plus_size(self):
+        # every level of nesting adds a constant number of states
+        def nested(depth):
+            nfa = NFA.symbol('a')
+            for _ in range(depth):
+                nfa = NFA.kleene_plus(NFA.concat(nfa, NFA.symbol('b')))
+            return nfa
+        sizes = [len(NFA._get_all_reachable_states(nested(depth)._start)) for depth in range(1, 6)]
+        assert len({b - a for a, b in zip(sizes, sizes[1:])}) == 1
+        cases = [('abbbb', True), ('ababbbb', True), ('ababbb', False), ('abbbbabbbb', True), ('abbb', False), ('abbbba', False)]
+        accept_test_helper(nested(4), cases)
@@ -0,0 +1,86 @@
+#encoding: utf8
+
+import threading
+
+from rejit.nfa import NFA
+from rejit.pikevm import PikeVM
+from rejit.regex import Regex
+from tests.helper import accept_test_helper
+
+import tests.automaton_test_cases as auto_cases
+
+all_cases = [
+        (auto_cases.empty_nfa, auto_cases.empty_cases),
+        (auto_cases.any_nfa, auto_cases.any_cases),
+        (auto_cases.none_nfa, auto_cases.none_cases),
+        (auto_cases.kleene_nfa, auto_cases.kleene_cases),
+        (auto_cases.kleene_plus_nfa, auto_cases.kleene_plus_cases),
+        (auto_cases.concat_many_nfa_1, auto_cases.concat_many_cases_1),
+        (auto_cases.concat_many_nfa_3, auto_cases.concat_many_cases_3),
+        (auto_cases.union_many_nfa_1, auto_cases.union_many_cases_1),
+        (auto_cases.union_many_nfa_3, auto_cases.union_many_cases_3),
+        (auto_cases.char_set_nfa_3, auto_cases.char_set_cases_3),
+        (auto_cases.char_set_nfa_4, auto_cases.char_set_cases_4),
+        (auto_cases.zero_or_one_nfa, auto_cases.zero_or_one_cases),
+        (auto_cases.complex_nfa_1, auto_cases.complex_cases_1),
+        (auto_cases.complex_nfa_2, auto_cases.complex_cases_2),
+    ] + list(zip(auto_cases.symbol_nfas, auto_cases.symbol_cases))
+
+class TestPikeVM:
+    def test_accept(self):
+        for nfa, cases in all_cases:
+            accept_test_helper(PikeVM(nfa), cases)
+
+    def test_nfa_unchanged(self):
+        nfa = NFA.kleene(NFA.symbol('a'))
+        vm = PikeVM(nfa)
+        assert nfa.valid
+        assert vm.description == nfa.description
+        assert vm.accept('aaa') and nfa.accept('aaa')
+
+    def test_dense_numbering(self):
+        nfa = NFA.concat(NFA.symbol('a'), NFA.kleene(NFA.union(NFA.symbol('b'), NFA.symbol('c'))))
+        vm = PikeVM(nfa)
+        assert vm._nfa.num_states == len(NFA._get_all_reachable_states(nfa._start))
+        assert vm._nfa._start == 0
+        # closures keep only states with consuming edges
+        vm.accept('abcb')
+        offsets = vm._nfa._offsets
+        for closure in filter(None, vm._closures):
+            assert all(offsets[st] != offsets[st+1] for st in closure[0])
+
+    def test_accepted_tags(self):
+        nfas = [NFA.symbol('a'), NFA.kleene(NFA.symbol('a')), NFA.symbol('b')]
+        tags = {nfa._end: num for num, nfa in enumerate(nfas)}
+        vm = PikeVM(NFA.union_many(nfas), accept_tags=tags)
+        assert vm.accepted_tags('') == {1}
+        assert vm.accepted_tags('a') == {0, 1}
+        assert vm.accepted_tags('aa') == {1}
+        assert vm.accepted_tags('b') == {2}
+        assert vm.accepted_tags('c') == frozenset()
+
+    def test_ambiguous_pattern(self):
+        # exponential for backtracking, linear for the simulation
+        n = 30
+        nfa = NFA.concat_many([NFA.zero_or_one(NFA.symbol('a')) for _ in range(n)] +
+                [NFA.symbol('a') for _ in range(n)])
+        vm = PikeVM(nfa)
+        assert vm.accept('a' * n)
+        assert vm.accept('a' * 2 * n)
+        assert not vm.accept('a' * (n - 1))
+        assert not vm.accept('a' * (2 * n + 1))
+
+    def test_threads(self):
+        vm = PikeVM(Regex('(ab|a)*b')._matcher)
+        cases = [('ab', True), ('abab', True), ('aab', True), ('aba', False)] * 200
+        failures = []
+        def run():
+            for s, expected in cases:
+                if vm.accept(s) != expected:
+                    failures.append(s)
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not failures
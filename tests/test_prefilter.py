@@ -0,0 +1,77 @@
+#encoding: utf8
+
+import random
+
+import rejit.regex_ast as ast
+from rejit.regex import Regex
+from rejit.search import Searcher
+from rejit.prefilter import Prefilter
+
+from tests.test_glushkov import patterns
+from tests.test_glushkov import strings
+
+def literals(pattern):
+    prefilter = Prefilter.from_ast(Regex(pattern)._final_ast)
+    return prefilter and (prefilter.prefix, prefilter.suffix, prefilter.inner, prefilter.anchor)
+
+class TestExtraction:
+    def test_literals(self):
+        assert literals('ERROR [0-9]+') == ('ERROR ', '', '', ('ERROR ', 0))
+        assert literals('.*ERROR [0-9]+.*') == ('', '', 'ERROR ', ('ERROR ', None))
+        assert literals('[0-9]+ms') == ('', 'ms', '', ('ms', None))
+        assert literals('foo|foz') == ('fo', '', '', ('fo', 0))
+        assert literals('a(bc)+d') == ('abc', 'bcd', '', ('abc', 0))
+        assert literals('a.{2,3}bcd') == ('a', 'bcd', '', ('bcd', 4))
+        assert literals('(GET|POST) /[a-z]*') == ('', '', 'T /', ('T /', 3))
+        assert literals('x[y]z') == ('xyz', 'xyz', '', ('xyz', 0))
+
+    def test_no_literals(self):
+        for pattern in ['', '[a-z]+', 'a*', '(ab)?', 'a|b', '.']:
+            assert Prefilter.from_ast(Regex(pattern)._final_ast) is None, pattern
+            assert Regex(pattern).prefilter_info() is None
+
+class TestPrefilter:
+    def test_same_language(self):
+        for pattern in patterns + ['ERROR [0-9]+', '.*(ab|cb)d.*', 'a.?bc+', '(ab){2,3}x']:
+            re = Regex(pattern)
+            for s in strings():
+                assert re.accept(s) == re._matcher.accept(s), (pattern, s)
+
+    def test_same_matches(self):
+        rand = random.Random(0)
+        inputs = [''.join(rand.choice('abcdx') for _ in range(rand.randint(0, 30))) for _ in range(200)]
+        for pattern in patterns + ['.*(ab|cb)d.*', 'a.?bc+', '(ab){2,3}x', 'a(b|c)*d']:
+            re = Regex(pattern)
+            plain = Searcher(re._compile(re._final_ast), re._compile(ast.reverse(re._final_ast)))
+            for s in inputs:
+                assert [m[:2] for m in re.finditer(s)] == list(plain.finditer(s)), (pattern, s)
+
+    def test_accept_counters(self):
+        re = Regex('.*ERROR [0-9]+.*')
+        re.compile_to_DFA()
+        assert re.prefilter_info()[4:] == (0, 0, 0)
+        assert not re.accept('INFO all good')
+        assert re.accept('x ERROR 5 y')
+        assert not re.accept('ERROR x')
+        assert re.prefilter_info()[4:] == (3, 1, 0)
+
+    def test_search_counters(self):
+        re = Regex('ERROR [0-9]+')
+        re.compile_to_DFA()
+        text = 'INFO ok\n' * 10 + 'ERROR 1\n' + 'INFO ok\n' * 10
+        assert [m.start for m in re.finditer(text)] == [80]
+        info = re.prefilter_info()
+        # the search jumped to the match and stopped without another scan
+        assert info.calls == 2
+        assert info.rejected == 1
+        assert info.skipped == 80
+        assert re.search('INFO ok') is None
+        assert re.prefilter_info().rejected == 2
+
+    def test_not_used_by_jit(self):
+        re = Regex('ERROR [0-9]+')
+        re.compile_to_x86()
+        assert re.accept('ERROR 1')
+        assert not re.accept('INFO')
+        assert [m.group for m in re.finditer('x ERROR 1 ERROR 2')] == ['ERROR 1', 'ERROR 2']
+        assert re.prefilter_info()[4:] == (0, 0, 0)
@@ -3,8 +3,10 @@
 import pytest
 import pprint
 import rejit.common
-from rejit.nfa import NFA
+import rejit.charset
 from rejit.regex import Regex
+from rejit.regex_ast import from_tuple
+import rejit.regex_ast as ast
 
 from tests.helper import accept_test_helper
 
@@ -18,7 +20,7 @@ def assert_regex_parse_error(pattern):
         print('description: {}'.format(re.get_matcher_description()))
 
 def assert_regex_description(ast, expected_description):
-    result_description = Regex()._compile(ast).description
+    result_description = Regex()._compile(from_tuple(ast)).description
     print("ast:")
     ppast.pprint(ast)
     print("description:{description}, expected:{expected}, {ok}".format(
@@ -28,25 +30,28 @@ def assert_regex_description(ast, expected_description):
     assert result_description == expected_description
 
 def assert_regex_AST(pattern, expected_ast):
+    # AST nodes are interned, so equal ASTs are the same object
     result_ast = Regex()._parse(pattern)
+    expected_ast = from_tuple(expected_ast)
     print("pattern:",pattern)
     print("result ast:")
-    ppast.pprint(result_ast)
+    ppast.pprint(result_ast.to_tuple())
     print("expected ast:")
-    ppast.pprint(expected_ast)
-    print('OK' if result_ast == expected_ast else 'FAILED')
-    assert result_ast == expected_ast
+    ppast.pprint(expected_ast.to_tuple())
+    print('OK' if result_ast is expected_ast else 'FAILED')
+    assert result_ast is expected_ast
 
 def assert_regex_transform(ast, expected_trans_ast):
-    trans_ast = Regex()._transform(ast)
+    trans_ast = Regex()._transform(from_tuple(ast))
+    expected_trans_ast = from_tuple(expected_trans_ast)
     print("input ast:")
     ppast.pprint(ast)
     print("transformed ast:")
-    ppast.pprint(trans_ast)
+    ppast.pprint(trans_ast.to_tuple())
     print("expected ast:")
-    ppast.pprint(expected_trans_ast)
-    print('OK' if trans_ast == expected_trans_ast else 'FAILED')
-    assert trans_ast == expected_trans_ast 
+    ppast.pprint(expected_trans_ast.to_tuple())
+    print('OK' if trans_ast is expected_trans_ast else 'FAILED')
+    assert trans_ast is expected_trans_ast
 
 class TestRegexParsing:
     def test_empty_regex(self):
@@ -79,17 +84,17 @@ class TestRegexParsing:
     def test_union_regex(self):
         pattern = 'a|b'
         expected_AST = ('union',[('symbol','a'),('symbol','b')])
-        expected_final_AST = expected_AST
-        expected_NFA_description = '(a|b)'
+        expected_final_AST = ('set',['a','b'],'[ab]')
+        expected_NFA_description = '[ab]'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
         assert_regex_description(expected_final_AST,expected_NFA_description)
 
         # test for bug #35
         pattern = 'a|b|c'
-        expected_AST = ('union',[('symbol','a'),('union',[('symbol','b'),('symbol','c')])])
-        expected_final_AST = ('union',[('symbol','a'),('symbol','b'),('symbol','c')])
-        expected_NFA_description = '(a|b|c)'
+        expected_AST = ('union',[('symbol','a'),('symbol','b'),('symbol','c')])
+        expected_final_AST = ('set',['a','b','c'],'[abc]')
+        expected_NFA_description = '[abc]'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
         assert_regex_description(expected_final_AST,expected_NFA_description)
@@ -113,16 +118,8 @@ class TestRegexParsing:
 
     def test_concat_regex(self):
         pattern = 'abcdef'
-        expected_AST = ('concat',[('symbol','a'),
-                ('concat',[('symbol','b'),
-                    ('concat',[('symbol','c'),
-                        ('concat',[('symbol','d'),
-                            ('concat',[('symbol','e'),('symbol','f')])
-                            ])
-                        ])
-                    ])
-                ])
-        expected_final_AST = ('concat', [('symbol','a'), ('symbol','b'), ('symbol','c'), ('symbol','d'), ('symbol','e'),('symbol','f') ])
+        expected_AST = ('concat', [('symbol','a'), ('symbol','b'), ('symbol','c'), ('symbol','d'), ('symbol','e'),('symbol','f') ])
+        expected_final_AST = expected_AST
         expected_NFA_description = 'abcdef'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
@@ -130,39 +127,19 @@ class TestRegexParsing:
 
     def test_complex_regex(self):
         pattern = 'aa(bb|(cc)*)'
-        expected_AST = ('concat',[('symbol','a'),
-                    ('concat',[('symbol','a'),
-                        ('union',[('concat',[('symbol','b'),('symbol','b')]),
-                            ('kleene-star',('concat',[('symbol','c'),('symbol','c')]))
-                            ])
-                        ])
-                    ])
-        expected_final_AST = ('concat', [
+        expected_AST = ('concat', [
                                     ('symbol','a'),('symbol','a'),
                                     ('union',[('concat',[('symbol','b'),('symbol','b')]),
                                         ('kleene-star',('concat',[('symbol','c'),('symbol','c')]))])
                                     ])
+        expected_final_AST = expected_AST
         expected_NFA_description =  'aa(bb|(cc)*)'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
         assert_regex_description(expected_final_AST,expected_NFA_description)
         
         pattern = 'aa.*bb.?(a|b)?'
-        expected_AST = ('concat',[('symbol','a'),
-                    ('concat',[('symbol','a'),
-                        ('concat',[('kleene-star',('any',)),
-                            ('concat',[('symbol','b'),
-                                ('concat',[('symbol','b'),
-                                    ('concat',[('zero-or-one',('any',)),
-                                        ('zero-or-one',('union',[('symbol','a'),('symbol','b')])
-                                            )
-                                        ])
-                                    ])
-                                ])
-                            ])
-                        ])
-                    ])
-        expected_final_AST = ('concat', [
+        expected_AST = ('concat', [
                     ('symbol','a'),
                     ('symbol','a'),
                     ('kleene-star',('any',)),
@@ -171,30 +148,22 @@ class TestRegexParsing:
                     ('zero-or-one',('any',)),
                     ('zero-or-one',('union',[('symbol','a'),('symbol','b')])),
             ])
-        expected_NFA_description = 'aa(.)*bb(.)?((a|b))?'
+        expected_final_AST = ('concat', [
+                    ('symbol','a'),
+                    ('symbol','a'),
+                    ('kleene-star',('any',)),
+                    ('symbol','b'),
+                    ('symbol','b'),
+                    ('zero-or-one',('any',)),
+                    ('zero-or-one',('set',['a','b'],'[ab]')),
+            ])
+        expected_NFA_description = 'aa(.)*bb(.)?([ab])?'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
         assert_regex_description(expected_final_AST,expected_NFA_description)
 
         pattern = 'aa[x-z]*bb[0-0]+cc[]?'
-        expected_AST = ('concat',[('symbol','a'),
-                    ('concat',[('symbol','a'),
-                        ('concat',[('kleene-star',('set',['x','y','z'],'[x-z]')),
-                            ('concat',[('symbol','b'),
-                                ('concat',[('symbol','b'),
-                                    ('concat',[('kleene-plus',('set',['0'],'[0-0]')),
-                                        ('concat',[('symbol','c'),
-                                            ('concat',[('symbol','c'),
-                                                ('zero-or-one',('set',[],'[]'))
-                                                ])
-                                            ])
-                                        ])
-                                    ])
-                                ])
-                            ])
-                        ])
-                    ])
-        expected_final_AST = ('concat', [
+        expected_AST = ('concat', [
                     ('symbol','a'),
                     ('symbol','a'),
                     ('kleene-star',('set',['x','y','z'],'[x-z]')),
@@ -205,6 +174,7 @@ class TestRegexParsing:
                     ('symbol','c'),
                     ('zero-or-one',('set',[],'[]')),
             ])
+        expected_final_AST = expected_AST
         expected_NFA_description = 'aa([x-z])*bb([0-0])+cc([])?'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
@@ -297,7 +267,29 @@ class TestRegexParsing:
         assert_regex_parse_error('[abc')
 
     def test_negative_charset_regex(self):
-        assert_regex_parse_error('[^abc]')
+        max_char = rejit.charset.max_char
+        pattern = '[^abc]'
+        expected_AST = ('set',[('\x00','`'),('d',max_char)],pattern)
+        expected_final_AST = expected_AST
+        expected_NFA_description = pattern
+        assert_regex_AST(pattern,expected_AST)
+        assert_regex_transform(expected_AST,expected_final_AST)
+        assert_regex_description(expected_final_AST,expected_NFA_description)
+
+        pattern = '[^a-z0-9]'
+        expected_AST = ('set',[('\x00','/'),(':','`'),('{',max_char)],pattern)
+        assert_regex_AST(pattern,expected_AST)
+
+        pattern = '[^]'
+        expected_AST = ('set',[('\x00',max_char)],pattern)
+        assert_regex_AST(pattern,expected_AST)
+
+        pattern = '[^^]'
+        expected_AST = ('set',[('\x00',']'),('_',max_char)],pattern)
+        assert_regex_AST(pattern,expected_AST)
+
+        assert_regex_parse_error('[^')
+        assert_regex_parse_error('[^a')
 
     def test_period_wildcard_regex(self):
         pattern = '.'
@@ -320,18 +312,13 @@ class TestRegexParsing:
     def test_grouping_regex(self):
         pattern = '(aa|bb)cc'
         expected_AST = ('concat',[
-                ('union',[
-                    ('concat',[('symbol','a'),('symbol','a')]),
-                    ('concat',[('symbol','b'),('symbol','b')])]),
-                ('concat',[('symbol','c'),('symbol','c')])]
-            )
-        expected_final_AST = ('concat',[
                 ('union',[
                     ('concat',[('symbol','a'),('symbol','a')]),
                     ('concat',[('symbol','b'),('symbol','b')])]),
                 ('symbol','c'),
                 ('symbol','c'),
                 ])
+        expected_final_AST = expected_AST
         expected_NFA_description = '(aa|bb)cc'
         assert_regex_AST(pattern,expected_AST)
         assert_regex_transform(expected_AST,expected_final_AST)
@@ -394,6 +381,53 @@ class TestRegexParsing:
         assert_regex_parse_error('a(a(a)a')
         assert_regex_parse_error('(abc|cde')
 
+    def test_counted_repetition_regex(self):
+        pattern = 'a{3}'
+        expected_AST = ('repeat',('symbol','a'),3,3)
+        expected_final_AST = ('concat',[('symbol','a'),('symbol','a'),('symbol','a')])
+        expected_NFA_description = 'aaa'
+        assert_regex_AST(pattern,expected_AST)
+        assert_regex_transform(expected_AST,expected_final_AST)
+        assert_regex_description(expected_final_AST,expected_NFA_description)
+
+        pattern = '(ab){1,3}'
+        expected_AST = ('repeat',('concat',[('symbol','a'),('symbol','b')]),1,3)
+        expected_final_AST = ('concat',[('symbol','a'),('symbol','b'),
+            ('zero-or-one',('concat',[('symbol','a'),('symbol','b'),
+                ('zero-or-one',('concat',[('symbol','a'),('symbol','b')]))]))])
+        expected_NFA_description = 'ab(ab(ab)?)?'
+        assert_regex_AST(pattern,expected_AST)
+        assert_regex_transform(expected_AST,expected_final_AST)
+        assert_regex_description(expected_final_AST,expected_NFA_description)
+
+        pattern = '[ab]{2,}'
+        expected_AST = ('repeat',('set',['a','b'],'[ab]'),2,None)
+        expected_final_AST = ('concat',[('set',['a','b'],'[ab]'),('set',['a','b'],'[ab]'),
+            ('kleene-star',('set',['a','b'],'[ab]'))])
+        expected_NFA_description = '[ab][ab]([ab])*'
+        assert_regex_AST(pattern,expected_AST)
+        assert_regex_transform(expected_AST,expected_final_AST)
+        assert_regex_description(expected_final_AST,expected_NFA_description)
+
+        pattern = 'a{0}'
+        expected_AST = ('repeat',('symbol','a'),0,0)
+        expected_final_AST = ('empty',)
+        assert_regex_AST(pattern,expected_AST)
+        assert_regex_transform(expected_AST,expected_final_AST)
+
+        # `{` which doesn't start a counted repetition is a symbol
+        for pattern in ['a{', 'a{x}', 'a{,2}', 'a{2', 'a{2,x}', '{']:
+            expected_AST = Regex()._parse(pattern.replace('{', '\\{'))
+            assert Regex()._parse(pattern) is expected_AST
+
+        assert_regex_parse_error('a{3,2}')
+        assert_regex_parse_error('a*{2}')
+        assert_regex_parse_error('a{2}{2}')
+        assert_regex_parse_error('{2}')
+        assert_regex_parse_error('a|{2}')
+        assert_regex_parse_error('(a|{2,})')
+        assert_regex_parse_error('a{1001}')
+
     def test_empty_set_regex(self):
         pattern = '[]'
         expected_AST = ('set',[],'[]')
@@ -411,23 +445,23 @@ class TestRegexASTtransform:
         re = Regex()
         x = re._parse('a')
         xinline = re._flatten_nodes('concat',x) 
-        assert xinline == ('symbol','a')
+        assert xinline.to_tuple() == ('symbol','a')
 
     def test_ast_flatten_single(self):
         re = Regex()
         x = re._parse('ab')
         xinline = re._flatten_nodes('concat',x) 
-        assert xinline == ('concat',[('symbol','a'),('symbol','b')])
+        assert xinline.to_tuple() == ('concat',[('symbol','a'),('symbol','b')])
 
     def test_ast_flatten_nested(self):
         re = Regex()
         x = re._parse('abc')
         xinline = re._flatten_nodes('concat',x) 
-        assert xinline == ('concat',[('symbol','a'),('symbol','b'),('symbol','c')])
+        assert xinline.to_tuple() == ('concat',[('symbol','a'),('symbol','b'),('symbol','c')])
 
         x = re._parse('a*b+c?')
         xinline = re._flatten_nodes('concat',x) 
-        assert xinline == ('concat',[
+        assert xinline.to_tuple() == ('concat',[
             ('kleene-star',('symbol','a')),
             ('kleene-plus',('symbol','b')),
             ('zero-or-one',('symbol','c'))
@@ -435,15 +469,15 @@ class TestRegexASTtransform:
 
         x = re._parse('a(bbb)+d')
         xinline = re._flatten_nodes('concat',x) 
-        assert xinline == ('concat',[('symbol','a'),('kleene-plus',('concat',[('symbol','b'),('symbol','b'),('symbol','b')])),('symbol','d')])
+        assert xinline.to_tuple() == ('concat',[('symbol','a'),('kleene-plus',('concat',[('symbol','b'),('symbol','b'),('symbol','b')])),('symbol','d')])
 
         x = re._parse('a|b|c')
         xinline = re._flatten_nodes('union',x) 
-        assert xinline == ('union', [('symbol','a'),('symbol','b'),('symbol','c')])
+        assert xinline.to_tuple() == ('union', [('symbol','a'),('symbol','b'),('symbol','c')])
 
         x = re._parse('a|(b|c|d)|(ef|gh)')
         xinline = re._flatten_nodes('union',x) 
-        assert xinline == ('union', [
+        assert xinline.to_tuple() == ('union', [
             ('symbol','a'),
             ('symbol','b'),
             ('symbol','c'),
@@ -453,12 +487,12 @@ class TestRegexASTtransform:
             ])
         nfa1 = re._compile(x)
         nfa2 = re._compile(xinline)
-        assert nfa1.description == '(a|((b|(c|d))|(ef|gh)))'
+        assert nfa1.description == '(a|(b|c|d)|(ef|gh))'
         assert nfa2.description == '(a|b|c|d|ef|gh)'
 
         x = re._parse('a|x(b|c|d)|(ef|gh)')
         xinline = re._flatten_nodes('union',x) 
-        assert xinline == ('union', [
+        assert xinline.to_tuple() == ('union', [
             ('symbol','a'),
             ('concat', [
                 ('symbol', 'x'),
@@ -480,104 +514,123 @@ class TestRegexASTtransform:
                     ('concat',[('symbol','d'),('symbol','e')]),
                     ('symbol','f')])
                 ])
-        xinline = re._flatten_nodes('concat',x)
-        assert xinline == ('concat', [ ('symbol','a'), ('symbol','b'), ('symbol','c'), ('symbol','d'), ('symbol','e'), ('symbol','f') ])
+        xinline = re._flatten_nodes('concat',from_tuple(x))
+        assert xinline.to_tuple() == ('concat', [ ('symbol','a'), ('symbol','b'), ('symbol','c'), ('symbol','d'), ('symbol','e'), ('symbol','f') ])
 
     def test_ast_flatten_bug_44(self):
         re = Regex()
         # test for bug #44
-        x = ('xxxxx', [('symbol', 'a'), ('empty',)])
+        x = ast.Union([ast.Symbol('a'), ast.Empty()])
         xinline = re._flatten_nodes('concat',x)
-        assert xinline == x
+        assert xinline is x
         # test for bug #44
-        x = ('xxxxx', [('yyy', [('xxxxx',[])]), ('symbol', 'b')])
+        x = ast.Union([ast.KleeneStar(ast.Union([ast.Symbol('a'), ast.Empty()])), ast.Symbol('b')])
         xinline = re._flatten_nodes('concat',x)
-        assert xinline == x
+        assert xinline is x
+
+    def test_ast_shared_nodes(self):
+        re = Regex()
+        # identical subtrees are the same object
+        x = re._parse('(ab|cd)*x(ab|cd)*')
+        assert x.children[0] is x.children[2]
+        assert x is re._parse('(ab|cd)*x(ab|cd)*')
+        assert x.children[0] is ast.from_tuple(('kleene-star', ('union', [
+            ('concat', [('symbol','a'),('symbol','b')]),
+            ('concat', [('symbol','c'),('symbol','d')])])))
+        # unchanged subtrees aren't copied by transforms
+        x = re._parse('a(b(cd)*)e')
+        xinline = re._transform(x)
+        assert xinline.children[2] is x.children[1].children[1]
+        # shared subtrees are compiled to separate NFA fragments
+        re = Regex('(ab)*x(ab)*')
+        accept_test_helper(re, [('abxab', True), ('ababx', True), ('x', True), ('xa', False)])
+
+    def test_ast_immutable(self):
+        with pytest.raises(AttributeError):
+            ast.Symbol('a').char = 'b'
 
     def test_ast_simplify_quant_noop(self):
         re = Regex()
         x = re._parse('a')
         xinline = re._simplify_quant(x)
-        assert xinline == ('symbol','a')
+        assert xinline.to_tuple() == ('symbol','a')
 
     def test_ast_simplify_quant_single(self):
         re = Regex()
         x = re._parse('a*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('a+')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-plus',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-plus',('symbol','a'))
 
         x = re._parse('a?')
         xinline = re._simplify_quant(x)
-        assert xinline == ('zero-or-one',('symbol','a'))
+        assert xinline.to_tuple() == ('zero-or-one',('symbol','a'))
 
     def test_ast_simplify_quant_nested(self):
         re = Regex()
         x = re._parse('(a+)+')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-plus',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-plus',('symbol','a'))
 
         x = re._parse('(a+)*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a+)?')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a*)+')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a*)*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a*)?')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a?)+')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a?)*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',('symbol','a'))
+        assert xinline.to_tuple() == ('kleene-star',('symbol','a'))
 
         x = re._parse('(a?)?')
         xinline = re._simplify_quant(x)
-        assert xinline == ('zero-or-one',('symbol','a'))
+        assert xinline.to_tuple() == ('zero-or-one',('symbol','a'))
 
     def test_ast_simplify_quant_nested_adv(self):
         re = Regex()
         x = re._parse('(([abc]*)?x+)*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',
+        assert xinline.to_tuple() == ('kleene-star',
                 ('concat', [
-                ('kleene-star', ('set',['a','b','c'], '[abc]')),
+                ('kleene-star', ('set',[('a','c')], '[abc]')),
                 ('kleene-plus', ('symbol', 'x')),
             ])
             )
 
         x = re._parse('(a*|b+|c?)*')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star',
+        assert xinline.to_tuple() == ('kleene-star',
                 ('union', [
                     ('kleene-star', ('symbol','a')),
-                    ('union', [
-                        ('kleene-plus', ('symbol', 'b')),
-                        ('zero-or-one', ('symbol', 'c')),
-                        ])
+                    ('kleene-plus', ('symbol', 'b')),
+                    ('zero-or-one', ('symbol', 'c')),
             ])
         )
 
         x = re._parse('(((((a*)*)+)+)?)?')
         xinline = re._simplify_quant(x)
-        assert xinline == ('kleene-star', ('symbol', 'a'))
+        assert xinline.to_tuple() == ('kleene-star', ('symbol', 'a'))
 
 class TestRegexOther:
     def test_empty_regex_checks(self):
@@ -655,3 +708,305 @@ class TestRegexOther:
         with pytest.raises(rejit.regex.RegexCompilationError):
             re.compile_to_x86()
 
+
+    def test_large_pattern(self):
+        # patterns much longer than the recursion limit
+        literal = 'ab' * 10000
+        re = Regex(literal)
+        assert re._final_ast.to_tuple() == ('concat', [('symbol', c) for c in literal])
+        accept_test_helper(re, [(literal, True), (literal[:-1], False), ('', False)])
+
+        words = ['w{}x'.format(i) for i in range(2000)]
+        re = Regex('|'.join(words))
+        assert len(re._ast.children) == 2000
+        # common prefix and suffix are factored out
+        assert re._final_ast.children[0] is ast.Symbol('w')
+        assert re._final_ast.children[-1] is ast.Symbol('x')
+        accept_test_helper(re, [('w1999x', True), ('w2000x', False)])
+
+        nested = '(' * 5000 + 'a' + ')*' * 5000
+        re = Regex(nested)
+        assert re._final_ast.to_tuple() == ('kleene-star', ('symbol', 'a'))
+        accept_test_helper(re, [('', True), ('aaa', True), ('b', False)])
+
+    def test_counted_repetition(self):
+        re = Regex('[0-9]{1,3}(.[0-9]{1,3}){3}')
+        cases = [
+                    ('192.168.0.1', True),
+                    ('1.22.333.0', True),
+                    ('1.2.3', False),
+                    ('1.2.3.4.5', False),
+                    ('1234.1.1.1', False),
+                    ('', False),
+                ]
+        accept_test_helper(re,cases)
+        re.compile_to_x86()
+        accept_test_helper(re,cases)
+
+        re = Regex('x.{0,200}y')
+        cases = [('xy', True), ('x' + 'a'*200 + 'y', True), ('x' + 'a'*201 + 'y', False)]
+        accept_test_helper(re,cases)
+        re.compile_to_DFA()
+        accept_test_helper(re,cases)
+        # the DFA grows linearly with the bound
+        assert re._matcher.num_states < 3*200
+
+    def test_large_charset(self):
+        # a range is a single NFA edge, no matter how many chars it has
+        re = Regex('[\u0100-\uffff]+x')
+        assert re._matcher.num_states < 10
+        cases = [('\u0100x', True), ('\uffff\u1234x', True), ('ax', False), ('x', False)]
+        accept_test_helper(re,cases)
+        re.compile_to_DFA()
+        accept_test_helper(re,cases)
+
+        re = Regex('[^0-9]*[0-9]')
+        cases = [
+                    ('7', True),
+                    ('abc7', True),
+                    ('\u20ac7', True),
+                    ('abc', False),
+                    ('77', False),
+                ]
+        accept_test_helper(re,cases)
+        re.compile_to_DFA()
+        accept_test_helper(re,cases)
+        cases = [x for x in cases if x[0].isascii()]
+        re.compile_to_x86()
+        accept_test_helper(re,cases)
+
+        # overlapping sets and `any` are split into disjoint DFA edges
+        re = Regex('([a-m]|[h-z]y|.z)*')
+        cases = [('', True), ('a', True), ('hy', True), ('azhy#z', True), ('ay', False), ('#', False)]
+        accept_test_helper(re,cases)
+        re.compile_to_x86()
+        accept_test_helper(re,cases)
+
+    def test_tiering(self):
+        re = Regex('x(a|b)*x')
+        assert re.tier_info() is None
+        re.enable_tiering({'DFA': (3, 1000), 'JIT': (1000, 20)})
+        cases = [('xx', True), ('xabx', True), ('xa', False)]
+        accept_test_helper(re, cases)
+        assert re._matcher_type == 'DFA'
+        info = re.tier_info()
+        assert info.tier == 'DFA'
+        assert (info.calls, info.chars) == (3, 8)
+        promotion, = info.promotions
+        assert (promotion.tier, promotion.calls, promotion.error) == ('DFA', 3, None)
+        assert promotion.seconds >= 0
+        # the JIT threshold is crossed by the number of characters
+        accept_test_helper(re, [('x' + 'ab'*6 + 'x', True)])
+        assert re.tier_info().tier == 'JIT'
+        assert [p.tier for p in re.tier_info().promotions] == ['DFA', 'JIT']
+        accept_test_helper(re, cases)
+
+        # both thresholds crossed by one call
+        re = Regex('a*')
+        re.enable_tiering({'DFA': (1, 1), 'JIT': (1, 1)})
+        accept_test_helper(re, [('aa', True)])
+        assert re.tier_info().tier == 'JIT'
+
+        # a None threshold stops promotion
+        re = Regex('a*')
+        re.enable_tiering({'DFA': (1, 1), 'JIT': None})
+        for _ in range(10):
+            accept_test_helper(re, [('aa', True)])
+        assert re.tier_info().tier == 'DFA'
+
+        with pytest.raises(rejit.regex.RegexCompilationError):
+            Regex().enable_tiering()
+
+    def test_tiering_non_ascii(self):
+        # results don't change when the regex is promoted
+        re = Regex('a.c')
+        re.enable_tiering({'DFA': (2, 10**6), 'JIT': (4, 10**6)})
+        cases = [('aéc', True), ('a\U00010000c', True), ('abc', True), ('aé', False)]
+        for _ in range(6):
+            accept_test_helper(re, cases)
+        assert [p.tier for p in re.tier_info().promotions] == ['DFA', 'JIT']
+
+    def test_tiering_failed_promotion(self, monkeypatch):
+        def fail(regex):
+            raise rejit.regex.RegexCompilationError('no JIT here')
+        monkeypatch.setitem(Regex._tier_compilers, 'JIT', fail)
+        re = Regex('a*')
+        re.enable_tiering({'DFA': (1, 1), 'JIT': (2, 1000)})
+        for _ in range(5):
+            accept_test_helper(re, [('aa', True)])
+        info = re.tier_info()
+        assert info.tier == 'DFA'
+        assert [(p.tier, p.error) for p in info.promotions] == [('DFA', None), ('JIT', 'no JIT here')]
+
+    @pytest.mark.parametrize('fallback,matcher_type', [
+        ('nfa', 'NFA'), ('lazydfa', 'LazyDFA'), ('bitparallel', 'BitParallel'), ('bitparallel', 'NFA')])
+    def test_tiering_fallbacks(self, monkeypatch, fallback, matcher_type):
+        monkeypatch.setitem(Regex.default_budgets, 'dfa_states', 10)
+        monkeypatch.setattr(Regex, 'default_fallback', fallback)
+        if matcher_type == 'NFA':
+            # the bit-parallel matcher can't be built either
+            monkeypatch.setattr(rejit.bitparallel.BitParallelMatcher, 'max_states', 1)
+        re = Regex('(a|b)*a(a|b)(a|b)(a|b)(a|b)(a|b)(a|b)')
+        re.enable_tiering({'DFA': (2, 10**9)})
+        # one promotion is done directly, a retried one would loop in `accept`
+        re._promote()
+        assert not re._promotion_due()
+        info = re.tier_info()
+        assert info.tier == matcher_type
+        promotion, = info.promotions
+        assert promotion.error is None
+        assert promotion.fallback == ('DFA', matcher_type, 'dfa_states', 10)
+        accept_test_helper(re, [('a' * 7, True), ('b' * 7, False)] * 3)
+        assert len(re.tier_info().promotions) == 1
+
+    def test_tiering_jit_fallback(self, monkeypatch):
+        monkeypatch.setitem(Regex.default_budgets, 'code_bytes', 100)
+        monkeypatch.setattr(Regex, 'default_fallback', 'nfa')
+        re = Regex('(a|b)*a(a|b){3}')
+        re.enable_tiering({'DFA': (1, 1), 'JIT': (2, 10**9)})
+        accept_test_helper(re, [('aaaa', True)])
+        re._promote()
+        assert not re._promotion_due()
+        accept_test_helper(re, [('aaaa', True), ('aaa', False)] * 3)
+        info = re.tier_info()
+        assert info.tier == 'DFA'
+        assert [(p.tier, p.fallback) for p in info.promotions] == [
+                ('DFA', None), ('JIT', ('JIT', 'DFA', 'code_bytes', 100))]
+
+
+    def test_x86_non_ascii(self):
+        for pattern, cases in [
+                ('a.c', [('aéc', True), ('abc', True), ('ac', False)]),
+                ('.*é.*', [('café', True), ('é', True), ('cafe', False)]),
+                ('[à-ÿ]+x', [('àÿx', True), ('ax', False), ('Āx', False)])]:
+            re = Regex(pattern)
+            re.compile_to_x86()
+            accept_test_helper(re, cases)
+        # combined regexes are JIT compiled from a DFA product
+        re = Regex('.*é.*') - Regex('.*ü.*')
+        re.compile_to_x86()
+        accept_test_helper(re, [('é', True), ('éü', False), ('a', False)])
+
+    def test_boolean_operators(self):
+        rule = Regex('[a-z]+') & ~Regex('.*x.*')
+        cases = [('abc', True), ('axc', False), ('ABC', False), ('', False)]
+        accept_test_helper(rule, cases)
+        assert rule._matcher_type == 'DFA'
+        assert rule.compile_to_x86() == 'JIT'
+        accept_test_helper(rule, cases)
+        rule = (Regex('ab') | Regex('c.')) - Regex('cd')
+        accept_test_helper(rule, [('ab', True), ('ce', True), ('cd', False), ('', False)])
+        # DFA operands are used as they are, others can't be combined
+        dfa = Regex('a+')
+        dfa.compile_to_DFA()
+        accept_test_helper(dfa & Regex('aa'), [('aa', True), ('a', False)])
+        jit = Regex('a')
+        jit.compile_to_x86()
+        with pytest.raises(rejit.regex.RegexCompilationError):
+            jit & Regex('a')
+        with pytest.raises(TypeError):
+            Regex('a') & 'a'
+
+    def test_budgets(self):
+        pattern = '(a|b)*a(a|b){10}'
+        cases = [('a' * 11, True), ('b' + 'a' + 'b' * 10, True), ('a' * 10, False)]
+        with pytest.raises(rejit.regex.RegexBudgetError) as error:
+            Regex(pattern).compile_to_DFA({'dfa_states': 100})
+        assert (error.value.budget, error.value.limit) == ('dfa_states', 100)
+        with pytest.raises(rejit.regex.RegexBudgetError) as error:
+            Regex(pattern).compile_to_DFA({'dfa_transitions': 100})
+        assert error.value.budget == 'dfa_transitions'
+        # a regex within budgets has no fallback
+        re = Regex('ab')
+        assert re.compile_to_DFA({'dfa_states': 100}) == 'DFA'
+        assert re.fallback_info() is None
+        # fallbacks
+        for fallback, matcher_type in [('nfa', 'NFA'), ('lazydfa', 'LazyDFA'), ('bitparallel', 'BitParallel')]:
+            re = Regex(pattern)
+            assert re.compile_to_DFA({'dfa_states': 100}, fallback) == matcher_type
+            assert re.fallback_info() == ('DFA', matcher_type, 'dfa_states', 100)
+            accept_test_helper(re, cases)
+        with pytest.raises(rejit.regex.RegexCompilationError):
+            Regex(pattern).compile_to_DFA(fallback='xyz')
+
+    def test_jit_budgets(self, monkeypatch):
+        pattern = '(a|b)*a(a|b){3}'
+        cases = [('aaaa', True), ('abbb', True), ('aaa', False)]
+        re = Regex(pattern)
+        assert re.compile_to_x86({'code_bytes': 100}, 'nfa') == 'DFA'
+        assert re.fallback_info() == ('JIT', 'DFA', 'code_bytes', 100)
+        accept_test_helper(re, cases)
+        with pytest.raises(rejit.regex.RegexBudgetError):
+            Regex(pattern).compile_to_x86({'ir_instructions': 10})
+        # the code size is checked before jump offsets are calculated
+        monkeypatch.setattr(rejit.jitcompiler.JITCompiler, '_impl_jmps_pass', None)
+        with pytest.raises(rejit.regex.RegexBudgetError):
+            Regex(pattern).compile_to_x86({'code_bytes': 100})
+        monkeypatch.undo()
+        # a DFA budget stops compilation before JIT
+        re = Regex(pattern)
+        assert re.compile_to_x86({'dfa_states': 4}, 'lazydfa') == 'LazyDFA'
+        assert re.fallback_info().requested == 'DFA'
+        assert Regex(pattern).compile_to_x86({'dfa_states': 1000, 'code_bytes': 100000}) == 'JIT'
+
+    def test_default_budgets(self, monkeypatch):
+        monkeypatch.setitem(Regex.default_budgets, 'dfa_states', 10)
+        monkeypatch.setattr(Regex, 'default_fallback', 'lazydfa')
+        re = Regex('(a|b)*a(a|b){5}')
+        assert re.compile_to_DFA() == 'LazyDFA'
+        # explicit arguments override defaults
+        with pytest.raises(rejit.regex.RegexBudgetError):
+            Regex('(a|b)*a(a|b){5}').compile_to_DFA(fallback='error')
+        assert Regex('(a|b)*a(a|b){5}').compile_to_DFA({'dfa_states': None}) == 'DFA'
+        # promotions of adaptive regexes use the defaults too
+        re = Regex('(a|b)*a(a|b){5}')
+        re.enable_tiering({'DFA': (1, 1)})
+        accept_test_helper(re, [('a' * 6, True)])
+        assert re.tier_info().tier == 'LazyDFA'
+
+class TestRegexASTOptimize:
+    def assert_optimized(self, pattern, expected_ast):
+        re = Regex(pattern)
+        print('pattern:', pattern, 'optimized:', re.description)
+        assert re._final_ast is from_tuple(expected_ast)
+
+    def test_union_to_set(self):
+        self.assert_optimized('a|b|c', ('set',['a','b','c'],'[abc]'))
+        self.assert_optimized('a|[x-z]|b', ('set',['a','b','x','y','z'],'[ax-zb]'))
+        self.assert_optimized('a|a', ('symbol','a'))
+
+    def test_factor_prefix_suffix(self):
+        self.assert_optimized('foo|foz', ('concat',[('symbol','f'),('symbol','o'),('set',['o','z'],'[oz]')]))
+        self.assert_optimized('foo|zoo', ('concat',[('set',['f','z'],'[fz]'),('symbol','o'),('symbol','o')]))
+        self.assert_optimized('foo|fo', ('concat',[('symbol','f'),('symbol','o'),('zero-or-one',('symbol','o'))]))
+        self.assert_optimized('ab*c|ab*d', ('concat',[('symbol','a'),('kleene-star',('symbol','b')),('set',['c','d'],'[cd]')]))
+        self.assert_optimized('abc|xyz', ('union',[
+            ('concat',[('symbol','a'),('symbol','b'),('symbol','c')]),
+            ('concat',[('symbol','x'),('symbol','y'),('symbol','z')])]))
+
+    def test_any_absorbs(self):
+        self.assert_optimized('a|.|[bc]', ('any',))
+        self.assert_optimized('a|.|bc', ('union',[('any',),('concat',[('symbol','b'),('symbol','c')])]))
+        self.assert_optimized('abc|.*|x', ('kleene-star',('any',)))
+
+    def test_drop_empty(self):
+        re = Regex()
+        x = ast.Concat([ast.Symbol('a'), ast.Empty(), ast.Symbol('b')])
+        assert re._transform(x) is from_tuple(('concat',[('symbol','a'),('symbol','b')]))
+        x = ast.Union([ast.Symbol('a'), ast.Empty()])
+        assert re._transform(x) is from_tuple(('zero-or-one',('symbol','a')))
+        x = ast.Union([ast.KleeneStar(ast.Symbol('a')), ast.Empty()])
+        assert re._transform(x) is from_tuple(('kleene-star',('symbol','a')))
+        x = ast.KleenePlus(ast.Concat([ast.Empty(), ast.Empty()]))
+        assert re._transform(x) is ast.Empty()
+
+    def test_optimized_equivalent(self):
+        patterns = ['foo|foz|fo|f', 'a|b|ab|ba|abc', '(a|b)*a|(a|b)*b', 'ab|.|b*', 'a(b|c)|a(b|c)c',
+                'abc|abd|xbc|xbd|bd', '(ab|ac)+|a*', 'a?b|ab?']
+        strings = [''] + [a+b+c+d for a in 'abcf' for b in ' abcfoz' for c in ' abco' for d in ' abz']
+        strings = [s.replace(' ', '') for s in strings]
+        for pattern in patterns:
+            re = Regex(pattern)
+            plain = re._compile(re._simplify_quant(re._flatten_nodes('union', re._flatten_nodes('concat', re._ast))))
+            cases = [(s, plain.accept(s)) for s in strings]
+            accept_test_helper(re, cases)
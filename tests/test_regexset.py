@@ -0,0 +1,73 @@
+#encoding: utf8
+
+import pytest
+
+import rejit.regex
+from rejit.regexset import RegexSet
+
+patterns = ['[0-9]+', '[0-9a-f]+', '[a-z]+', 'x(ab|ba)*x', '', 'a.*']
+
+cases = [
+            ('42', [0, 1]),
+            ('cafe', [1, 2]),
+            ('abc', [1, 2, 5]),
+            ('xabbax', [2, 3]),
+            ('xx', [2, 3]),
+            ('a', [1, 2, 5]),
+            ('a-1', [5]),
+            ('', [4]),
+            ('-', []),
+            ('XY', []),
+        ]
+
+def matches_test_helper(regex_set, cases):
+    for s, expected in cases:
+        result = regex_set.matches(s)
+        print('string:{}, result:{}, expected:{}'.format(s, result, expected))
+        assert result == expected
+        assert regex_set.accept(s) == bool(expected)
+
+class TestRegexSet:
+    @pytest.mark.parametrize('compile_fn', [None, RegexSet.compile_to_DFA, RegexSet.compile_to_x86])
+    def test_matches(self, compile_fn):
+        regex_set = RegexSet(patterns)
+        if compile_fn:
+            compile_fn(regex_set)
+        assert len(regex_set) == len(patterns)
+        matches_test_helper(regex_set, cases)
+
+    @pytest.mark.parametrize('compile_fn', [None, RegexSet.compile_to_DFA, RegexSet.compile_to_x86])
+    def test_non_ascii(self, compile_fn):
+        regex_set = RegexSet(['caf[eé]', '.*é.*', 'a.c'])
+        if compile_fn:
+            compile_fn(regex_set)
+        matches_test_helper(regex_set, [('café', [0, 1]), ('cafe', [0]), ('aéc', [1, 2]), ('aüc', [2]), ('é', [1])])
+
+    def test_compilation_order(self):
+        regex_set = RegexSet(patterns)
+        assert regex_set._matcher_type == 'NFA'
+        regex_set.compile_to_DFA()
+        assert regex_set._matcher_type == 'DFA'
+        regex_set.compile_to_x86()
+        assert regex_set._matcher_type == 'JIT'
+        matches_test_helper(regex_set, cases)
+        with pytest.raises(rejit.regex.RegexCompilationError):
+            regex_set.compile_to_DFA()
+
+    def test_empty_set(self):
+        regex_set = RegexSet([])
+        assert regex_set.matches('a') == []
+        regex_set.compile_to_x86()
+        assert regex_set.matches('') == []
+
+    def test_invalid_pattern(self):
+        with pytest.raises(rejit.regex.RegexParseError):
+            RegexSet(['a', 'b)'])
+
+    def test_many_patterns(self):
+        words = ['w{}x'.format(i) for i in range(300)]
+        regex_set = RegexSet(words + ['w1[0-9]*x'])
+        regex_set.compile_to_x86()
+        assert regex_set.matches('w123x') == [123, 300]
+        assert regex_set.matches('w299x') == [299]
+        assert regex_set.matches('w300x') == []
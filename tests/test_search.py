@@ -0,0 +1,138 @@
+#encoding: utf8
+
+import random
+import re
+
+import pytest
+
+import rejit.regex_ast as ast
+from rejit.compactnfa import CompactNFA
+from rejit.regex import Regex
+from rejit.regex import Match
+from rejit.regex import RegexBudgetError
+from rejit.regex import RegexMatcherError
+from rejit.search import Searcher
+from rejit.search import leftmost_longest_DFA
+
+from tests.test_glushkov import patterns
+
+def leftmost_longest(pattern, s):
+    # all matches found by trying every substring with Python's `re`
+    full = re.compile('(?:{})\\Z'.format(pattern.replace('\\E', 'E')))
+    matches = []
+    pos = 0
+    while pos <= len(s):
+        spans = [(start, end) for start in range(pos, len(s) + 1) for end in range(len(s), start - 1, -1)
+                if full.match(s, start, end)]
+        if not spans:
+            break
+        matches.append(spans[0])
+        pos = spans[0][1] if spans[0][1] > spans[0][0] else spans[0][1] + 1
+    return matches
+
+search_patterns = patterns + ['abcd|c', 'a|a.*b', 'b(ab)*|aba', '(ab)+|a', '.*c', 'ab|b']
+
+def searchers(pattern):
+    regex = Regex(pattern)
+    nfa = regex._compile(regex._final_ast)
+    reversed_nfa = regex._compile(ast.reverse(regex._final_ast))
+    yield Searcher(nfa, reversed_nfa)
+    yield Searcher(nfa, reversed_nfa, jit=True)
+
+class TestSearcher:
+    def test_same_as_substrings(self):
+        rand = random.Random(0)
+        inputs = [''.join(rand.choice('abcdx') for _ in range(rand.randint(0, 12))) for _ in range(100)]
+        for pattern in search_patterns:
+            for searcher in searchers(pattern):
+                for s in inputs:
+                    expected = leftmost_longest(pattern, s)
+                    assert list(searcher.finditer(s)) == expected, (pattern, s)
+                    assert searcher.search(s) == (expected[0] if expected else None), (pattern, s)
+
+    def test_leftmost_longest(self):
+        for searcher in searchers('abcd|c|bcde'):
+            # the leftmost match wins, even if another one ends first
+            assert searcher.search('abcde') == (0, 4)
+            assert searcher.search('xbcde') == (1, 5)
+            assert searcher.search('abcde', 1) == (1, 5)
+            assert searcher.search('abcde', 3) is None
+
+    def test_scanned_once(self):
+        # before the first match no states are dropped, after it the
+        # forward DFA reaches the rejecting state as soon as the match can't grow
+        dfa = leftmost_longest_DFA(Regex('ab+')._matcher)
+        assert dfa.longest_prefix('xxabbbx' + 'y' * 100) == 6
+        assert dfa._final_number('xxabbbx') == dfa._dead
+        assert dfa.longest_prefix('x' * 100) == -1
+
+    def test_search_loop(self, monkeypatch):
+        # a string searched repeatedly is checked and encoded only once
+        text = 'ab xab ' * 100
+        for searcher in searchers('x?ab'):
+            calls = []
+            scanners = searcher._scanners
+            monkeypatch.setattr(searcher, '_scanners', lambda s: calls.append(s) or scanners(s))
+            spans = []
+            span = searcher.search(text)
+            while span:
+                spans.append(span)
+                span = searcher.search(text, span[1])
+            assert len(calls) == 1
+            assert searcher.search('xab') == (0, 3) and len(calls) == 2
+            assert spans == list(searcher.finditer(text)) and len(spans) == 200
+
+class TestRegexSearch:
+    def test_search(self):
+        re = Regex('ERROR [0-9]+')
+        assert re.search('ok\nERROR 42 and ERROR 7') == Match(3, 11, 'ERROR 42')
+        assert re.search('ok\nERROR 42 and ERROR 7', 11) == Match(16, 23, 'ERROR 7')
+        assert re.search('ERROR x') is None
+        assert [m.group for m in re.finditer('ERROR 1, ERROR 22, ERROR')] == ['ERROR 1', 'ERROR 22']
+        assert list(Regex('x*').finditer('axxb')) == [Match(0, 0, ''), Match(1, 3, 'xx'), Match(3, 3, ''), Match(4, 4, '')]
+
+    def test_tiers(self):
+        text = 'id=12 id=345 x id=6'
+        expected = [Match(0, 5, 'id=12'), Match(6, 12, 'id=345'), Match(15, 19, 'id=6')]
+        nfa = Regex('id=[0-9]+')
+        assert list(nfa.finditer(text)) == expected
+        dfa = Regex('id=[0-9]+')
+        dfa.compile_to_DFA()
+        assert list(dfa.finditer(text)) == expected
+        jit = Regex('id=[0-9]+')
+        jit.compile_to_x86()
+        assert list(jit.finditer(text)) == expected
+        assert jit._searcher[1]._jit is not None
+        # strings which aren't ASCII are scanned by DFAs
+        assert list(jit.finditer('żid=1ż')) == [Match(1, 5, 'id=1')]
+
+    def test_non_ascii(self):
+        re = Regex('[Ā-￿]+')
+        assert re.search('abĀ￿c') == Match(2, 4, 'Ā￿')
+        assert list(re.finditer('ሴaሴሴ')) == [Match(0, 1, 'ሴ'), Match(2, 4, 'ሴሴ')]
+
+    def test_errors(self):
+        with pytest.raises(RegexMatcherError):
+            (Regex('a') | Regex('b')).search('a')
+        budgets = dict(Regex.default_budgets)
+        Regex.default_budgets['dfa_states'] = 5
+        try:
+            with pytest.raises(RegexBudgetError):
+                Regex('(a|b)*a(a|b){8}').search('ab')
+        finally:
+            Regex.default_budgets = budgets
+
+    def test_tiering(self):
+        re = Regex('a+')
+        re.enable_tiering({'DFA': (2, 1000), 'JIT': (4, 1000)})
+        for _ in range(5):
+            assert re.search('baab') == Match(1, 3, 'aa')
+        assert re.tier_info().tier == 'JIT'
+        assert re._searcher[0]
+
+class TestReverse:
+    def test_reverse(self):
+        regex = Regex('ab(cd|e)*f{2}')
+        reversed_nfa = CompactNFA(regex._compile(ast.reverse(regex._final_ast)))
+        for s in ['abff', 'abcdeff', 'abeecdff', 'abf', 'ab', 'bacdff']:
+            assert reversed_nfa.accept(s[::-1]) == regex.accept(s), s
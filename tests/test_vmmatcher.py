@@ -1,6 +1,7 @@
 #encoding: utf8
 
 from rejit.dfa import DFA
+from rejit.regex import Regex
 from rejit.vmmatcher import VMMatcher
 from tests.helper import accept_test_helper
 
@@ -46,6 +47,8 @@ class TestVMMatcher:
     def test_char_set_VMMatcher(self):
         accept_test_helper(VMMatcher(DFA(auto_cases.char_set_nfa_1)),auto_cases.char_set_cases_1)
         accept_test_helper(VMMatcher(DFA(auto_cases.char_set_nfa_2)),auto_cases.char_set_cases_2)
+        accept_test_helper(VMMatcher(DFA(auto_cases.char_set_nfa_3)),auto_cases.char_set_cases_3)
+        accept_test_helper(VMMatcher(DFA(auto_cases.char_set_nfa_4)),auto_cases.char_set_cases_4)
 
     def test_zero_or_one_VMMatcher(self):
         vm = VMMatcher(DFA(auto_cases.zero_or_one_nfa))
@@ -55,3 +58,13 @@ class TestVMMatcher:
         accept_test_helper(VMMatcher(DFA(auto_cases.complex_nfa_1)),auto_cases.complex_cases_1)
         accept_test_helper(VMMatcher(DFA(auto_cases.complex_nfa_2)),auto_cases.complex_cases_2)
 
+
+    def test_sink_early_exit(self):
+        # a long input is matched in few instructions after a sink is entered
+        matcher = VMMatcher(DFA(Regex('ab.*|ac')._matcher))
+        ret_val, info = matcher._simulate({'string': 'ab' + 'x' * 20000, 'length': 20002})
+        assert ret_val is True
+        assert info['icounter'] < 100
+        ret_val, info = matcher._simulate({'string': 'acx' + 'x' * 20000, 'length': 20003})
+        assert ret_val is False
+        assert info['icounter'] < 100